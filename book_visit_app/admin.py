@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DepartmentDailyQuota
+
+
+@admin.register(DepartmentDailyQuota)
+class DepartmentDailyQuotaAdmin(admin.ModelAdmin):
+    list_display = ('department_code', 'visit_date', 'booked', 'capacity')
+    list_filter = ('department_code',)
+    ordering = ('-visit_date', 'department_code')
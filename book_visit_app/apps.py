@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class BookVisitAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'book_visit_app'
+
+    def ready(self):
+        from django.db.models.signals import post_delete
+        from dashboard_app.models import Visit
+        from . import capacity
+
+        # Whoever deletes a visit, the department slot it held is given back
+        post_delete.connect(capacity.visit_deleted, sender=Visit, dispatch_uid="capacity_visit_deleted")
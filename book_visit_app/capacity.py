@@ -0,0 +1,211 @@
+# book_visit_app/capacity.py
+"""
+Per-department daily capacity quotas.
+
+Each (department code, date) pair has one counter row. A slot is taken with
+a single conditional UPDATE:
+
+    UPDATE department_daily_quotas SET booked = booked + 1
+    WHERE department_code = %s AND visit_date = %s AND booked + 1 <= capacity
+
+so concurrent bookings never overshoot the limit and nothing has to COUNT
+the visits table. Call reserve_slot() inside the same transaction as the
+visit INSERT: if the insert fails, the slot is given back by the rollback.
+
+Every visit row on a date holds one slot, whatever its status, except a
+cancelled one. Deleting a visit that holds a slot gives it back
+(visit_deleted, a post_delete receiver, so every delete path is covered);
+recount_slots() counts the same rows and corrects anything that bypassed
+the ORM (`manage.py recount_department_quotas`, run on deploy).
+
+Defaults come from settings.DEPARTMENT_DAILY_CAPACITY ({"URO": 150, ...}).
+Departments without a default (and without a row for that date) are unlimited.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .departments import department_code
+from .models import DepartmentDailyQuota
+
+logger = logging.getLogger(__name__)
+
+
+class DepartmentFull(Exception):
+    """The department has no slots left on that date."""
+
+    def __init__(self, code, visit_date):
+        self.code = code
+        self.visit_date = visit_date
+        super().__init__(f"{code} is fully booked on {visit_date}")
+
+
+# Visits in these statuses no longer hold their slot (every other status does)
+RELEASED_STATUSES = ("Cancelled",)
+
+
+def default_capacity(code):
+    return getattr(settings, "DEPARTMENT_DAILY_CAPACITY", {}).get(code)
+
+
+def reserve_slot(department, visit_date, count=1):
+    """
+    Take `count` slots (all or nothing) for `department` on `visit_date`.
+    Returns the department code (None when the department has no quota);
+    raises DepartmentFull when not enough slots are left.
+    """
+    code = department_code(department)
+    if not code:
+        return None
+
+    quotas = DepartmentDailyQuota.objects.filter(department_code=code, visit_date=visit_date)
+
+    def take():
+        return quotas.filter(booked__lte=F("capacity") - count).update(booked=F("booked") + count)
+
+    if take():
+        return code
+
+    if quotas.exists():
+        raise DepartmentFull(code, visit_date)
+
+    return _create_quota(code, visit_date, count)
+
+
+def _create_quota(code, visit_date, count):
+    """
+    Create the counter row for a date that has none yet, with `count` slots
+    already taken. Returns the code (unlimited departments get no row).
+    """
+    capacity = default_capacity(code)
+    if capacity is None:
+        return code  # unlimited
+
+    if capacity < count:
+        raise DepartmentFull(code, visit_date)
+
+    try:
+        with transaction.atomic():
+            DepartmentDailyQuota.objects.create(
+                department_code=code, visit_date=visit_date, capacity=capacity, booked=count
+            )
+        return code
+    except IntegrityError:
+        # Another booking created the row first: take the slots the normal way
+        updated = DepartmentDailyQuota.objects.filter(
+            department_code=code, visit_date=visit_date, booked__lte=F("capacity") - count
+        ).update(booked=F("booked") + count)
+        if updated:
+            return code
+        raise DepartmentFull(code, visit_date)
+
+
+def reserve_slots(department, visit_dates):
+    """
+    Take one slot on each of `visit_dates` (all or nothing, inside the
+    caller's transaction) for `department`. Same rules as reserve_slot(),
+    but dates that already have a counter row are taken with one UPDATE;
+    only dates whose row still has to be created go one by one (one INSERT
+    each).
+    """
+    code = department_code(department)
+    if not code:
+        return None
+
+    visit_dates = list(visit_dates)
+    quotas = DepartmentDailyQuota.objects.filter(department_code=code, visit_date__in=visit_dates)
+    existing = {
+        visit_date: capacity - booked
+        for visit_date, capacity, booked in quotas.values_list("visit_date", "capacity", "booked")
+    }
+
+    if existing:
+        full = sorted(d for d, left in existing.items() if left < 1)
+        if full:
+            raise DepartmentFull(code, full[0])
+        # A concurrent booking can still take the last slot between the read and the UPDATE
+        if quotas.filter(booked__lt=F("capacity")).update(booked=F("booked") + 1) < len(existing):
+            raise DepartmentFull(code, min(existing))
+
+    if default_capacity(code) is None:
+        return code  # dates without a row are unlimited
+
+    # Known to have no row yet: create it straight away
+    for visit_date in visit_dates:
+        if visit_date not in existing:
+            _create_quota(code, visit_date, 1)
+    return code
+
+
+def release_slot(department, visit_date, count=1):
+    """Give slots back (visit cancelled or deleted)."""
+    code = department_code(department)
+    if not code:
+        return
+    DepartmentDailyQuota.objects.filter(
+        department_code=code, visit_date=visit_date, booked__gte=count
+    ).update(booked=F("booked") - count)
+
+
+def visit_deleted(sender, instance, **kwargs):
+    """post_delete receiver for Visit: the slot it held is free again."""
+    if instance.status not in RELEASED_STATUSES and instance.visit_date:
+        release_slot(instance.department, instance.visit_date)
+
+
+def recount_slots(dates):
+    """
+    Set `booked` from the visits table for every counter row on `dates`.
+    The rows are locked first, so bookings in flight wait and are counted
+    afterwards. Returns the rows that were off.
+    """
+    from dashboard_app.models import Visit
+
+    dates = list(dates)
+    with transaction.atomic():
+        rows = list(DepartmentDailyQuota.objects.select_for_update().filter(visit_date__in=dates))
+        if not rows:
+            return []
+
+        counts = Counter()
+        booked = (
+            Visit.objects.filter(visit_date__in=dates)
+            .exclude(status__in=RELEASED_STATUSES)
+            .values_list("department", "visit_date")
+            .annotate(n=Count("visit_id"))
+            .order_by()
+        )
+        for department, visit_date, n in booked:
+            code = department_code(department)
+            if code:
+                counts[code, visit_date] += n
+
+        fixed = [row for row in rows if row.booked != counts[row.department_code, row.visit_date]]
+        for row in fixed:
+            logger.warning(
+                f"{row.department_code} on {row.visit_date}: booked was {row.booked}, "
+                f"visits say {counts[row.department_code, row.visit_date]}"
+            )
+            row.booked = counts[row.department_code, row.visit_date]
+        DepartmentDailyQuota.objects.bulk_update(fixed, ["booked"])
+    return fixed
+
+
+def remaining_slots(dates):
+    """
+    {date: {code: remaining}} for every department with a quota, over `dates`.
+    One query; dates without a counter row show the full default capacity.
+    """
+    dates = list(dates)
+    defaults = getattr(settings, "DEPARTMENT_DAILY_CAPACITY", {})
+    result = {d: dict(defaults) for d in dates}
+
+    rows = DepartmentDailyQuota.objects.filter(visit_date__in=dates).values_list(
+        "visit_date", "department_code", "capacity", "booked"
+    )
+    for visit_date, code, capacity, booked in rows:
+        result[visit_date][code] = max(capacity - booked, 0)
+    return result
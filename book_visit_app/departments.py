@@ -0,0 +1,104 @@
+# book_visit_app/departments.py
+"""
+Campus departments and their short codes.
+The code is the middle part of a visit code and the key for daily capacity quotas.
+"""
+import re
+
+DEPARTMENT_CODE_MAP = {
+    # 🎓 Academic Colleges / Departments
+    "College of Engineering and Architecture (CEA)": "CEA",
+    "College of Computer Studies (CCS)": "CCS",
+    "College of Management, Business and Accountancy (CMBA)": "CMBA",
+    "College of Arts, Sciences and Education (CASE)": "CASE",
+    "College of Nursing and Allied Health Sciences (CNAHS)": "CNAHS",
+    "College of Criminal Justice (CCJ)": "CCJ",
+    "Senior High School Department": "SHS",
+    "Basic Education Department (BED)": "BED",
+
+    # 🏫 Academic Support Units
+    "Learning Resource and Activity Center (LRAC)": "LRAC",
+    "Student Success Office (SSO)": "SSO",
+    "Office of Student Affairs (OSA)": "OSA",
+    "Office of Student Discipline (OSD)": "OSD",
+    "Curriculum and Instruction Office (CIO)": "CIO",
+    "Center for Teaching and Learning (CTL)": "CTL",
+    "Center for Research and Development (CRD)": "CRD",
+    "Center for Community Extension (CCE)": "CCE",
+    "Guidance Services Office (GSO)": "GSO",
+
+    # 💰 Administrative & Finance Offices
+    "Office of Admissions and Scholarships (OAS)": "OAS",
+    "University Registrar's Office (URO)": "URO",
+    "Finance and Accounting Office (FAO)": "FAO",
+    "Cashier's Office": "CASH",
+    "Human Resource Department (HRD)": "HRD",
+    "Property and Supply Office (PSO)": "PSO",
+    "Physical Plant Office (PPO)": "PPO",
+    "ICT / MIS Office": "MIS",
+    "Purchasing Office": "PURC",
+    "Maintenance Office": "MAIN",
+    "Janitorial Services Office": "JAN",
+
+    # 🌐 External & Institutional Offices
+    "Institutional Planning and Development Office (IPDO)": "IPDO",
+    "Networking, Linkages & Relations (NLR)": "NLR",
+    "Public Relations and Communications Office (PRCO)": "PRCO",
+    "Quality Assurance Office (QAO)": "QAO",
+    "Alumni Affairs Office (AAO)": "AAO",
+    "Industry-Academe Linkage Office (IALO)": "IALO",
+    "Technology Business Incubation Office (TBI Office)": "TBI",
+    "Internal Audit Office (IAO)": "IAO",
+
+    # 🛡 Campus Services
+    "Security Office": "SEC",
+    "Clinic / Health Services Office": "CLINIC",
+
+    # 🏛 Executive Offices
+    "Office of the University President": "OP",
+    "Office of the Executive Vice President": "EVP",
+    "Office of the VP for Academic Affairs (VPAA)": "VPAA",
+    "Office of the VP for Administration (VPA)": "VPA",
+    "Office of the VP for Finance (VPF)": "VPF",
+    "Office of the VP for External Affairs (VPEA)": "VPEA",
+
+    # Catch-all
+    "Other": "OTH",
+}
+
+
+def department_code(department):
+    """Mapped code for a department name (exact, then case-insensitive), or None."""
+    dept_raw = (department or "").strip()
+    code = DEPARTMENT_CODE_MAP.get(dept_raw)
+
+    # Case-insensitive match if direct lookup failed
+    if not code:
+        for name, abbr in DEPARTMENT_CODE_MAP.items():
+            if dept_raw.lower() == name.lower():
+                code = abbr
+                break
+
+    return code
+
+
+def visit_code_part(department: str) -> str:
+    """
+    Middle part of a visit code (always exactly 3 characters):
+    - Prefer a mapped department code from DEPARTMENT_CODE_MAP
+    - Otherwise derive from the department string.
+    """
+    dept_raw = (department or "VIS").strip()
+    code_part = department_code(dept_raw)
+
+    if not code_part:
+        cleaned = re.sub(r"[^A-Za-z0-9]", "", dept_raw).upper()
+    else:
+        cleaned = re.sub(r"[^A-Za-z0-9]", "", str(code_part).upper())
+
+    cleaned = cleaned or "VIS"
+    return cleaned[:3]  # ensure exactly 3 chars
+
+
+# Department name for each code
+DEPARTMENT_NAMES = {code: name for name, code in DEPARTMENT_CODE_MAP.items()}
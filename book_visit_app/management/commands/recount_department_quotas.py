@@ -0,0 +1,34 @@
+# book_visit_app/management/commands/recount_department_quotas.py
+"""
+Recompute department daily quota counters from the visits table.
+
+Deleted visits give their slot back on their own (capacity.visit_deleted);
+this catches whatever bypassed the ORM (raw SQL, manual fixes in the
+database). Run on deploy; it only touches today and the bookable days
+after it unless --days says otherwise.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from book_visit_app import capacity
+
+
+class Command(BaseCommand):
+    help = "Recount DepartmentDailyQuota.booked from the visits table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=8,
+            help="Number of days from today to recount (default: today + the 7 bookable days).",
+        )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        dates = [today + timedelta(days=i) for i in range(max(1, options["days"]))]
+
+        fixed = capacity.recount_slots(dates)
+        for row in fixed:
+            self.stdout.write(f"{row.department_code} {row.visit_date}: booked = {row.booked}")
+        self.stdout.write(self.style.SUCCESS(f"{len(fixed)} quota counter(s) corrected."))
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentDailyQuota',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('department_code', models.TextField()),
+                ('visit_date', models.DateField()),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'department_daily_quotas',
+                'constraints': [models.UniqueConstraint(fields=('department_code', 'visit_date'), name='department_daily_quota_unique')],
+            },
+        ),
+    ]
@@ -1,3 +1,30 @@
 from django.db import models
 
-# Create your models here.
+
+class DepartmentDailyQuota(models.Model):
+    """
+    Booked / allowed visits for one department (DEPARTMENT_CODE_MAP code) on
+    one date. Rows are created on first booking with the default capacity
+    from DEPARTMENT_DAILY_CAPACITY; edit a row (or create it ahead of time)
+    to set a different limit for a specific date, e.g. enrollment days.
+    """
+    department_code = models.TextField()
+    visit_date = models.DateField()
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'department_daily_quotas'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['department_code', 'visit_date'],
+                name='department_daily_quota_unique',
+            ),
+        ]
+
+    @property
+    def remaining(self):
+        return max(self.capacity - self.booked, 0)
+
+    def __str__(self):
+        return f"{self.department_code} {self.visit_date}: {self.booked}/{self.capacity}"
@@ -1,3 +1,239 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from book_visit_app import capacity
+from book_visit_app.models import DepartmentDailyQuota
+from citu_campuspass.query_budget import budget_for
+from dashboard_app import visit_codes
+from dashboard_app.models import Visit, VisitCodeBlock
+from register_app.models import User
+
+DEPARTMENT = "College of Computer Studies (CCS)"
+
+
+def next_bookable_day(after):
+    """The first day after `after` that isn't a Sunday."""
+    day = after + timedelta(days=1)
+    while day.weekday() == 6:
+        day += timedelta(days=1)
+    return day
+
+
+class BookVisitBudgetTests(TestCase):
+    """book_visit_view against QUERY_BUDGETS, with some booking history seeded."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.visitor = User.objects.create(
+            first_name="Vic", last_name="Visitor", email="vic@example.com",
+            phone="09171234567", password="x", visitor_type="Guest",
+        )
+        today = timezone.localdate()
+        Visit.objects.bulk_create([
+            Visit(
+                user_email=cls.visitor.email, user_id=cls.visitor.user_id, code=f"CIT-H{i:03d}",
+                purpose="Enrollment", department="Registrar", visit_date=today - timedelta(days=i + 1),
+                status="Completed",
+            )
+            for i in range(25)
+        ])
+
+    def setUp(self):
+        session = self.client.session
+        session["user_email"] = self.visitor.email
+        session["user_first_name"] = self.visitor.first_name
+        session.save()
+        self.max_queries, _ = budget_for("book_visit_app:book_visit")
+
+    def book(self, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse("book_visit_app:book_visit"), data)
+        self.assertLessEqual(len(queries), self.max_queries)
+        return response
+
+    def test_get(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("book_visit_app:book_visit"))
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(queries), self.max_queries)
+
+    def test_single_booking(self):
+        visit_date = next_bookable_day(timezone.localdate())
+        self.book({
+            "department": DEPARTMENT,
+            "purpose": "Campus tour visit",
+            "visit_date": visit_date.isoformat(),
+        })
+        self.assertTrue(Visit.objects.filter(user_id=self.visitor.user_id, visit_date=visit_date).exists())
+
+    @override_settings(DEPARTMENT_DAILY_CAPACITY={"CCS": 5})
+    def test_first_booking_cold(self):
+        """A fresh visitor, no quota row for the date and no visit code counter yet."""
+        VisitCodeBlock.objects.all().delete()
+        allocator = mock.patch.object(visit_codes, "allocator", visit_codes.VisitCodeAllocator())
+        allocator.start()
+        self.addCleanup(allocator.stop)
+        fresh = User.objects.create(
+            first_name="Fay", last_name="Fresh", email="fay@example.com",
+            phone="09179990000", password="x", visitor_type="Guest",
+        )
+        session = self.client.session
+        session["user_email"] = fresh.email
+        session["user_first_name"] = fresh.first_name  # as set by the login
+        session.save()
+
+        visit_date = next_bookable_day(timezone.localdate())
+        self.book({"department": DEPARTMENT, "purpose": "Campus tour visit", "visit_date": visit_date.isoformat()})
+        self.assertTrue(Visit.objects.filter(user_id=fresh.user_id, visit_date=visit_date).exists())
+        self.assertEqual(
+            DepartmentDailyQuota.objects.get(department_code="CCS", visit_date=visit_date).booked, 1
+        )
+
+    def test_recurring_booking(self):
+        today = timezone.localdate()
+        first = next_bookable_day(today)
+        until = today + timedelta(days=7)
+        self.book({
+            "department": DEPARTMENT,
+            "purpose": "Campus tour visit",
+            "visit_date": first.isoformat(),
+            "repeat_days": ["0", "1", "2", "3", "4", "5"],
+            "repeat_until": until.isoformat(),
+        })
+        booked = Visit.objects.filter(user_id=self.visitor.user_id, visit_date__gte=first)
+        expected = sum(1 for i in range((until - first).days + 1) if (first + timedelta(days=i)).weekday() != 6)
+        self.assertEqual(booked.count(), expected)
+
+    @override_settings(DEPARTMENT_DAILY_CAPACITY={"CCS": 1})
+    def test_recurring_booking_into_full_day(self):
+        today = timezone.localdate()
+        first = next_bookable_day(today)
+        second = next_bookable_day(first)
+        other = User.objects.create(
+            first_name="Ola", last_name="Other", email="ola@example.com",
+            phone="09177654321", password="x", visitor_type="Guest",
+        )
+        session = self.client.session
+        session["user_email"] = other.email
+        session["user_first_name"] = other.first_name
+        session.save()
+        self.book({"department": DEPARTMENT, "purpose": "Campus tour visit", "visit_date": second.isoformat()})
+        self.assertTrue(Visit.objects.filter(user_id=other.user_id, visit_date=second).exists())
+
+        session["user_email"] = self.visitor.email
+        session["user_first_name"] = self.visitor.first_name
+        session.save()
+        self.book({
+            "department": DEPARTMENT,
+            "purpose": "Campus tour visit",
+            "visit_date": first.isoformat(),
+            "repeat_days": [str(second.weekday())],
+            "repeat_until": second.isoformat(),
+        })
+        # All or nothing: the free first date was not booked either
+        self.assertFalse(Visit.objects.filter(user_id=self.visitor.user_id, visit_date__gte=first).exists())
+
+    def test_second_open_visit_on_a_day(self):
+        visit_date = next_bookable_day(timezone.localdate())
+        data = {"department": DEPARTMENT, "purpose": "Campus tour visit", "visit_date": visit_date.isoformat()}
+        self.book(data)
+        response = self.client.post(reverse("book_visit_app:book_visit"), data, follow=True)
+
+        self.assertContains(response, f"You already have a booking on {visit_date.strftime('%B %d, %Y')}")
+        self.assertEqual(Visit.objects.filter(user_id=self.visitor.user_id, visit_date=visit_date).count(), 1)
+
+    def test_other_integrity_errors_are_not_reported_as_double_bookings(self):
+        visit_date = next_bookable_day(timezone.localdate())
+        with mock.patch.object(visit_codes, "create_with_codes", side_effect=IntegrityError("visits_pkey")), \
+                self.assertLogs("book_visit_app.views", "ERROR"):
+            response = self.client.post(reverse("book_visit_app:book_visit"), {
+                "department": DEPARTMENT, "purpose": "Campus tour visit", "visit_date": visit_date.isoformat(),
+            }, follow=True)
+
+        self.assertContains(response, "Failed to save visit. Please try again.")
+        self.assertNotContains(response, "You already have a booking")
+
+
+@override_settings(DEPARTMENT_DAILY_CAPACITY={"CCS": 2})
+class CapacityTests(TestCase):
+
+    def setUp(self):
+        self.day = next_bookable_day(timezone.localdate())
+
+    def booked(self):
+        return DepartmentDailyQuota.objects.get(department_code="CCS", visit_date=self.day).booked
+
+    def open_visit(self, n):
+        capacity.reserve_slot(DEPARTMENT, self.day)
+        return Visit.objects.create(
+            user_email=f"v{n}@example.com", code=f"CIT-CCS-CAP{n}", purpose="Campus tour",
+            department=DEPARTMENT, visit_date=self.day, status="Upcoming",
+        )
+
+    def test_reserve_until_full(self):
+        self.assertEqual(capacity.reserve_slot(DEPARTMENT, self.day), "CCS")
+        capacity.reserve_slot(DEPARTMENT, self.day)
+        self.assertEqual(self.booked(), 2)
+        with self.assertRaises(capacity.DepartmentFull):
+            capacity.reserve_slot(DEPARTMENT, self.day)
+        self.assertEqual(self.booked(), 2)
+
+    def test_reserve_many_is_all_or_nothing(self):
+        capacity.reserve_slot(DEPARTMENT, self.day)
+        with self.assertRaises(capacity.DepartmentFull):
+            capacity.reserve_slot(DEPARTMENT, self.day, count=2)
+        self.assertEqual(self.booked(), 1)
+
+    def test_release(self):
+        capacity.reserve_slot(DEPARTMENT, self.day)
+        capacity.release_slot(DEPARTMENT, self.day)
+        capacity.release_slot(DEPARTMENT, self.day)  # never below zero
+        self.assertEqual(self.booked(), 0)
+
+    def test_unlimited_department(self):
+        self.assertEqual(capacity.reserve_slot("Registrar", self.day), None)
+        self.assertFalse(DepartmentDailyQuota.objects.exists())
+
+    def test_rolled_back_booking_keeps_its_slot_free(self):
+        capacity.reserve_slot(DEPARTMENT, self.day)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                capacity.reserve_slot(DEPARTMENT, self.day)
+                raise RuntimeError("visit insert failed")
+        self.assertEqual(self.booked(), 1)
+
+    def test_deleting_a_visit_releases_its_slot(self):
+        visit = self.open_visit(1)
+        self.open_visit(2)
+        visit.delete()
+        self.assertEqual(self.booked(), 1)
+        Visit.objects.filter(visit_date=self.day).delete()
+        self.assertEqual(self.booked(), 0)
+
+    @override_settings(DEPARTMENT_DAILY_CAPACITY={"CCS": 3})
+    def test_delete_and_recount_agree(self):
+        completed, expired, cancelled = self.open_visit(1), self.open_visit(2), self.open_visit(3)
+        Visit.objects.filter(pk=completed.pk).update(status="Completed")
+        Visit.objects.filter(pk=expired.pk).update(status="Expired")
+        Visit.objects.filter(pk=cancelled.pk).update(status="Cancelled")
+        capacity.release_slot(DEPARTMENT, self.day)  # the cancellation
+        self.assertEqual(self.booked(), 2)
+
+        Visit.objects.get(pk=completed.pk).delete()
+        Visit.objects.get(pk=cancelled.pk).delete()
+        self.assertEqual(self.booked(), 1)
+        self.assertEqual(capacity.recount_slots([self.day]), [])
+
+    def test_recount_fixes_drift(self):
+        self.open_visit(1)
+        DepartmentDailyQuota.objects.update(booked=2)
+        call_command("recount_department_quotas", stdout=StringIO())
+        self.assertEqual(self.booked(), 1)
@@ -2,114 +2,29 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 from django.conf import settings
 from django.utils import timezone
+from django.db import IntegrityError, transaction
 
 import logging
-import random
-import string
 import re
 from datetime import datetime, timedelta, time as dtime
 
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
-
 from manage_reports_logs_app import services as logs_services
+from dashboard_app import visit_codes
+from . import capacity
+from .departments import DEPARTMENT_CODE_MAP, department_code, visit_code_part
+from email_outbox_app import services as outbox
 from dashboard_app.models import Visit
-from register_app.models import User
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
-DEPARTMENT_CODE_MAP = {
-    # 🎓 Academic Colleges / Departments
-    "College of Engineering and Architecture (CEA)": "CEA",
-    "College of Computer Studies (CCS)": "CCS",
-    "College of Management, Business and Accountancy (CMBA)": "CMBA",
-    "College of Arts, Sciences and Education (CASE)": "CASE",
-    "College of Nursing and Allied Health Sciences (CNAHS)": "CNAHS",
-    "College of Criminal Justice (CCJ)": "CCJ",
-    "Senior High School Department": "SHS",
-    "Basic Education Department (BED)": "BED",
-
-    # 🏫 Academic Support Units
-    "Learning Resource and Activity Center (LRAC)": "LRAC",
-    "Student Success Office (SSO)": "SSO",
-    "Office of Student Affairs (OSA)": "OSA",
-    "Office of Student Discipline (OSD)": "OSD",
-    "Curriculum and Instruction Office (CIO)": "CIO",
-    "Center for Teaching and Learning (CTL)": "CTL",
-    "Center for Research and Development (CRD)": "CRD",
-    "Center for Community Extension (CCE)": "CCE",
-    "Guidance Services Office (GSO)": "GSO",
-
-    # 💰 Administrative & Finance Offices
-    "Office of Admissions and Scholarships (OAS)": "OAS",
-    "University Registrar's Office (URO)": "URO",
-    "Finance and Accounting Office (FAO)": "FAO",
-    "Cashier's Office": "CASH",
-    "Human Resource Department (HRD)": "HRD",
-    "Property and Supply Office (PSO)": "PSO",
-    "Physical Plant Office (PPO)": "PPO",
-    "ICT / MIS Office": "MIS",
-    "Purchasing Office": "PURC",
-    "Maintenance Office": "MAIN",
-    "Janitorial Services Office": "JAN",
-
-    # 🌐 External & Institutional Offices
-    "Institutional Planning and Development Office (IPDO)": "IPDO",
-    "Networking, Linkages & Relations (NLR)": "NLR",
-    "Public Relations and Communications Office (PRCO)": "PRCO",
-    "Quality Assurance Office (QAO)": "QAO",
-    "Alumni Affairs Office (AAO)": "AAO",
-    "Industry-Academe Linkage Office (IALO)": "IALO",
-    "Technology Business Incubation Office (TBI Office)": "TBI",
-    "Internal Audit Office (IAO)": "IAO",
-
-    # 🛡 Campus Services
-    "Security Office": "SEC",
-    "Clinic / Health Services Office": "CLINIC",
-
-    # 🏛 Executive Offices
-    "Office of the University President": "OP",
-    "Office of the Executive Vice President": "EVP",
-    "Office of the VP for Academic Affairs (VPAA)": "VPAA",
-    "Office of the VP for Administration (VPA)": "VPA",
-    "Office of the VP for Finance (VPF)": "VPF",
-    "Office of the VP for External Affairs (VPEA)": "VPEA",
-
-    # Catch-all
-    "Other": "OTH",
-}
-
 
 def generate_visit_code(department: str) -> str:
     """
-    Generate a unique visit code, e.g. CIT-CCS-A1B2C.
-
-    The middle part is always exactly 3 characters:
-    - Prefer a mapped department code from DEPARTMENT_CODE_MAP
-    - Otherwise derive from the department string.
+    Allocate a unique visit code, e.g. CIT-CCS-7QX2M.
+    Suffixes come from the collision-free allocator, so no uniqueness query is needed.
     """
-    random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-
-    dept_raw = (department or "VIS").strip()
-    code_part = DEPARTMENT_CODE_MAP.get(dept_raw)
-
-    # Case-insensitive match if direct lookup failed
-    if not code_part:
-        for name, abbr in DEPARTMENT_CODE_MAP.items():
-            if dept_raw.lower() == name.lower():
-                code_part = abbr
-                break
-
-    if not code_part:
-        cleaned = re.sub(r"[^A-Za-z0-9]", "", dept_raw).upper()
-    else:
-        cleaned = re.sub(r"[^A-Za-z0-9]", "", str(code_part).upper())
-
-    cleaned = cleaned or "VIS"
-    code_part = cleaned[:3]  # ensure exactly 3 chars
-
-    return f"CIT-{code_part}-{random_str}"
+    return visit_codes.new_visit_code(visit_code_part(department))
 
 
 def _looks_like_nonsense(text: str) -> bool:
@@ -132,6 +47,43 @@ def _looks_like_nonsense(text: str) -> bool:
     return False
 
 
+WEEKDAY_CHOICES = [(0, "Mon"), (1, "Tue"), (2, "Wed"), (3, "Thu"), (4, "Fri"), (5, "Sat")]
+
+
+def recurring_dates(first_date, repeat_days, repeat_until_str, max_date):
+    """
+    Dates to book: `first_date` plus every selected weekday (0=Mon … 5=Sat)
+    up to `repeat_until`. Same rules as a single booking: no Sundays and
+    nothing past `max_date`. Raises ValueError with a user-facing message.
+    """
+    if not repeat_days and not repeat_until_str:
+        return [first_date]
+
+    if not repeat_days or not repeat_until_str:
+        raise ValueError("To repeat a visit, choose the days of the week and an end date.")
+
+    try:
+        weekdays = {int(d) for d in repeat_days}
+        repeat_until = datetime.strptime(repeat_until_str, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("Invalid repeat settings.")
+
+    if not weekdays <= {d for d, _ in WEEKDAY_CHOICES}:
+        raise ValueError("Visits cannot be scheduled on Sundays.")
+    if repeat_until < first_date:
+        raise ValueError("The repeat end date must be on or after the visit date.")
+    if repeat_until > max_date:
+        raise ValueError("You can only book a visit up to 7 days in advance.")
+
+    dates = []
+    day = first_date
+    while day <= repeat_until:
+        if day == first_date or day.weekday() in weekdays:
+            dates.append(day)
+        day += timedelta(days=1)
+    return dates
+
+
 def book_visit_view(request):
     """
     Visitor books a campus visit with email confirmation.
@@ -140,8 +92,11 @@ def book_visit_view(request):
     - User must be logged in
     - Department and Purpose must be present and not obvious nonsense
     - Visit date must be today or future, not Sunday, and within 7 days
-    - Only one active booking per user per day (Upcoming/Active)
-    - Uses SendGrid to send confirmation email
+    - Optional recurrence (weekdays + end date, same window) books every
+      resulting date at once, with one confirmation email listing all codes
+    - Only one active booking per user per day (Upcoming/Active), enforced by a unique index
+    - Department daily capacity (book_visit_app.capacity)
+    - Queues the confirmation email in the outbox (same transaction as the visit)
     - Logs action in reports/logs service
     """
 
@@ -152,19 +107,16 @@ def book_visit_view(request):
 
     user_email = request.session["user_email"]
 
-    # ===== LOAD USER =====
-    try:
-        user = User.objects.get(email=user_email)
-        user_id = user.user_id
-        first_name = user.first_name
-        request.session["user_first_name"] = first_name
-    except User.DoesNotExist:
+    # ===== LOAD USER (resolved and cached by PrincipalMiddleware) =====
+    visitor = request.principals.get("visitor")
+    if visitor is None:
         messages.error(request, "User not found. Please log in again.")
         return redirect("login_app:login")
-    except Exception as e:
-        logger.error(f"Error retrieving user: {str(e)}")
-        messages.error(request, "Unexpected error. Please try again.")
-        return redirect("login_app:login")
+
+    user_id = visitor.pk
+    first_name = visitor.first_name
+    if request.session.get("user_first_name") != first_name:
+        request.session["user_first_name"] = first_name
 
     # ===== POST: HANDLE FORM SUBMISSION =====
     if request.method == "POST":
@@ -260,111 +212,121 @@ def book_visit_view(request):
                 return redirect("book_visit_app:book_visit")
 
             # ===============================
-            # CHECK FOR EXISTING ACTIVE BOOKING THAT DAY
+            # RECURRENCE (optional): repeat on the chosen weekdays until a date
             # ===============================
-            existing_visit = (
-                Visit.objects
-                .filter(
-                    user_id=user_id,
-                    visit_date=visit_date,
-                    status__in=["Upcoming", "Active"]  # ✅ only these block
-                )
-                .first()
-            )
-
-            if existing_visit:
-                visit_date_human = visit_date.strftime("%B %d, %Y")
-                messages.error(
-                    request,
-                    f"You already have a booking on {visit_date_human}. "
-                    f"Please cancel your existing booking first before creating another one for the same day."
+            try:
+                visit_dates = recurring_dates(
+                    visit_date,
+                    request.POST.getlist("repeat_days"),
+                    (request.POST.get("repeat_until") or "").strip(),
+                    max_date,
                 )
+            except ValueError as e:
+                messages.error(request, str(e))
                 return redirect("book_visit_app:book_visit")
 
             # ===============================
-            # GENERATE UNIQUE VISIT CODE
+            # CREATE VISIT RECORD(S) + QUEUE CONFIRMATION EMAIL (one transaction)
+            # Codes allocated in bulk without uniqueness queries; the email is
+            # delivered by `manage.py send_queued_emails`.
+            # One Upcoming/Active visit per day is enforced by the
+            # visits_one_open_per_day unique index, so a double submit
+            # (or two tabs) fails here instead of creating a duplicate.
             # ===============================
-            code = generate_visit_code(raw_department)
-            attempts = 0
+            try:
+                with transaction.atomic():
+                    # Department daily quota (one conditional UPDATE over the counter rows)
+                    capacity.reserve_slots(raw_department, visit_dates)
+
+                    visits = visit_codes.create_with_codes(
+                        [
+                            Visit(
+                                user_id=user_id,
+                                user_email=user_email,
+                                purpose=raw_purpose,
+                                department=raw_department,
+                                visit_date=d,
+                                start_time=None,
+                                end_time=None,
+                                status="Upcoming",
+                            )
+                            for d in visit_dates
+                        ],
+                        visit_code_part(raw_department),
+                    )
 
-            while Visit.objects.filter(code=code).exists() and attempts < 5:
-                attempts += 1
-                code = generate_visit_code(raw_department)
+                    subject = "CIT-U CampusPass • Visit Booking Confirmation"
+                    if len(visits) == 1:
+                        visit_lines = (
+                            f"• Visit Code: {visits[0].code}\n"
+                            f"• Visit Date: {visits[0].visit_date.strftime('%B %d, %Y')}\n"
+                        )
+                        intro = "Your campus visit has been successfully booked."
+                    else:
+                        visit_lines = "".join(
+                            f"• {v.visit_date.strftime('%a, %B %d, %Y')}: {v.code}\n"
+                            for v in visits
+                        )
+                        intro = f"Your {len(visits)} campus visits have been successfully booked."
+
+                    text_body = (
+                        f"Hi {first_name},\n\n"
+                        f"{intro}\n\n"
+                        f"Visit Details:\n"
+                        f"{visit_lines}"
+                        f"• Department: {raw_department}\n"
+                        f"• Purpose: {raw_purpose}\n\n"
+                        f"Please save your visit code{'s' if len(visits) > 1 else ''}.\n"
+                        f"You will present {'each' if len(visits) > 1 else 'this'} during check-in.\n\n"
+                        f"Thank you,\n"
+                        f"CIT-U CampusPass System"
+                    )
 
-            if Visit.objects.filter(code=code).exists():
-                messages.error(request, "Could not generate a unique visit code. Please try again.")
+                    outbox.queue_email(user_email, subject, text_body, category="visit_booking")
+            except capacity.DepartmentFull as full:
+                messages.error(
+                    request,
+                    f"{raw_department} is fully booked on {full.visit_date.strftime('%B %d, %Y')}. "
+                    f"Please choose another date."
+                )
                 return redirect("book_visit_app:book_visit")
-
-            # ===============================
-            # CREATE VISIT RECORD
-            # ===============================
-            try:
-                visit = Visit(
-                    user_id=user_id,
-                    user_email=user_email,
-                    code=code,
-                    purpose=raw_purpose,
-                    department=raw_department,
-                    visit_date=visit_date,
-                    start_time=None,
-                    end_time=None,
-                    status="Upcoming",
+            except IntegrityError as integrity_error:
+                # Only visits_one_open_per_day is the visitor's doing: confirm it
+                # by finding the open visit it collided with (the error text names
+                # no constraint on SQLite).
+                taken = list(
+                    Visit.objects
+                    .filter(user_id=user_id, visit_date__in=visit_dates, status__in=["Upcoming", "Active"])
+                    .order_by("visit_date")
+                    .values_list("visit_date", flat=True)
                 )
-                visit.save()
+                if not taken:
+                    logger.error(f"Database error while saving visit: {str(integrity_error)}")
+                    messages.error(request, "Failed to save visit. Please try again.")
+                    return redirect("book_visit_app:book_visit")
+                dates_human = ", ".join(d.strftime("%B %d, %Y") for d in taken)
+                messages.error(
+                    request,
+                    f"You already have a booking on {dates_human}. "
+                    f"Please cancel your existing booking first before creating another one for the same day."
+                )
+                return redirect("book_visit_app:book_visit")
             except Exception as db_error:
                 logger.error(f"Database error while saving visit: {str(db_error)}")
                 messages.error(request, "Failed to save visit. Please try again.")
                 return redirect("book_visit_app:book_visit")
 
-            # ===============================
-            # SEND EMAIL USING SENDGRID
-            # ===============================
-            try:
-                subject = "CIT-U CampusPass • Visit Booking Confirmation"
-                visit_date_human = visit_date.strftime("%B %d, %Y")
-
-                text_body = (
-                    f"Hi {first_name},\n\n"
-                    f"Your campus visit has been successfully booked.\n\n"
-                    f"Visit Details:\n"
-                    f"• Visit Code: {code}\n"
-                    f"• Visit Date: {visit_date_human}\n"
-                    f"• Department: {raw_department}\n"
-                    f"• Purpose: {raw_purpose}\n\n"
-                    f"Please save your visit code.\n"
-                    f"You will present this during check-in.\n\n"
-                    f"Thank you,\n"
-                    f"CIT-U CampusPass System"
-                )
-
-                message = Mail(
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    to_emails=user_email,
-                    subject=subject,
-                    plain_text_content=text_body,
-                )
-
-                sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-                sg.send(message)
-
-                logger.info(f"SendGrid email sent to {user_email}")
-
-            except Exception as email_error:
-                logger.error(f"SendGrid email failed: {str(email_error)}")
-                messages.warning(
-                    request,
-                    f"Visit booked but email could not be sent. "
-                    f"Your visit code is {code}."
-                )
+            codes = ", ".join(v.code for v in visits)
 
             # ===============================
             # LOG USER ACTION
             # ===============================
             try:
+                dates_str = ", ".join(d.strftime("%Y-%m-%d") for d in visit_dates)
                 logs_services.create_log(
                     actor=f"{first_name} ({user_email})",
                     action_type="Visit Booking",
-                    description=f"Booked visit for {visit_date_str} in {raw_department} for '{raw_purpose}'.",
+                    description=f"Booked visit for {dates_str} in {raw_department} for '{raw_purpose}'.",
                     actor_role="Visitor",
                 )
             except Exception as log_error:
@@ -373,7 +335,10 @@ def book_visit_view(request):
             # ===============================
             # SUCCESS & REDIRECT
             # ===============================
-            messages.success(request, f"Visit booked successfully! Your code is: {code}")
+            if len(visits) == 1:
+                messages.success(request, f"Visit booked successfully! Your code is: {codes}")
+            else:
+                messages.success(request, f"{len(visits)} visits booked successfully! Your codes are: {codes}")
             messages.info(request, "A confirmation email has been sent to your inbox.")
             return redirect("dashboard_app:dashboard")
 
@@ -413,6 +378,7 @@ def book_visit_view(request):
     context = {
         "user_first_name": first_name,
         "prefill_date": prefill_date,
+        "weekday_choices": WEEKDAY_CHOICES,
     }
 
     return render(
@@ -5,4 +5,8 @@ export DJANGO_SETTINGS_MODULE=citu_campuspass.settings
 
 pip install -r requirements.txt
 python manage.py migrate
+python manage.py backfill_identity_columns
+python manage.py ensure_indexes
+python manage.py recount_department_quotas
+python manage.py setup_visitor_search
 python manage.py collectstatic --noinput
\ No newline at end of file
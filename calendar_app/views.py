@@ -3,6 +3,8 @@ from django.utils.timezone import now as django_now
 from datetime import date, timedelta
 import calendar
 from dashboard_app.models import Visit
+from book_visit_app import capacity
+from book_visit_app.departments import DEPARTMENT_NAMES
 import pytz
 
 PHILIPPINES_TZ = pytz.timezone('Asia/Manila')
@@ -40,6 +42,20 @@ def calendar_view(request):
         date_str = visit.visit_date.strftime("%Y-%m-%d")
         visits_by_date.setdefault(date_str, []).append(visit)
 
+    # Remaining department slots for bookable days shown on this page
+    # (one query over the quota counters)
+    bookable_days = [
+        d for week in weeks for d in week
+        if today <= d <= max_booking_date and d.weekday() != 6
+    ]
+    slots_by_date = {}
+    for day, remaining in capacity.remaining_slots(bookable_days).items():
+        if remaining:
+            slots_by_date[day.strftime("%Y-%m-%d")] = [
+                {"code": code, "name": DEPARTMENT_NAMES.get(code, code), "remaining": left}
+                for code, left in sorted(remaining.items())
+            ]
+
     first_day_curr = date(year, month, 1)
     prev_month_date = first_day_curr - timedelta(days=1)
     next_month_date = (first_day_curr + timedelta(days=32)).replace(day=1)
@@ -54,6 +70,7 @@ def calendar_view(request):
         "month_name": calendar.month_name[month],
         "weeks": weeks,
         "visits_by_date": visits_by_date,
+        "slots_by_date": slots_by_date,
         "prev_year": prev_month_date.year,
         "prev_month": prev_month_date.month,
         "next_year": next_month_date.year,
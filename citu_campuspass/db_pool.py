@@ -0,0 +1,88 @@
+# citu_campuspass/db_pool.py
+"""
+Connection reuse metrics for the instrumented PostgreSQL backend
+(citu_campuspass/postgresql), per gunicorn worker process:
+
+    checkouts            connections handed to Django (a handshake unless pooled)
+    checkout_ms_total    time spent getting them (TCP+TLS+auth, or pool wait)
+    checkout_errors      failed attempts
+    checked_out          connections currently held by this process
+    health_check_fails   reused connections that were dead and replaced
+    requests             requests served, for the reuse ratio
+
+In pool mode the psycopg pool's own counters are added under "pool".
+"""
+import os
+import threading
+
+from django.conf import settings
+from django.core import checks
+from django.db import connections
+
+_lock = threading.Lock()
+_counters = {
+    "checkouts": 0,
+    "checkout_ms_total": 0.0,
+    "checkout_errors": 0,
+    "checked_out": 0,
+    "health_check_fails": 0,
+    "requests": 0,
+}
+
+
+def record(name, amount=1):
+    with _lock:
+        _counters[name] += amount
+
+
+def request_started(sender, **kwargs):
+    record("requests")
+
+
+def connections_per_worker():
+    """Connections one gunicorn worker can hold at once."""
+    if getattr(settings, "DB_POOL_MODE", "persistent") == "pool":
+        return settings.DB_POOL_MAX_SIZE
+    return getattr(settings, "GUNICORN_THREADS", 1)
+
+
+def connection_budget():
+    workers = getattr(settings, "WEB_CONCURRENCY", 1)
+    per_worker = connections_per_worker()
+    return {
+        "workers": workers,
+        "per_worker": per_worker,
+        "reserved": getattr(settings, "DB_RESERVED_CONNECTIONS", 0),
+        "needed": workers * per_worker + getattr(settings, "DB_RESERVED_CONNECTIONS", 0),
+        "limit": getattr(settings, "DB_MAX_CONNECTIONS", 0),
+    }
+
+
+def stats():
+    with _lock:
+        data = dict(_counters)
+    data["checkout_ms_avg"] = round(data["checkout_ms_total"] / data["checkouts"], 2) if data["checkouts"] else 0
+    data["checkout_ms_total"] = round(data["checkout_ms_total"], 2)
+    data["checkouts_per_request"] = round(data["checkouts"] / data["requests"], 3) if data["requests"] else 0
+    data["mode"] = getattr(settings, "DB_POOL_MODE", "persistent")
+    data["pid"] = os.getpid()
+    data["budget"] = connection_budget()
+
+    pool = getattr(connections["default"], "pool", None)
+    if pool is not None:
+        data["pool"] = pool.get_stats()
+    return data
+
+
+def check_connection_budget(app_configs=None, **kwargs):
+    """System check: workers x connections per worker must fit the server limit."""
+    budget = connection_budget()
+    if budget["limit"] and budget["needed"] > budget["limit"]:
+        return [checks.Warning(
+            f"{budget['workers']} workers x {budget['per_worker']} connections "
+            f"+ {budget['reserved']} reserved = {budget['needed']} database connections, "
+            f"but DB_MAX_CONNECTIONS is {budget['limit']}.",
+            hint="Lower WEB_CONCURRENCY, GUNICORN_THREADS or DB_POOL_MAX_SIZE, or use DB_POOL_MODE=pgbouncer.",
+            id="citu_campuspass.W001",
+        )]
+    return []
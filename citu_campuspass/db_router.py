@@ -0,0 +1,107 @@
+# citu_campuspass/db_router.py
+"""
+Read replica routing.
+
+Read-only paths (reports, logs, visit record exports, visitor search) run
+inside replica_reads(), used as a decorator or a `with` block. ORM reads
+in there go to settings.REPLICA_DATABASE. Every other read and every
+write goes to the primary ("default").
+
+Read-your-writes:
+- once a request writes, the rest of that request reads from the primary;
+- ReplicaMiddleware then sets a short-lived cookie, so the same browser
+  keeps reading from the primary for REPLICA_PIN_SECONDS (longer than the
+  replica usually lags behind);
+- reads inside a transaction on the primary stay on the primary.
+
+Without DATABASE_REPLICA_URL, REPLICA_DATABASE is None and everything
+reads from the primary as before.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = "db_primary"
+
+# Writes that don't change what the read paths show (sessions are saved all the time)
+UNTRACKED_APPS = {"sessions"}
+
+_replica_scope = ContextVar("replica_scope", default=False)
+_pinned = ContextVar("pinned_to_primary", default=False)  # cookie from an earlier write
+_wrote = ContextVar("wrote_to_primary", default=False)    # this request (or command) wrote
+
+
+@contextmanager
+def replica_reads():
+    """Send the ORM reads inside to the replica (if there is one)."""
+    token = _replica_scope.set(True)
+    try:
+        yield
+    finally:
+        _replica_scope.reset(token)
+
+
+@contextmanager
+def tracking_writes(pinned=False):
+    """
+    Fresh read-your-writes state for one request: `pinned` when an earlier
+    request of this browser wrote. Yields a function telling whether
+    anything was written since.
+    """
+    pinned_token = _pinned.set(pinned)
+    wrote_token = _wrote.set(False)
+    try:
+        yield _wrote.get
+    finally:
+        _pinned.reset(pinned_token)
+        _wrote.reset(wrote_token)
+
+
+def replica_alias():
+    """The alias reads would go to right now."""
+    replica = getattr(settings, "REPLICA_DATABASE", None)
+    if not replica or not _replica_scope.get() or _pinned.get() or _wrote.get():
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return replica
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in UNTRACKED_APPS:
+            _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # both aliases hold the same data
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS  # the replica follows the primary
+
+
+class ReplicaMiddleware:
+    """Pins a browser to the primary for a while after one of its requests wrote."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with tracking_writes(pinned=PIN_COOKIE in request.COOKIES) as wrote:
+            response = self.get_response(request)
+            if wrote() and getattr(settings, "REPLICA_DATABASE", None):
+                response.set_cookie(
+                    PIN_COOKIE,
+                    "1",
+                    max_age=settings.REPLICA_PIN_SECONDS,
+                    secure=settings.SESSION_COOKIE_SECURE,
+                    httponly=True,
+                    samesite="Lax",
+                )
+        return response
@@ -0,0 +1,36 @@
+# citu_campuspass/postgresql/base.py
+"""
+Django's PostgreSQL backend with connection metrics (citu_campuspass/db_pool.py).
+Behaviour is unchanged; only checkouts, their latency and failures are counted.
+"""
+import time
+
+from django.db.backends.postgresql import base
+
+from citu_campuspass import db_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_new_connection(self, conn_params):
+        started = time.monotonic()
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            db_pool.record("checkout_errors")
+            raise
+        db_pool.record("checkout_ms_total", (time.monotonic() - started) * 1000)
+        db_pool.record("checkouts")
+        db_pool.record("checked_out")
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            db_pool.record("checked_out", -1)
+        return super()._close()
+
+    def is_usable(self):
+        usable = super().is_usable()
+        if not usable:
+            db_pool.record("health_check_fails")
+        return usable
@@ -0,0 +1,87 @@
+# citu_campuspass/query_budget.py
+"""
+Per-view query budgets.
+
+QueryBudgetMiddleware counts the queries each request runs and the time
+spent in the database, on every configured connection. Requests over
+budget are logged with the view's URL name, which is also the key for
+per-view budgets:
+
+    QUERY_BUDGETS = {"default": (30, 300), "dashboard_app:staff_dashboard": (20, 200)}
+
+A budget is (max queries, max DB milliseconds). A view can charge a request
+to another entry with charge_to(), e.g. its cache-miss path:
+
+    charge_to(request, "dashboard_app:admin_dashboard:miss")
+
+With QUERY_BUDGET_HEADERS
+(on when DEBUG) the numbers are sent as X-DB-Queries / X-DB-Time-Ms.
+The budget tests in the apps' tests.py use the same budget_for().
+"""
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def budget_for(view_name):
+    """(max queries, max DB ms) for a URL name like "dashboard_app:dashboard"."""
+    budgets = getattr(settings, "QUERY_BUDGETS", {})
+    return budgets.get(view_name) or budgets.get("default", (50, 500))
+
+
+def charge_to(request, budget_name):
+    """Count this request against the QUERY_BUDGETS entry `budget_name`."""
+    request.query_budget = budget_name
+
+
+class QueryCounter:
+    """connection.execute_wrapper() callback totalling queries and time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.monotonic() - started
+
+    @property
+    def ms(self):
+        return round(self.seconds * 1000, 1)
+
+
+class QueryBudgetMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+            response = self.get_response(request)
+
+        match = getattr(request, "resolver_match", None)
+        view_name = getattr(request, "query_budget", None) or (match.view_name if match else request.path)
+        max_queries, max_ms = budget_for(view_name)
+
+        if counter.count > max_queries or counter.ms > max_ms:
+            logger.warning(
+                f"Query budget exceeded by {view_name}: {counter.count} queries "
+                f"in {counter.ms} ms (budget {max_queries} queries / {max_ms} ms)"
+            )
+
+        if getattr(settings, "QUERY_BUDGET_HEADERS", settings.DEBUG):
+            response["X-DB-Queries"] = str(counter.count)
+            response["X-DB-Time-Ms"] = str(counter.ms)
+        return response
@@ -2,10 +2,12 @@
 Django settings for citu_campuspass project.
 """
 
+import importlib.util
 import os
 from pathlib import Path
 from dotenv import load_dotenv
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 
 # Base Directory
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,7 +26,7 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 default_sqlite = f"sqlite:///{BASE_DIR / 'db.sqlite3'}"
 
 # SECURITY
-SECRET_KEY = 'django-insecure-b8r!x^&twa6+#0sb^ek*w2rpe2d@-(u5%kbjwy9gd!$yz94_fj'
+SECRET_KEY = os.getenv("SECRET_KEY", 'django-insecure-b8r!x^&twa6+#0sb^ek*w2rpe2d@-(u5%kbjwy9gd!$yz94_fj')
 DEBUG = os.getenv("DEBUG", "False") == "True"
 
 ALLOWED_HOSTS = ["*"]
@@ -56,16 +58,20 @@ INSTALLED_APPS = [
     'visitor_search_app',
     'staff_visit_records_app',
     'calendar_app',
+    'email_outbox_app',
 ]
 
 # Middleware
 MIDDLEWARE = [
+    'citu_campuspass.query_budget.QueryBudgetMiddleware',
+    'citu_campuspass.db_router.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'login_app.middleware.PrincipalMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -93,14 +99,74 @@ TEMPLATES = [
 WSGI_APPLICATION = 'citu_campuspass.wsgi.application'
 
 # Database (Supabase)
+# DB_POOL_MODE decides how connections are reused:
+#   persistent  (default) each gunicorn thread keeps its connection for
+#               DB_CONN_MAX_AGE seconds and pings it before reuse
+#   pool        a psycopg 3 pool per worker (needs `psycopg[binary,pool]`)
+#   pgbouncer   persistent connections to a transaction pooler such as
+#               Supabase's on port 6543 (no server-side cursors)
+#   off         a new connection for every request
+# Connections per worker follow GUNICORN_THREADS (see gunicorn.conf.py);
+# `manage.py check` warns when WEB_CONCURRENCY x that exceeds
+# DB_MAX_CONNECTIONS. Metrics: citu_campuspass/db_pool.py.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "2"))
+GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "1"))
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "persistent")
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE", "300"))
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", str(GUNICORN_THREADS)))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))  # 0 = don't check
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "2"))  # email worker, manage.py
+
+if DB_POOL_MODE not in ("persistent", "pool", "pgbouncer", "off"):
+    raise ImproperlyConfigured("DB_POOL_MODE must be persistent, pool, pgbouncer or off.")
+
+_DATABASE_URL = os.getenv("DATABASE_URL", default_sqlite)
+_IS_POSTGRES = _DATABASE_URL.startswith(("postgres://", "postgresql://", "pgsql://"))
+
 DATABASES = {
     "default": dj_database_url.config(
-        default=os.getenv("DATABASE_URL", default_sqlite),
-        conn_max_age=0,
-        ssl_require=True
+        default=_DATABASE_URL,
+        conn_max_age=DB_CONN_MAX_AGE if DB_POOL_MODE in ("persistent", "pgbouncer") else 0,
+        conn_health_checks=True,
+        # sqlite has no sslmode option; DB_SSL_REQUIRE=False for a local Postgres
+        ssl_require=_IS_POSTGRES and os.getenv("DB_SSL_REQUIRE", "True") == "True",
     )
 }
 
+# Read replica (optional). Reports, logs, visit record exports and visitor
+# search read from it (citu_campuspass/db_router.py); a browser that just
+# wrote reads from the primary for REPLICA_PIN_SECONDS. Tests mirror it
+# onto the default test database.
+_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "")
+if _REPLICA_URL:
+    DATABASES["replica"] = dj_database_url.parse(
+        _REPLICA_URL,
+        conn_max_age=DATABASES["default"]["CONN_MAX_AGE"],
+        conn_health_checks=True,
+        ssl_require=_IS_POSTGRES and os.getenv("DB_SSL_REQUIRE", "True") == "True",
+    )
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+REPLICA_DATABASE = "replica" if _REPLICA_URL else None
+REPLICA_PIN_SECONDS = int(os.getenv("REPLICA_PIN_SECONDS", "15"))
+DATABASE_ROUTERS = ["citu_campuspass.db_router.ReplicaRouter"]
+
+if _IS_POSTGRES:
+    if DB_POOL_MODE == "pool" and importlib.util.find_spec("psycopg_pool") is None:
+        raise ImproperlyConfigured("DB_POOL_MODE=pool needs psycopg 3: pip install 'psycopg[binary,pool]'.")
+    for _db in DATABASES.values():
+        # Same backend, plus connect/health-check counters (db_pool.stats())
+        _db["ENGINE"] = "citu_campuspass.postgresql"
+        if DB_POOL_MODE == "pool":
+            _db["OPTIONS"]["pool"] = {
+                "min_size": DB_POOL_MIN_SIZE,
+                "max_size": DB_POOL_MAX_SIZE,
+                "timeout": DB_POOL_TIMEOUT,
+            }
+        elif DB_POOL_MODE == "pgbouncer":
+            _db["DISABLE_SERVER_SIDE_CURSORS"] = True
+
 # Password Validators
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -109,6 +175,27 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Password hashing (login_app/hashers.py). The first hasher hashes new
+# passwords, the rest still verify old ones; hashes made with another
+# algorithm/cost are upgraded on the next successful login.
+#   PASSWORD_HASH_ALGORITHM: pbkdf2 | scrypt | argon2 (argon2-cffi) | bcrypt (bcrypt)
+#   PASSWORD_HASH_COST: pbkdf2 iterations, scrypt work factor, argon2 time
+#   cost or bcrypt rounds; empty = Django's default for the algorithm.
+# Measure with `python manage.py benchmark_password_hashing`.
+PASSWORD_HASH_ALGORITHM = os.getenv("PASSWORD_HASH_ALGORITHM", "pbkdf2").lower()
+PASSWORD_HASH_COST = int(os.getenv("PASSWORD_HASH_COST") or 0) or None
+_PASSWORD_HASHERS = {
+    "pbkdf2": "login_app.hashers.TunablePBKDF2PasswordHasher",
+    "scrypt": "login_app.hashers.TunableScryptPasswordHasher",
+    "argon2": "login_app.hashers.TunableArgon2PasswordHasher",
+    "bcrypt": "login_app.hashers.TunableBCryptSHA256PasswordHasher",
+}
+PASSWORD_HASHERS = [
+    _PASSWORD_HASHERS.get(PASSWORD_HASH_ALGORITHM, _PASSWORD_HASHERS["pbkdf2"]),
+    *(path for name, path in _PASSWORD_HASHERS.items() if name != PASSWORD_HASH_ALGORITHM),
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+]
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -137,6 +224,125 @@ DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "citucampuspass@gmail.com")
 # Disable SMTP (Render free tier blocks it)
 EMAIL_BACKEND = "django.core.mail.backends.dummy.EmailBackend"
 
+# Outbox delivery (`python manage.py send_queued_emails`). Empty = SendGrid when
+# SENDGRID_API_KEY is set, console otherwise. FileTransport writes JSON lines.
+EMAIL_OUTBOX_TRANSPORT = os.getenv("EMAIL_OUTBOX_TRANSPORT", "")
+EMAIL_OUTBOX_FILE_PATH = os.getenv("EMAIL_OUTBOX_FILE_PATH", os.path.join(BASE_DIR, "sent_emails.jsonl"))
+
+# ===========================
+# DEPARTMENT DAILY CAPACITY
+# ===========================
+# Default visits per department per day, keyed by DEPARTMENT_CODE_MAP code,
+# e.g. DEPARTMENT_DAILY_CAPACITY="URO=150,CASH=120". Departments not listed
+# are unlimited. Per-date overrides: edit DepartmentDailyQuota rows in admin.
+DEPARTMENT_DAILY_CAPACITY = {
+    code.strip().upper(): int(limit)
+    for code, _, limit in (
+        item.partition("=") for item in os.getenv("DEPARTMENT_DAILY_CAPACITY", "").split(",")
+    )
+    if code.strip() and limit.strip()
+}
+
+# ===========================
+# CACHE
+# ===========================
+# CACHE_URL makes the cache shared by all gunicorn workers (throttling,
+# login miss cache, ...):
+#   redis://host:6379/0           (needs the `redis` package)
+#   file:///tmp/campuspass-cache  (one dyno, no extra service)
+# Without it every worker has its own local-memory cache, and the login miss
+# and session principal caches are switched off (see login_app/principals.py).
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    _CACHE = {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_URL}
+elif CACHE_URL.startswith("file://"):
+    _CACHE = {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": CACHE_URL[len("file://"):]}
+else:
+    _CACHE = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+CACHES = {"default": _CACHE}
+
+# Token buckets for login_app/throttling.py: "<burst>/<period>", refilled
+# evenly over the period. Keys: "<endpoint>:ip" and "<endpoint>:identifier".
+THROTTLE_RATES = {
+    "login:ip": os.getenv("THROTTLE_LOGIN_IP", "30/10m"),
+    "login:identifier": os.getenv("THROTTLE_LOGIN_IDENTIFIER", "10/10m"),
+    "forgot_password:ip": os.getenv("THROTTLE_FORGOT_PASSWORD_IP", "10/h"),
+    "forgot_password:identifier": os.getenv("THROTTLE_FORGOT_PASSWORD_IDENTIFIER", "3/h"),
+    "check_code:ip": os.getenv("THROTTLE_CHECK_CODE_IP", "120/m"),
+    "check_code:identifier": os.getenv("THROTTLE_CHECK_CODE_STAFF", "60/m"),
+}
+
+# ===========================
+# SESSIONS
+# ===========================
+# SESSION_BACKEND picks where sessions live:
+#   db              one query per request to load the session (the old default)
+#   cached_db       reads from CACHE_URL, writes through to the database
+#   cache           CACHE_URL only; sessions are lost if the cache is flushed
+#   signed_cookies  no server storage; needs a real SECRET_KEY
+# Sessions are only saved when a view changes them, so views should not
+# rewrite values that are already there.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "cached_db" if CACHE_URL else "db")
+_SESSION_ENGINES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+if SESSION_BACKEND not in _SESSION_ENGINES:
+    raise ImproperlyConfigured(f"SESSION_BACKEND must be one of {', '.join(_SESSION_ENGINES)}.")
+if SESSION_BACKEND in ("cache", "cached_db") and not CACHE_URL:
+    # A per-worker local-memory cache would hand out stale or missing sessions
+    raise ImproperlyConfigured(f"SESSION_BACKEND={SESSION_BACKEND} needs a shared cache; set CACHE_URL.")
+if SESSION_BACKEND == "signed_cookies" and SECRET_KEY.startswith("django-insecure"):
+    raise ImproperlyConfigured("SESSION_BACKEND=signed_cookies needs a private SECRET_KEY.")
+SESSION_ENGINE = _SESSION_ENGINES[SESSION_BACKEND]
+
+# ===========================
+# LOGIN
+# ===========================
+# Seconds an identifier that matched no account is remembered, so repeated
+# failed logins skip the account lookup (see login_app/principals.py).
+# Both login caches are only used with a shared CACHE_URL.
+LOGIN_NEGATIVE_CACHE_TTL = int(os.getenv("LOGIN_NEGATIVE_CACHE_TTL", "10"))
+# Seconds the account behind a logged-in session is cached (request.principal).
+# Saving or deleting the account clears it right away.
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+# Admin dashboard (dashboard_app/counters.py): account totals, recounted at
+# once when an account is created or deleted, and the recent activity list.
+ADMIN_TOTALS_TTL = int(os.getenv("ADMIN_TOTALS_TTL", "300"))
+ADMIN_RECENT_ACTIVITY_TTL = int(os.getenv("ADMIN_RECENT_ACTIVITY_TTL", "15"))
+# Minutes a password reset link stays valid
+PASSWORD_RESET_TOKEN_MINUTES = int(os.getenv("PASSWORD_RESET_TOKEN_MINUTES", "60"))
+
+# ===========================
+# QUERY BUDGETS
+# ===========================
+# (max queries, max DB ms) per request, by URL name; requests over budget
+# are logged (citu_campuspass/query_budget.py) and the budget tests in the
+# apps' tests.py fail. "default" applies to every other view.
+QUERY_BUDGETS = {
+    "default": (30, 500),
+    "dashboard_app:dashboard": (10, 200),
+    "dashboard_app:admin_dashboard": (5, 100),
+    # Totals / recent activity recomputed (TTL expiry, account created or deleted):
+    # one COUNT query, the logs and up to three actor-name lookups
+    "dashboard_app:admin_dashboard:miss": (8, 200),
+    "dashboard_app:staff_dashboard": (10, 200),
+    "dashboard_app:check_in_visitor": (10, 200),
+    "dashboard_app:admin_notifications_api": (5, 100),
+    "dashboard_app:visitor_notifications_api": (5, 100),
+    "dashboard_app:clear_notifications_api": (5, 100),
+    "dashboard_app:clear_visitor_notifications_api": (5, 100),
+    "dashboard_app:delete_notification_api": (5, 100),
+    "book_visit_app:book_visit": (20, 300),
+    "visitor_search_app:search": (10, 300),
+}
+# X-DB-Queries / X-DB-Time-Ms response headers
+QUERY_BUDGET_HEADERS = os.getenv("QUERY_BUDGET_HEADERS", str(DEBUG)) == "True"
+
+TEST_RUNNER = "citu_campuspass.test_runner.UnmanagedTablesTestRunner"
+
 # Logging
 LOGGING = {
     'version': 1,
@@ -0,0 +1,27 @@
+# citu_campuspass/test_runner.py
+"""
+Test runner that also creates the tables of managed = False models
+(visits, notifications, system_logs, administrator, ...), which the test
+database would otherwise lack because no migration creates them.
+"""
+from django.apps import apps
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+
+class UnmanagedTablesTestRunner(DiscoverRunner):
+
+    def setup_databases(self, **kwargs):
+        old_config = super().setup_databases(**kwargs)
+        unmanaged = [m for m in apps.get_models() if not m._meta.managed and not m._meta.proxy]
+
+        for alias in connections:
+            connection = connections[alias]
+            if connection.settings_dict.get("TEST", {}).get("MIRROR"):
+                continue
+            existing = set(connection.introspection.table_names())
+            with connection.schema_editor() as schema_editor:
+                for model in unmanaged:
+                    if model._meta.db_table not in existing:
+                        schema_editor.create_model(model)
+        return old_config
@@ -4,3 +4,30 @@ from django.apps import AppConfig
 class DashboardAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dashboard_app'
+
+    def ready(self):
+        from django.core import checks
+        from django.core.signals import request_started
+        from django.db.models.signals import post_delete, post_save
+        from citu_campuspass import db_pool
+        from login_app.models import Administrator, FrontDeskStaff
+        from register_app.models import User
+        from . import counters
+
+        # Connection reuse metrics (requests vs. new connections) and the
+        # workers x threads vs. DB_MAX_CONNECTIONS check
+        request_started.connect(db_pool.request_started, dispatch_uid="db_pool_request_started")
+        checks.register(db_pool.check_connection_budget)
+
+        # Cached admin dashboard totals: recount after an account is created or deleted
+        for model in (User, Administrator, FrontDeskStaff):
+            post_save.connect(
+                counters.account_changed,
+                sender=model,
+                dispatch_uid=f"admin_totals_{model.__name__}_saved",
+            )
+            post_delete.connect(
+                counters.account_changed,
+                sender=model,
+                dispatch_uid=f"admin_totals_{model.__name__}_deleted",
+            )
@@ -0,0 +1,120 @@
+# dashboard_app/counters.py
+"""
+Cached figures for the admin dashboard.
+
+admin_dashboard_view shows the number of administrators, front desk staff
+and visitors plus the latest system logs. COUNT(*) on users is a
+sequential scan on Postgres, so:
+
+- the totals are cached for ADMIN_TOTALS_TTL seconds and dropped as soon
+  as an account is created or deleted (signals in dashboard_app/apps.py);
+  the TTL only matters for bulk inserts that send no signals;
+- the recent activity list is cached for ADMIN_RECENT_ACTIVITY_TTL seconds.
+
+A load that has to recompute either one is charged to the
+"dashboard_app:admin_dashboard:miss" query budget instead of the warm one.
+
+Single-flight: on a miss only the request that wins a short cache lock
+recomputes. The others serve the last value (kept without expiry under a
+":stale" key) or, on a cold cache, wait briefly for the winner. With the
+local-memory cache this holds per worker process; with CACHE_URL it holds
+across workers.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, router
+
+from login_app.models import Administrator, FrontDeskStaff
+from manage_reports_logs_app.services import list_logs
+from register_app.models import User
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOTALS_TTL = getattr(settings, "ADMIN_TOTALS_TTL", 300)  # seconds
+ADMIN_RECENT_ACTIVITY_TTL = getattr(settings, "ADMIN_RECENT_ACTIVITY_TTL", 15)  # seconds
+
+TOTALS_KEY = "admin_dashboard:totals"
+RECENT_ACTIVITY_KEY = "admin_dashboard:recent_activity"
+
+LOCK_TIMEOUT = 30  # seconds; a crashed recompute doesn't block the others for longer
+WAIT_TIMEOUT = 2.0  # seconds a cold-cache miss waits for the recompute in flight
+WAIT_INTERVAL = 0.05
+
+
+def single_flight(key, ttl, compute, on_miss=None):
+    """
+    cache.get(key), recomputed by one caller at a time when it's missing.
+    `compute` must not return None; `on_miss` is called when the value
+    wasn't cached.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    if on_miss:
+        on_miss()
+
+    stale_key, lock_key = f"{key}:stale", f"{key}:lock"
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, ttl)
+            cache.set(stale_key, value, None)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    # Someone else is recomputing: the previous value is good enough meanwhile
+    value = cache.get(stale_key)
+    if value is not None:
+        return value
+
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+
+    logger.warning(f"Gave up waiting for {key} to be recomputed; computing it here")
+    return compute()
+
+
+# Totals key -> model counted
+TOTAL_MODELS = {"admins": Administrator, "staff": FrontDeskStaff, "visitors": User}
+
+
+def _count_totals():
+    """All three counts in one round trip."""
+    connection = connections[router.db_for_read(User)]
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT " + ", ".join(
+            f"(SELECT COUNT(*) FROM {quote(model._meta.db_table)})" for model in TOTAL_MODELS.values()
+        ))
+        return dict(zip(TOTAL_MODELS, cursor.fetchone()))
+
+
+def admin_totals(on_miss=None):
+    """{"admins": n, "staff": n, "visitors": n}"""
+    return single_flight(TOTALS_KEY, ADMIN_TOTALS_TTL, _count_totals, on_miss)
+
+
+def recent_activity(limit=10, on_miss=None):
+    """The latest `limit` logs, as list_logs() returns them."""
+    return single_flight(
+        f"{RECENT_ACTIVITY_KEY}:{limit}",
+        ADMIN_RECENT_ACTIVITY_TTL,
+        lambda: list_logs(limit=limit),
+        on_miss,
+    )
+
+
+def account_changed(sender, instance, created=True, **kwargs):
+    """post_save/post_delete receiver: only creating or deleting an account changes the totals."""
+    if created:
+        # The stale copy stays, so concurrent loads don't all recount
+        cache.delete(TOTALS_KEY)
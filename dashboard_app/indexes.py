@@ -0,0 +1,93 @@
+# dashboard_app/indexes.py
+"""
+Index set for the tables migrations don't manage, as provisioned by
+`python manage.py ensure_indexes`.
+
+The indexes themselves are declared in each model's Meta.indexes /
+Meta.constraints. This registry records, per index name, the index set
+version that introduced it and the code paths whose queries it serves, so
+the command can report why an index exists (and an index nothing serves
+anymore stands out). Bump INDEX_VERSION when adding one.
+
+Indexes no query uses anymore go to RETIRED; the command drops them where
+they still exist (DROP INDEX CONCURRENTLY on PostgreSQL).
+"""
+
+INDEX_VERSION = 3
+
+# name -> (version, views / services whose queries use it)
+INDEXES = {
+    # ----- v1 -----
+    'visits_email_date_idx': (1, [
+        'dashboard_app.dashboard_view',
+        'history_app.history_view',
+        'calendar_app.calendar_view',
+    ]),
+    'visits_email_norm_date_idx': (1, [
+        'visitor_search_app.visitor_detail',
+        'visitor_search_app.visitor_search (next visit)',
+        'walk_in_app.services.lookup (active visit)',
+    ]),
+    'visits_one_open_per_day': (1, [
+        'book_visit_app.book_visit_view (one open visit per day)',
+        'walk_in_app.services.create_pass / create_group_passes',
+    ]),
+    'users_full_name_lower_idx': (1, ['visitor_search_app.visitor_search', 'visitor_search_app.visitor_autocomplete']),
+    'users_phone_norm_idx': (1, [
+        'register_app.register_view (duplicate phone)',
+        'profile_app.profile_view (duplicate phone)',
+        'walk_in_app.services.lookup',
+    ]),
+    'users_email_norm_key': (1, [
+        'login_app.principals.resolve (login)',
+        'login_app.forgot_password_view',
+        'register_app.register_view (duplicate email)',
+        'walk_in_app.services.lookup',
+    ]),
+
+    # ----- v2 -----
+    'visits_date_status_idx': (2, [
+        'dashboard_app.apply_nine_pm_cutoff',
+        'dashboard_app.staff_dashboard_view',
+        'staff_visit_records_app.staff_visit_records_view',
+    ]),
+    'visits_user_date_idx': (2, [
+        'manage_visitor_app.visitor_detail (visit history)',
+        'manage_visit_records_app.services (event pre-registration)',
+        'walk_in_app.services.create_group_passes (booking conflicts)',
+    ]),
+    'notif_admin_created_idx': (2, [
+        'dashboard_app.admin_dashboard_view',
+        'dashboard_app.admin_notifications_api',
+        'dashboard_app.clear_notifications_api',
+    ]),
+    'notif_user_created_idx': (2, [
+        'dashboard_app.dashboard_view',
+        'dashboard_app.visitor_notifications_api',
+        'dashboard_app.clear_visitor_notifications_api',
+    ]),
+    'system_logs_created_idx': (2, [
+        'dashboard_app.staff_dashboard_view (today\'s window)',
+    ]),
+    'system_logs_action_created_idx': (2, [
+        'dashboard_app.staff_dashboard_view (recent check-ins)',
+    ]),
+    'users_email_idx': (2, [
+        'dashboard_app.check_in_visitor / check_out_visitor (visitor notification)',
+        'manage_reports_logs_app.logs_view / reports_view (visitor names)',
+        'profile_app.profile_view / change_password_request',
+    ]),
+}
+
+
+# name -> (table, version that retired it, what replaced it)
+RETIRED = {
+    # ----- v3 -----
+    'visits_user_email_lower_idx': ('visits', 3, 'visits_email_norm_date_idx (user_email_norm lookups)'),
+    'users_email_lower_idx': ('users', 3, 'users_email_norm_key (email_norm lookups)'),
+}
+
+
+def describe(name):
+    """(version, serves) for an index name; unknown names get (None, [])."""
+    return INDEXES.get(name, (None, []))
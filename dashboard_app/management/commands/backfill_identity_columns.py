@@ -0,0 +1,87 @@
+# dashboard_app/management/commands/backfill_identity_columns.py
+"""
+Add and fill the canonical identity columns:
+
+    users.email_norm       lower(trim(email))
+    users.phone_norm       digits of phone
+    visits.user_email_norm lower(trim(user_email))
+
+Neither table is created by migrations, so missing columns are added here
+(nullable, no table rewrite). Rows are then filled in primary-key batches
+with the same normalize_*() functions save() uses. Safe to re-run: only
+rows whose normalized value is still NULL although the source column has
+something to normalize are touched (a user without a phone keeps a NULL
+phone_norm and is left alone).
+
+Run before `ensure_indexes`, which then adds the unique/btree indexes.
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from dashboard_app.models import Visit
+from register_app.models import User
+
+# (model, {normalized column: (source column, regex a value needs to normalize to non-NULL)})
+TARGETS = [
+    (User, {"email_norm": ("email", r"\S"), "phone_norm": ("phone", r"\d")}),
+    (Visit, {"user_email_norm": ("user_email", r"\S")}),
+]
+
+
+class Command(BaseCommand):
+    help = "Add and backfill users.email_norm/phone_norm and visits.user_email_norm."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def add_missing_columns(self, model, columns):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            if table not in connection.introspection.table_names(cursor):
+                return False
+            existing = {c.name for c in connection.introspection.get_table_description(cursor, table)}
+
+        for column in columns:
+            if column not in existing:
+                self.stdout.write(f"{table}: adding column {column}")
+                with connection.schema_editor() as schema_editor:
+                    schema_editor.add_field(model, model._meta.get_field(column))
+        return True
+
+    def backfill(self, model, columns, batch_size):
+        pk = model._meta.pk.attname
+        missing = model.objects.none()
+        for column, (source, pattern) in columns.items():
+            missing |= model.objects.filter(**{f"{column}__isnull": True, f"{source}__regex": pattern})
+
+        updated = 0
+        last_pk = None
+        while True:
+            batch_qs = missing.order_by(pk)
+            if last_pk is not None:
+                batch_qs = batch_qs.filter(**{f"{pk}__gt": last_pk})
+            batch = list(batch_qs[:batch_size])
+            if not batch:
+                return updated
+
+            for obj in batch:
+                obj.set_normalized_fields()
+            with transaction.atomic():
+                model.objects.bulk_update(batch, list(columns))
+
+            updated += len(batch)
+            last_pk = getattr(batch[-1], pk)
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+
+        for model, columns in TARGETS:
+            table = model._meta.db_table
+            if not self.add_missing_columns(model, columns):
+                self.stdout.write(f"{table}: table not found, skipped")
+                continue
+
+            updated = self.backfill(model, columns, batch_size)
+            self.stdout.write(f"{table}: {updated} row(s) backfilled")
+
+        self.stdout.write(self.style.SUCCESS("Identity columns are up to date."))
@@ -0,0 +1,89 @@
+# dashboard_app/management/commands/check_db_pool.py
+"""
+Exercise the database connection setup like a gunicorn worker would and
+report how many connections were opened for how many requests.
+
+    python manage.py check_db_pool --threads 4 --requests 50
+
+Each thread runs --requests simulated requests (Django's request start and
+end hooks around a small query). With DB_POOL_MODE=off every request opens
+a connection; with persistent or pool mode only the first ones per thread
+should. Point DATABASE_URL at a local Postgres to compare modes before
+deploying.
+"""
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connection, connections
+
+from citu_campuspass import db_pool
+
+
+class Command(BaseCommand):
+    help = "Simulate requests on several threads and print connection reuse metrics."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=None,
+                            help="Defaults to GUNICORN_THREADS.")
+        parser.add_argument("--requests", type=int, default=50,
+                            help="Requests per thread.")
+
+    def handle(self, *args, **options):
+        threads = options["threads"] or db_pool.connections_per_worker()
+        per_thread = max(1, options["requests"])
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            for _ in range(per_thread):
+                started = time.monotonic()
+                request_started.send(sender=self.__class__)
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+                except Exception as e:
+                    with lock:
+                        errors.append(str(e))
+                finally:
+                    request_finished.send(sender=self.__class__)
+                with lock:
+                    latencies.append((time.monotonic() - started) * 1000)
+            connections.close_all()
+
+        before = db_pool.stats()
+        pool_threads = [threading.Thread(target=worker) for _ in range(threads)]
+        wall = time.monotonic()
+        for t in pool_threads:
+            t.start()
+        for t in pool_threads:
+            t.join()
+        wall = time.monotonic() - wall
+        after = db_pool.stats()
+
+        checkouts = after["checkouts"] - before["checkouts"]
+        requests = threads * per_thread
+        self.stdout.write(f"mode={after['mode']} vendor={connection.vendor} threads={threads}")
+        self.stdout.write(f"requests: {requests} in {wall:.2f}s, {len(errors)} error(s)")
+        self.stdout.write(
+            f"connections opened: {checkouts} "
+            f"({checkouts / requests:.2f} per request, "
+            f"{(after['checkout_ms_total'] - before['checkout_ms_total']) / max(checkouts, 1):.1f} ms each)"
+        )
+        if latencies:
+            self.stdout.write(
+                f"request latency: p50 {statistics.median(latencies):.1f} ms, "
+                f"max {max(latencies):.1f} ms"
+            )
+        self.stdout.write(f"health check failures: {after['health_check_fails'] - before['health_check_fails']}")
+        budget = after["budget"]
+        self.stdout.write(
+            f"budget: {budget['workers']} workers x {budget['per_worker']} + {budget['reserved']} reserved "
+            f"= {budget['needed']} connections (limit {budget['limit'] or 'not set'})"
+        )
+        for message in errors[:3]:
+            self.stderr.write(message)
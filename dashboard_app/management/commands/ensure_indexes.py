@@ -0,0 +1,241 @@
+# dashboard_app/management/commands/ensure_indexes.py
+"""
+Create and verify the indexes and constraints declared in `Meta.indexes` /
+`Meta.constraints` for tables that Django migrations never touch
+(managed = False models and apps without migrations).
+
+Safe to run on every deploy: existing ones are skipped by name and
+tables that don't exist yet (e.g. a fresh local database) are ignored.
+Whatever can't be created (e.g. a unique constraint the existing data
+violates, such as duplicate open visits) is reported, the rest is still
+created, and the command then exits non-zero so the deploy stops.
+
+On PostgreSQL indexes are built with CREATE INDEX CONCURRENTLY and unique
+constraints with CREATE UNIQUE INDEX CONCURRENTLY, so the tables stay
+writable during a deploy. A concurrent build that fails leaves an INVALID
+index behind; it is dropped right away, and any left by an interrupted
+run are dropped and rebuilt on the next one.
+
+Each line of the report names the index set version that introduced the
+index and the views it serves (dashboard_app/indexes.py). Retired indexes
+still present are dropped (concurrently on PostgreSQL).
+`--check` only verifies and exits non-zero when something is missing.
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, models
+from django.db.migrations.loader import MigrationLoader
+
+from dashboard_app.indexes import INDEX_VERSION, RETIRED, describe
+
+
+def unmigrated_models():
+    """Models whose schema lives outside of Django migrations."""
+    migrated_apps = MigrationLoader(connection, ignore_no_migrations=True).migrated_apps
+    for model in apps.get_models():
+        opts = model._meta
+        if opts.proxy:
+            continue
+        if not opts.managed or opts.app_label not in migrated_apps:
+            yield model
+
+
+def invalid_indexes(table):
+    """Names of INVALID indexes on `table` (PostgreSQL: failed concurrent builds)."""
+    if connection.vendor != "postgresql":
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname
+            FROM pg_index i
+            JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE i.indrelid = %s::regclass AND NOT i.indisvalid
+            """,
+            [connection.ops.quote_name(table)],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+# Same as the schema editor's CREATE UNIQUE INDEX, built without blocking writes
+SQL_CREATE_UNIQUE_INDEX_CONCURRENTLY = (
+    "CREATE UNIQUE INDEX CONCURRENTLY %(name)s ON %(table)s%(using)s "
+    "(%(columns)s)%(include)s%(extra)s%(condition)s"
+)
+
+
+def declared_columns(model, obj):
+    """Column names an index/constraint covers, or None for expression indexes."""
+    fields = getattr(obj, "fields", None)
+    if not fields:
+        return None
+    return [model._meta.get_field(name.lstrip("-")).column for name in fields]
+
+
+class Command(BaseCommand):
+    help = "Create and verify indexes and constraints on unmanaged/unmigrated tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only list the indexes and constraints that would be created.",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Create nothing; fail if an index or constraint is missing or invalid.",
+        )
+
+    def report(self, table, obj, status):
+        version, serves = describe(obj.name)
+        since = f"v{version}" if version else "v?"
+        self.stdout.write(f"{table}.{obj.name} [{since}] {status}")
+        for view in serves:
+            self.stdout.write(f"    serves {view}")
+
+    def create(self, model, kind, obj):
+        concurrently = connection.vendor == "postgresql" and (
+            kind == "index" or (isinstance(obj, models.UniqueConstraint) and obj.fields)
+        )
+        # CONCURRENTLY can't run inside a transaction
+        with connection.schema_editor(atomic=not concurrently) as schema_editor:
+            if kind == "index" and concurrently:
+                schema_editor.add_index(model, obj, concurrently=True)
+            elif kind == "index":
+                schema_editor.add_index(model, obj)
+            elif concurrently:
+                # ADD CONSTRAINT would lock writes for the whole build; a
+                # unique index enforces the same rule
+                schema_editor.execute(schema_editor._create_index_sql(
+                    model,
+                    fields=[model._meta.get_field(name) for name in obj.fields],
+                    name=obj.name,
+                    sql=SQL_CREATE_UNIQUE_INDEX_CONCURRENTLY,
+                    condition=obj._get_condition_sql(model, schema_editor),
+                ))
+            else:
+                schema_editor.add_constraint(model, obj)
+
+    def drop_invalid(self, table, name):
+        # DROP INDEX also removes unique constraints built as unique indexes
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {connection.ops.quote_name(name)}")
+
+    def drop_retired(self, tables, dry_run, check):
+        """Drop retired indexes that still exist. Returns (dropped, still present, failed)."""
+        dropped = present = failed = 0
+        for name, (table, version, replaced_by) in RETIRED.items():
+            if table not in tables:
+                continue
+            with connection.cursor() as cursor:
+                if name not in connection.introspection.get_constraints(cursor, table):
+                    continue
+
+            label = f"{table}.{name} [retired v{version}, replaced by {replaced_by}]"
+            if check:
+                self.stdout.write(f"{label} still present")
+                present += 1
+                continue
+            if dry_run:
+                self.stdout.write(f"{label} would drop")
+                dropped += 1
+                continue
+
+            concurrently = " CONCURRENTLY" if connection.vendor == "postgresql" else ""
+            try:
+                # Outside a transaction: CONCURRENTLY can't run inside one
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DROP INDEX{concurrently} IF EXISTS {connection.ops.quote_name(name)}")
+            except DatabaseError as e:
+                self.stdout.write(f"{label} FAILED")
+                self.stderr.write(f"{table}: could not drop {name}: {e}")
+                failed += 1
+                continue
+
+            self.stdout.write(f"{label} dropped")
+            dropped += 1
+        return dropped, present, failed
+
+    def handle(self, *args, **options):
+        dry_run = options["dry_run"]
+        check = options["check"]
+        created = failed = missing = 0
+
+        self.stdout.write(f"Index set v{INDEX_VERSION}")
+
+        with connection.cursor() as cursor:
+            tables = set(connection.introspection.table_names(cursor))
+
+        for model in unmigrated_models():
+            table = model._meta.db_table
+            pending = [("index", i) for i in model._meta.indexes]
+            pending += [("constraint", c) for c in model._meta.constraints]
+            if table not in tables or not pending:
+                continue
+
+            with connection.cursor() as cursor:
+                existing = connection.introspection.get_constraints(cursor, table)
+            invalid = invalid_indexes(table)
+
+            for kind, obj in pending:
+                if obj.name in existing and obj.name not in invalid:
+                    columns = declared_columns(model, obj)
+                    if columns is not None and existing[obj.name]["columns"] != columns:
+                        self.report(table, obj, f"exists on {existing[obj.name]['columns']}, declared {columns}")
+                        failed += 1
+                    else:
+                        self.report(table, obj, "ok")
+                    continue
+
+                if check:
+                    self.report(table, obj, "INVALID" if obj.name in invalid else "missing")
+                    missing += 1
+                    continue
+                if dry_run:
+                    self.report(table, obj, f"would create {kind}")
+                    created += 1
+                    continue
+
+                try:
+                    if obj.name in invalid:
+                        self.drop_invalid(table, obj.name)
+                    self.create(model, kind, obj)
+                except DatabaseError as e:
+                    self.report(table, obj, "FAILED")
+                    self.stderr.write(f"{table}: could not create {obj.name}: {e}")
+                    failed += 1
+                    # A failed unique build would go on rejecting new duplicates
+                    if obj.name in invalid_indexes(table):
+                        self.drop_invalid(table, obj.name)
+                    continue
+
+                # A concurrent build can finish without error and still be unusable
+                if obj.name in invalid_indexes(table):
+                    self.report(table, obj, "FAILED (built INVALID, will be rebuilt next run)")
+                    failed += 1
+                    continue
+
+                self.report(table, obj, f"created {kind}")
+                created += 1
+
+        dropped, present, drop_failed = self.drop_retired(tables, dry_run, check)
+        missing += present
+        failed += drop_failed
+
+        if check:
+            if missing or failed:
+                raise CommandError(
+                    f"{missing} missing/invalid/retired, {failed} mismatched (index set v{INDEX_VERSION})."
+                )
+            self.stdout.write(self.style.SUCCESS(f"Index set v{INDEX_VERSION} is in place."))
+            return
+
+        verb = "would be created" if dry_run else "created"
+        self.stdout.write(self.style.SUCCESS(f"{created} index(es)/constraint(s) {verb}."))
+        if dropped:
+            self.stdout.write(f"{dropped} retired index(es) {'would be dropped' if dry_run else 'dropped'}.")
+        if failed:
+            raise CommandError(
+                f"{failed} index(es)/constraint(s) could not be created, dropped or differ (see above)."
+            )
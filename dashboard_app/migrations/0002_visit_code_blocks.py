@@ -0,0 +1,38 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('notification_id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('type', models.TextField()),
+                ('title', models.TextField()),
+                ('message', models.TextField()),
+                ('is_read', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'notifications',
+                'managed': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='VisitCodeBlock',
+            fields=[
+                ('name', models.TextField(primary_key=True, serialize=False)),
+                ('next_block', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'visit_code_blocks',
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+SEQUENCE = "visit_code_block_seq"
+
+
+def create_sequence(apps, schema_editor):
+    """
+    PostgreSQL hands out visit code blocks from a sequence: nextval() is
+    never rolled back, so a block stays taken even when the booking that
+    reserved it fails. It continues where the visit_code_blocks counter is.
+    """
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    VisitCodeBlock = apps.get_model("dashboard_app", "VisitCodeBlock")
+    counter = VisitCodeBlock.objects.filter(name="visit_code").first()
+    start = counter.next_block if counter else 0
+    schema_editor.execute(f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE} MINVALUE 0 START WITH 0")
+    schema_editor.execute("SELECT setval(%s, %s, false)", [SEQUENCE, start])
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard_app', '0002_visit_code_blocks'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sequence, drop_sequence),
+    ]
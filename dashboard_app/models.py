@@ -1,6 +1,7 @@
 from django.db import models
+from django.db.models import Q
 from login_app.models import Administrator, FrontDeskStaff
-from register_app.models import User
+from register_app.models import NormalizedManager, User, normalize_email
 
 
 class Notification(models.Model):
@@ -60,6 +61,12 @@ class Notification(models.Model):
     class Meta:
         db_table = 'notifications'
         managed = False
+        # Unmanaged table: indexes created by `python manage.py ensure_indexes`
+        # (dashboard_app/indexes.py lists the views each one serves)
+        indexes = [
+            models.Index(fields=['receiver_admin', '-created_at'], name='notif_admin_created_idx'),
+            models.Index(fields=['receiver_user', '-created_at'], name='notif_user_created_idx'),
+        ]
 
 
 class Visit(models.Model):
@@ -75,9 +82,40 @@ class Visit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     user_id = models.IntegerField(null=True, blank=True)
 
+    # normalize_email(user_email), kept in sync by save()/bulk_create();
+    # column added + backfilled by `python manage.py backfill_identity_columns`
+    user_email_norm = models.TextField(null=True, blank=True, editable=False)
+
+    objects = NormalizedManager()
+
     class Meta:
         db_table = 'visits'
         managed = False
+        # Unmanaged table: indexes/constraints created by `python manage.py ensure_indexes`
+        indexes = [
+            models.Index(fields=['user_email', 'visit_date'], name='visits_email_date_idx'),
+            models.Index(fields=['user_email_norm', 'visit_date'], name='visits_email_norm_date_idx'),
+            models.Index(fields=['visit_date', 'status'], name='visits_date_status_idx'),
+            models.Index(fields=['user_id', 'visit_date'], name='visits_user_date_idx'),
+        ]
+        constraints = [
+            # One open (Upcoming/Active) visit per user per day, enforced by the DB
+            models.UniqueConstraint(
+                fields=['user_id', 'visit_date'],
+                condition=Q(status__in=['Upcoming', 'Active']),
+                name='visits_one_open_per_day',
+            ),
+        ]
+
+    def set_normalized_fields(self):
+        self.user_email_norm = normalize_email(self.user_email)
+
+    def save(self, *args, **kwargs):
+        self.set_normalized_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'user_email_norm'}
+        super().save(*args, **kwargs)
 
 
 class SystemLog(models.Model):
@@ -91,6 +129,11 @@ class SystemLog(models.Model):
     class Meta:
         db_table = 'system_logs'
         managed = False
+        # Unmanaged table: indexes created by `python manage.py ensure_indexes`
+        indexes = [
+            models.Index(fields=['created_at'], name='system_logs_created_idx'),
+            models.Index(fields=['action_type', 'created_at'], name='system_logs_action_created_idx'),
+        ]
 
 
 class AdminDismissedNotification(models.Model):
@@ -100,3 +143,12 @@ class AdminDismissedNotification(models.Model):
     class Meta:
         db_table = 'admin_dismissed_notifications'
         managed = False
+
+
+class VisitCodeBlock(models.Model):
+    """Hi/lo counter behind visit code allocation (see dashboard_app/visit_codes.py)."""
+    name = models.TextField(primary_key=True)
+    next_block = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'visit_code_blocks'
@@ -0,0 +1,64 @@
+# dashboard_app/services.py
+"""
+Shared read layer for the `visits` table.
+
+Every list/detail page that shows visits goes through `visit_rows()` so the
+rows come back as plain dicts built by a single `.values()` projection
+instead of full `Visit` instances copied field by field.
+"""
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Concat
+
+from register_app.models import User
+from .models import Visit
+
+# Default projection used by the visit list endpoints
+VISIT_FIELDS = (
+    'visit_id',
+    'user_email',
+    'code',
+    'purpose',
+    'department',
+    'visit_date',
+    'start_time',
+    'end_time',
+    'status',
+    'created_at',
+    'user_id',
+)
+
+
+def visitor_name_subquery():
+    """
+    "First Last" of the registered user owning the visit (matched by email),
+    or NULL for walk-ins that never registered.
+    """
+    return Subquery(
+        User.objects
+        .filter(email=OuterRef('user_email'))
+        .annotate(full_name=Concat('first_name', Value(' '), 'last_name', output_field=TextField()))
+        .values('full_name')[:1]
+    )
+
+
+def visit_rows(queryset=None, fields=VISIT_FIELDS, with_visitor_name=False, limit=None):
+    """
+    Serialize visits into a list of dicts using a single SELECT.
+
+    - queryset: filtered/ordered Visit queryset (defaults to all visits)
+    - fields: columns to project, defaults to VISIT_FIELDS
+    - with_visitor_name: adds a 'visitor_name' key resolved in SQL
+    - limit: optional row cap applied after ordering
+    """
+    qs = Visit.objects.all() if queryset is None else queryset
+    fields = tuple(fields)
+
+    if with_visitor_name:
+        qs = qs.annotate(visitor_name=visitor_name_subquery())
+        fields += ('visitor_name',)
+
+    qs = qs.values(*fields)
+    if limit is not None:
+        qs = qs[:limit]
+
+    return list(qs)
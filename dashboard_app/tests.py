@@ -1,3 +1,626 @@
-from django.test import TestCase
+import json
+from datetime import datetime, time as dtime, timedelta
+from io import StringIO
+from unittest import mock, skipIf
 
-# Create your tests here.
+import pytz
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.backends.postgresql import base as postgresql_base
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from citu_campuspass import db_pool
+from citu_campuspass.db_router import PIN_COOKIE, ReplicaRouter, replica_reads, tracking_writes
+from citu_campuspass.postgresql.base import DatabaseWrapper as InstrumentedDatabaseWrapper
+from citu_campuspass.query_budget import budget_for
+from login_app.models import Administrator, FrontDeskStaff
+from register_app.models import User
+
+from . import counters, visit_codes
+from .models import Notification, SystemLog, Visit, VisitCodeBlock
+
+PHILIPPINES_TZ = pytz.timezone('Asia/Manila')
+
+# 10:00 AM in Manila: inside check-in hours, before the 9 PM cutoff
+NOW_PH = PHILIPPINES_TZ.localize(datetime.combine(datetime.now(PHILIPPINES_TZ).date(), dtime(10, 0)))
+TODAY = NOW_PH.date()
+
+# Rows per seeded list: enough that a per-row query would blow any budget
+ROWS = 25
+
+
+class QueryBudgetTestCase(TestCase):
+    """Seeds visitors, visits and notifications and checks views against QUERY_BUDGETS."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Administrator.objects.create(
+            first_name="Ada", last_name="Admin", username="ada", email="ada@cit.edu",
+            password="x", contact_number="09170000000",
+        )
+        for i in range(ROWS):
+            Administrator.objects.create(
+                first_name=f"Admin{i}", last_name="Other", username=f"admin{i}", email=f"admin{i}@cit.edu",
+                password="x", contact_number="09170000000",
+            )
+        cls.staff = FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+        cls.visitor = User.objects.create(
+            first_name="Vic", last_name="Visitor", email="vic@example.com",
+            phone="09171234567", password="x", visitor_type="Guest",
+        )
+
+        visits = []
+        for i in range(ROWS):
+            # Today's visits whose window has started: the staff dashboard activates them
+            visits.append(Visit(
+                user_email=f"guest{i}@example.com", code=f"CIT-T{i:03d}", purpose="Campus tour",
+                department="College of Computer Studies (CCS)", visit_date=TODAY,
+                start_time=dtime(9, 0), end_time=dtime(17, 0), status="Upcoming",
+            ))
+            # The visitor's history, one past visit per day
+            visits.append(Visit(
+                user_email=cls.visitor.email, user_id=cls.visitor.user_id, code=f"CIT-H{i:03d}",
+                purpose="Enrollment", department="Registrar", visit_date=TODAY - timedelta(days=i + 1),
+                status="Completed",
+            ))
+        visits.append(Visit(
+            user_email=cls.visitor.email, user_id=cls.visitor.user_id, code="CIT-CHECKIN",
+            purpose="Enrollment", department="Registrar", visit_date=TODAY, status="Upcoming",
+        ))
+        Visit.objects.bulk_create(visits)
+
+        Notification.objects.bulk_create(
+            [Notification(receiver_admin=cls.admin, title=f"A{i}", message="m", type="system_alert") for i in range(ROWS)]
+            + [Notification(receiver_user=cls.visitor, title=f"V{i}", message="m", type="visit_update") for i in range(ROWS)]
+        )
+        SystemLog.objects.bulk_create([
+            SystemLog(actor="Sam (sam)", action_type="Visitor Check-In", description=f"log {i}",
+                      actor_role="Staff", created_at=NOW_PH - timedelta(minutes=i))
+            for i in range(ROWS)
+        ])
+
+    def setUp(self):
+        patcher = mock.patch("dashboard_app.views.django_now", return_value=NOW_PH)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def log_in(self, **session_values):
+        session = self.client.session
+        session.update(session_values)
+        session.save()
+
+    def assertWithinBudget(self, view_name, request):
+        """Run `request()` and fail when it runs more queries than the view's budget."""
+        max_queries, _ = budget_for(view_name)
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLessEqual(
+            len(queries), max_queries,
+            f"{view_name} ran {len(queries)} queries (budget {max_queries}):\n"
+            + "\n".join(q["sql"] for q in queries.captured_queries),
+        )
+        return response
+
+
+class VisitorViewBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in(user_email=self.visitor.email, user_first_name=self.visitor.first_name)
+
+    def test_dashboard_view(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:dashboard", lambda: self.client.get(reverse("dashboard_app:dashboard")))
+        self.assertEqual(response.status_code, 200)
+
+    def test_visitor_notifications_api(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:visitor_notifications_api",
+            lambda: self.client.get(reverse("dashboard_app:visitor_notifications_api")),
+        )
+        self.assertEqual(len(response.json()["notifications"]), 20)
+
+    def test_clear_visitor_notifications_api(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:clear_visitor_notifications_api",
+            lambda: self.client.post(reverse("dashboard_app:clear_visitor_notifications_api")),
+        )
+        self.assertTrue(response.json()["success"])
+        self.assertFalse(Notification.objects.filter(receiver_user=self.visitor).exists())
+
+
+class StaffViewBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in(staff_username=self.staff.username, staff_first_name=self.staff.first_name)
+
+    def test_staff_dashboard_view(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:staff_dashboard", lambda: self.client.get(reverse("dashboard_app:staff_dashboard")))
+        self.assertEqual(response.status_code, 200)
+        # Every started window was activated, in one statement rather than one per visit
+        self.assertEqual(Visit.objects.filter(code__startswith="CIT-T", status="Active").count(), ROWS)
+
+    def test_check_in_visitor(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:check_in_visitor",
+            lambda: self.client.post(reverse("dashboard_app:check_in_visitor"), {"visit_code": "CIT-CHECKIN"}),
+        )
+        self.assertRedirects(response, reverse("dashboard_app:staff_dashboard"), fetch_redirect_response=False)
+        self.assertEqual(Visit.objects.get(code="CIT-CHECKIN").status, "Active")
+        self.assertTrue(Notification.objects.filter(receiver_user=self.visitor, title="Visit Check-In").exists())
+
+
+class CodeCheckResultTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in(staff_username=self.staff.username, staff_first_name=self.staff.first_name)
+
+    def test_result_after_check(self):
+        response = self.client.post(
+            reverse("dashboard_app:check_code"), {"visit_code": "CIT-CHECKIN"},
+            HTTP_REFERER="http://testserver/dashboard/staff/",
+        )
+        response = self.client.get(response["Location"])
+        self.assertEqual(response.context["code_check_result"]["visit"]["code"], "CIT-CHECKIN")
+
+    def test_unsigned_code_is_ignored(self):
+        # Looking codes up directly would skip the check_code throttle
+        for name in ("dashboard_app:staff_dashboard", "dashboard_app:code_checker"):
+            response = self.client.get(reverse(name), {"code": "CIT-CHECKIN"})
+            self.assertIsNone(response.context["code_check_result"])
+
+
+class AdminViewBudgetTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in(admin_username=self.admin.username, admin_first_name=self.admin.first_name)
+
+    def test_admin_notifications_api(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:admin_notifications_api",
+            lambda: self.client.get(reverse("dashboard_app:admin_notifications_api")),
+        )
+        self.assertEqual(len(response.json()["notifications"]), 20)
+
+    def test_clear_notifications_api(self):
+        response = self.assertWithinBudget(
+            "dashboard_app:clear_notifications_api",
+            lambda: self.client.post(reverse("dashboard_app:clear_notifications_api")),
+        )
+        self.assertTrue(response.json()["success"])
+        self.assertFalse(Notification.objects.filter(receiver_admin=self.admin).exists())
+
+    def test_delete_notification_api(self):
+        notification = Notification.objects.filter(receiver_admin=self.admin).first()
+        response = self.assertWithinBudget(
+            "dashboard_app:delete_notification_api",
+            lambda: self.client.post(
+                reverse("dashboard_app:delete_notification_api"),
+                json.dumps({"notif_id": notification.notification_id}),
+                content_type="application/json",
+            ),
+        )
+        self.assertTrue(response.json()["success"])
+
+
+class AdminDashboardCacheTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.log_in(
+            admin_username=self.admin.username, admin_first_name=self.admin.first_name,
+            is_superadmin=self.admin.is_superadmin,
+        )
+
+    def load(self):
+        return self.client.get(reverse("dashboard_app:admin_dashboard"))
+
+    def test_cold_load_within_miss_budget(self):
+        # The latest logs name an admin, a staff member and a visitor: every actor lookup runs
+        SystemLog.objects.bulk_create([
+            SystemLog(actor="Ada (ada)", action_type="Account Update", description="admin",
+                      actor_role="Admin", created_at=NOW_PH),
+            SystemLog(actor="Vic (vic@example.com)", action_type="Visit Booking", description="visitor",
+                      actor_role="Visitor", created_at=NOW_PH),
+        ])
+        with self.assertNoLogs("citu_campuspass.query_budget", "WARNING"):
+            response = self.assertWithinBudget("dashboard_app:admin_dashboard:miss", self.load)
+        self.assertEqual(
+            (response.context["total_admins"], response.context["total_staff"], response.context["total_visitors"]),
+            (ROWS + 1, 1, 1),
+        )
+        self.assertEqual(response.context["recent_activities"][0].description, "visitor")
+
+    def test_expired_totals_are_charged_to_the_miss_budget(self):
+        self.load()
+        cache.delete(counters.TOTALS_KEY)
+        with self.assertLogs("citu_campuspass.query_budget", "WARNING") as logs, \
+                override_settings(QUERY_BUDGETS={"dashboard_app:admin_dashboard:miss": (0, 0)}):
+            self.load()
+        self.assertIn("dashboard_app:admin_dashboard:miss", logs.output[0])
+
+    def test_warm_load_within_budget(self):
+        self.load()
+        response = self.assertWithinBudget("dashboard_app:admin_dashboard", self.load)
+        self.assertEqual(response.context["total_admins"], ROWS + 1)
+        self.assertEqual(response.context["total_visitors"], 1)
+        self.assertEqual(len(response.context["recent_activities"]), 10)
+
+    def test_warm_load_runs_no_counts(self):
+        self.load()
+        with CaptureQueriesContext(connection) as queries:
+            self.load()
+        self.assertFalse([q for q in queries.captured_queries if "COUNT(" in q["sql"]])
+
+    def test_new_account_refreshes_totals(self):
+        self.assertEqual(self.load().context["total_staff"], 1)
+        FrontDeskStaff.objects.create(
+            first_name="Nia", last_name="New", username="nia", email="nia@cit.edu",
+            password="x", contact_number="09170000002",
+        )
+        self.assertEqual(self.load().context["total_staff"], 2)
+
+    def test_concurrent_miss_serves_stale_value(self):
+        counters.admin_totals()
+        cache.delete(counters.TOTALS_KEY)
+        # Another request holds the recompute lock
+        cache.add(f"{counters.TOTALS_KEY}:lock", 1)
+        with mock.patch.object(counters, "_count_totals") as count:
+            self.assertEqual(counters.admin_totals()["staff"], 1)
+        count.assert_not_called()
+
+
+class QueryBudgetMiddlewareTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in(user_email=self.visitor.email, user_first_name=self.visitor.first_name)
+
+    @override_settings(QUERY_BUDGET_HEADERS=True)
+    def test_headers(self):
+        response = self.client.get(reverse("dashboard_app:visitor_notifications_api"))
+        self.assertGreater(int(response["X-DB-Queries"]), 0)
+        self.assertIn("X-DB-Time-Ms", response)
+
+    @override_settings(QUERY_BUDGET_HEADERS=False)
+    def test_no_headers_by_default(self):
+        response = self.client.get(reverse("dashboard_app:visitor_notifications_api"))
+        self.assertNotIn("X-DB-Queries", response)
+
+    @override_settings(QUERY_BUDGETS={"default": (1, 10_000)})
+    def test_over_budget_is_logged(self):
+        with self.assertLogs("citu_campuspass.query_budget", "WARNING") as logs:
+            self.client.get(reverse("dashboard_app:visitor_notifications_api"))
+        self.assertIn("dashboard_app:visitor_notifications_api", logs.output[0])
+
+
+@override_settings(REPLICA_DATABASE="replica")
+class ReplicaRouterTests(SimpleTestCase):
+    """Routing decisions only; each test runs with fresh state like a new request."""
+
+    router = ReplicaRouter()
+
+    def run_in_context(self, func, pinned=False):
+        with tracking_writes(pinned):
+            return func()
+
+    def test_reads_outside_read_paths_use_primary(self):
+        self.assertEqual(self.run_in_context(lambda: self.router.db_for_read(Visit)), "default")
+
+    def test_read_paths_use_replica(self):
+        def read():
+            with replica_reads():
+                return self.router.db_for_read(Visit)
+        self.assertEqual(self.run_in_context(read), "replica")
+
+    def test_reads_after_a_write_use_primary(self):
+        def write_then_read():
+            self.assertEqual(self.router.db_for_write(Visit), "default")
+            with replica_reads():
+                return self.router.db_for_read(Visit)
+        self.assertEqual(self.run_in_context(write_then_read), "default")
+
+    def test_session_writes_do_not_pin(self):
+        from django.contrib.sessions.models import Session
+
+        def write_session_then_read():
+            self.router.db_for_write(Session)
+            with replica_reads():
+                return self.router.db_for_read(Visit)
+        self.assertEqual(self.run_in_context(write_session_then_read), "replica")
+
+    def test_pinned_browser_reads_from_primary(self):
+        def read():
+            with replica_reads():
+                return self.router.db_for_read(Visit)
+        self.assertEqual(self.run_in_context(read, pinned=True), "default")
+
+    @override_settings(REPLICA_DATABASE=None)
+    def test_no_replica_configured(self):
+        def read():
+            with replica_reads():
+                return self.router.db_for_read(Visit)
+        self.assertEqual(self.run_in_context(read), "default")
+
+
+@override_settings(REPLICA_DATABASE="replica", REPLICA_PIN_SECONDS=15)
+class ReplicaMiddlewareTests(QueryBudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.log_in(user_email=self.visitor.email, user_first_name=self.visitor.first_name)
+
+    def test_write_pins_browser_to_primary(self):
+        response = self.client.post(reverse("dashboard_app:clear_visitor_notifications_api"))
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 15)
+
+    def test_read_does_not_pin(self):
+        response = self.client.get(reverse("dashboard_app:visitor_notifications_api"))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+def zeroed_pool_counters():
+    """Fresh db_pool counters for one test, restored afterwards."""
+    return mock.patch.dict(db_pool._counters, {name: 0 for name in db_pool._counters})
+
+
+class InstrumentedBackendTests(SimpleTestCase):
+    """citu_campuspass/postgresql counts checkouts; the real handshake is mocked out."""
+
+    def setUp(self):
+        counters = zeroed_pool_counters()
+        counters.start()
+        self.addCleanup(counters.stop)
+        self.wrapper = InstrumentedDatabaseWrapper({**connection.settings_dict, "ENGINE": "citu_campuspass.postgresql"})
+
+    def test_checkout_and_close(self):
+        with mock.patch.object(postgresql_base.DatabaseWrapper, "get_new_connection", return_value=mock.Mock()):
+            self.wrapper.connection = self.wrapper.get_new_connection({})
+        self.assertEqual((db_pool._counters["checkouts"], db_pool._counters["checked_out"]), (1, 1))
+        self.assertGreaterEqual(db_pool._counters["checkout_ms_total"], 0)
+
+        with mock.patch.object(postgresql_base.DatabaseWrapper, "_close"):
+            self.wrapper._close()
+        self.assertEqual((db_pool._counters["checkouts"], db_pool._counters["checked_out"]), (1, 0))
+
+    def test_failed_checkout(self):
+        with mock.patch.object(postgresql_base.DatabaseWrapper, "get_new_connection", side_effect=OperationalError):
+            with self.assertRaises(OperationalError):
+                self.wrapper.get_new_connection({})
+        self.assertEqual((db_pool._counters["checkouts"], db_pool._counters["checkout_errors"]), (0, 1))
+
+    def test_dead_connection_is_counted(self):
+        with mock.patch.object(postgresql_base.DatabaseWrapper, "is_usable", side_effect=[True, False]):
+            self.assertTrue(self.wrapper.is_usable())
+            self.assertFalse(self.wrapper.is_usable())
+        self.assertEqual(db_pool._counters["health_check_fails"], 1)
+
+
+@override_settings(WEB_CONCURRENCY=3, GUNICORN_THREADS=4, DB_POOL_MAX_SIZE=6, DB_RESERVED_CONNECTIONS=2)
+class DbPoolStatsTests(TestCase):
+
+    def setUp(self):
+        counters = zeroed_pool_counters()
+        counters.start()
+        self.addCleanup(counters.stop)
+
+    def test_reuse_ratios(self):
+        for name, amount in (("checkouts", 2), ("checkout_ms_total", 30.0), ("requests", 8)):
+            db_pool.record(name, amount)
+        data = db_pool.stats()
+        self.assertEqual((data["checkout_ms_avg"], data["checkouts_per_request"]), (15.0, 0.25))
+
+    def test_pool_mode_sizes_the_budget_by_the_pool(self):
+        with self.settings(DB_POOL_MODE="persistent"):
+            self.assertEqual(db_pool.stats()["mode"], "persistent")
+            self.assertEqual(db_pool.connection_budget()["needed"], 3 * 4 + 2)
+        with self.settings(DB_POOL_MODE="pool"):
+            self.assertEqual(db_pool.stats()["mode"], "pool")
+            self.assertEqual(db_pool.connection_budget()["needed"], 3 * 6 + 2)
+
+    def test_budget_check(self):
+        with self.settings(DB_POOL_MODE="persistent", DB_MAX_CONNECTIONS=14):
+            self.assertEqual(db_pool.check_connection_budget(), [])
+        with self.settings(DB_POOL_MODE="pool", DB_MAX_CONNECTIONS=14):
+            [warning] = db_pool.check_connection_budget()
+        self.assertEqual(warning.id, "citu_campuspass.W001")
+
+    def test_admin_api(self):
+        url = reverse("dashboard_app:admin_db_pool_api")
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        Administrator.objects.create(
+            first_name="Ada", last_name="Admin", username="ada", email="ada@cit.edu",
+            password="x", contact_number="09170000000",
+        )
+        session = self.client.session
+        session["admin_username"] = "ada"
+        session.save()
+        with self.settings(DB_POOL_MODE="off"):
+            data = self.client.get(url).json()
+
+        self.assertEqual(data["mode"], "off")
+        self.assertEqual(data["requests"], 2)
+        self.assertEqual(data["budget"]["needed"], 3 * 4 + 2)
+        for name in ("checkouts", "checkout_ms_avg", "checked_out", "health_check_fails", "checkouts_per_request"):
+            self.assertIn(name, data)
+
+    def test_check_db_pool_command(self):
+        out = StringIO()
+        with self.settings(DB_POOL_MODE="persistent"):
+            call_command("check_db_pool", "--threads", "2", "--requests", "3", stdout=out)
+        report = out.getvalue()
+
+        self.assertIn(f"mode=persistent vendor={connection.vendor} threads=2", report)
+        self.assertIn("requests: 6 in", report)
+        self.assertIn(", 0 error(s)", report)
+        self.assertIn("budget: 3 workers x 4 + 2 reserved = 14 connections (limit not set)", report)
+        if connection.vendor == "postgresql":
+            # One connection per thread, kept for its next requests
+            self.assertIn("connections opened: 2 (0.33 per request", report)
+        self.assertEqual(db_pool._counters["requests"], 6)
+
+
+class PermuteTests(SimpleTestCase):
+
+    def test_distinct_and_in_range(self):
+        key = visit_codes._key()
+        # The whole 36^5 space takes minutes; both ends and a long run of it don't
+        numbers = list(range(50_000)) + list(range(visit_codes.DOMAIN - 50_000, visit_codes.DOMAIN))
+        images = [visit_codes.permute(n, key) for n in numbers]
+        self.assertEqual(len(set(images)), len(numbers))
+        self.assertTrue(all(0 <= i < visit_codes.DOMAIN for i in images))
+
+    def test_outside_domain(self):
+        with self.assertRaises(ValueError):
+            visit_codes.permute(visit_codes.DOMAIN)
+
+    def test_suffix_encoding(self):
+        self.assertEqual(visit_codes.encode_suffix(0), "00000")
+        self.assertEqual(visit_codes.encode_suffix(visit_codes.DOMAIN - 1), "ZZZZZ")
+
+
+class VisitCodeAllocatorTests(TransactionTestCase):
+    """Two allocators stand in for two worker processes."""
+
+    # Flush only the counter's app: the unmanaged tables reference users
+    available_apps = ["dashboard_app"]
+
+    def test_rolled_back_reservation_is_not_reused(self):
+        a = visit_codes.VisitCodeAllocator(block_size=10)
+        b = visit_codes.VisitCodeAllocator(block_size=10)
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                a.reserve(1)
+                raise RuntimeError("booking failed")
+
+        self.assertFalse(set(a.reserve(5)) & set(b.reserve(5)))
+
+    def test_blocks_are_not_shared(self):
+        a = visit_codes.VisitCodeAllocator(block_size=10)
+        b = visit_codes.VisitCodeAllocator(block_size=10)
+        first = a.reserve(3) + b.reserve(3)
+        with transaction.atomic():
+            inside = a.reserve(12) + b.reserve(12)
+        numbers = first + inside + a.reserve(25) + b.reserve(25)
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    @skipIf(connection.vendor == "postgresql", "PostgreSQL takes blocks from a sequence")
+    def test_reservations_in_a_transaction_take_single_numbers(self):
+        a = visit_codes.VisitCodeAllocator(block_size=10)
+        with transaction.atomic():
+            first, second = a.reserve(1), a.reserve(2)
+        self.assertEqual(second, [first[0] + 1, first[0] + 2])
+
+    @skipIf(connection.vendor == "postgresql", "PostgreSQL takes blocks from a sequence")
+    def test_counter_starts_after_the_old_block_counter(self):
+        VisitCodeBlock.objects.create(name=visit_codes.BLOCK_COUNTER_NAME, next_block=7)
+        with transaction.atomic():
+            [n] = visit_codes.VisitCodeAllocator().reserve(1)
+        self.assertEqual(n, 7 * visit_codes.CODE_BLOCK_SIZE)
+
+
+class BackfillIdentityColumnsTests(TestCase):
+
+    def backfill(self):
+        out = StringIO()
+        call_command("backfill_identity_columns", stdout=out)
+        return out.getvalue()
+
+    def test_rows_without_a_phone_are_left_alone(self):
+        User.objects.create(
+            first_name="No", last_name="Phone", email="nophone@example.com",
+            phone="", password="x", visitor_type="Guest",
+        )
+        self.assertIn("users: 0 row(s) backfilled", self.backfill())
+
+    def test_missing_values_are_filled_once(self):
+        user = User.objects.create(
+            first_name="Old", last_name="Row", email=" Old@Example.com",
+            phone="0917 123-4567", password="x", visitor_type="Guest",
+        )
+        User.objects.filter(pk=user.pk).update(email_norm=None, phone_norm=None)
+
+        self.assertIn("users: 1 row(s) backfilled", self.backfill())
+        user.refresh_from_db()
+        self.assertEqual((user.email_norm, user.phone_norm), ("old@example.com", "09171234567"))
+        self.assertIn("users: 0 row(s) backfilled", self.backfill())
+
+
+class RetiredIndexTests(TransactionTestCase):
+    """Runs outside a transaction: PostgreSQL drops them with DROP INDEX CONCURRENTLY."""
+
+    available_apps = ["dashboard_app"]
+
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, "users"))
+
+    def test_retired_index_is_dropped(self):
+        with connection.cursor() as cursor:
+            cursor.execute("CREATE INDEX users_email_lower_idx ON users (lower(email))")
+        self.addCleanup(self.drop_leftover)
+
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("ensure_indexes", "--check", stdout=out)
+        self.assertIn("users.users_email_lower_idx [retired v3, replaced by users_email_norm_key", out.getvalue())
+
+        out = StringIO()
+        call_command("ensure_indexes", stdout=out)
+        self.assertIn("users_email_norm_key (email_norm lookups)] dropped", out.getvalue())
+        self.assertNotIn("users_email_lower_idx", self.index_names())
+
+    def drop_leftover(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX IF EXISTS users_email_lower_idx")
+
+
+class BlockedConstraintTests(TransactionTestCase):
+    """Runs outside a transaction: PostgreSQL builds it with CREATE UNIQUE INDEX CONCURRENTLY."""
+
+    available_apps = ["dashboard_app"]
+
+    def index_names(self):
+        with connection.cursor() as cursor:
+            return set(connection.introspection.get_constraints(cursor, "visits"))
+
+    def test_duplicates_fail_the_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX visits_one_open_per_day")
+        self.addCleanup(call_command, "ensure_indexes", stdout=StringIO())
+        for code in ("CIT-DUP1", "CIT-DUP2"):
+            Visit.objects.create(
+                user_id=1, user_email="ana@example.com", code=code, purpose="Tour",
+                department="Registrar", visit_date=datetime(2026, 3, 2).date(), status="Upcoming",
+            )
+
+        out, err = StringIO(), StringIO()
+        with self.assertRaises(CommandError):
+            call_command("ensure_indexes", stdout=out, stderr=err)
+        self.assertIn("visits.visits_one_open_per_day [v1] FAILED", out.getvalue())
+        self.assertIn("could not create visits_one_open_per_day", err.getvalue())
+        self.assertNotIn("visits_one_open_per_day", self.index_names())
+
+        Visit.objects.filter(code="CIT-DUP2").delete()
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("ensure_indexes", stdout=out)
+        self.assertIn("visits.visits_one_open_per_day [v1] created constraint", out.getvalue())
+        if connection.vendor == "postgresql":
+            self.assertTrue(any(
+                q["sql"].startswith('CREATE UNIQUE INDEX CONCURRENTLY "visits_one_open_per_day"') for q in queries
+            ))
+        self.assertIn("visits_one_open_per_day", self.index_names())
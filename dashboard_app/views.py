@@ -1,6 +1,8 @@
 # dashboard_app/views.py
 from django.shortcuts import render, redirect
+from django.urls import reverse
 import os, json
+from urllib.parse import urlencode
 from dotenv import load_dotenv
 from datetime import datetime, date, timezone, timedelta, time as dtime
 from django.http import JsonResponse
@@ -10,16 +12,19 @@ from django.utils.timezone import now as django_now
 import pytz
 import logging
 from django.contrib import messages
+from django.core import signing
 import random
 import string
 
 # Import Django models
 from .models import Visit, SystemLog, Notification, AdminDismissedNotification
-from login_app.models import Administrator, FrontDeskStaff
+from login_app.decorators import staff_required
+from login_app.throttling import throttle
 from register_app.models import User
 
-# Import logs service
-from manage_reports_logs_app.services import list_logs
+from citu_campuspass import db_pool
+from citu_campuspass.query_budget import charge_to
+from . import counters
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -59,7 +64,7 @@ def apply_nine_pm_cutoff():
         status__in=["Active", "Upcoming"],
     )
 
-    visits_to_fix = today_qs | past_qs
+    visits_to_fix = list(today_qs | past_qs)
 
     for visit in visits_to_fix:
         if visit.status == "Active":
@@ -74,7 +79,8 @@ def apply_nine_pm_cutoff():
                 visit.end_time = cutoff
             visit.status = "Expired"
 
-        visit.save(update_fields=["status", "start_time", "end_time"])
+    # One UPDATE per batch instead of one per visit
+    Visit.objects.bulk_update(visits_to_fix, ["status", "start_time", "end_time"], batch_size=500)
 
 def format_ph_time(timestamp):
     if not timestamp:
@@ -166,10 +172,10 @@ def dashboard_view(request):
     # 4) Fetch User Notifications (Real DB - for initial load)
     user_notifications = []
     try:
-        current_user_obj = User.objects.filter(email=user_email).first()
-        if current_user_obj:
+        visitor = request.principals.get("visitor")
+        if visitor:
             notifs_qs = Notification.objects.filter(
-                receiver_user=current_user_obj
+                receiver_user_id=visitor.pk
             ).order_by('-created_at')[:5]
             
             for n in notifs_qs:
@@ -204,29 +210,27 @@ def dashboard_view(request):
 # ============================================================================
 
 def admin_dashboard_view(request):
-    if "admin_username" not in request.session:
+    # Resolved (and cached) by PrincipalMiddleware
+    admin = request.principals.get("admin")
+    if admin is None:
         return redirect("login_app:login")
 
-    current_admin = request.session["admin_username"]
-    admin_obj = None
+    is_superadmin = admin.is_superadmin
 
-    try:
-        admin_obj = Administrator.objects.get(username=current_admin)
-        is_superadmin = admin_obj.is_superadmin
+    # Only touch the session when the flag changed (saves a session write per load)
+    if request.session.get('is_superadmin') != is_superadmin:
         request.session['is_superadmin'] = is_superadmin
-    except Administrator.DoesNotExist:
-        is_superadmin = False
-        request.session['is_superadmin'] = False
 
-    # === Totals ===
-    admins_count = Administrator.objects.count()
-    staff_count = FrontDeskStaff.objects.count()
-    visitors_count = User.objects.count()
+    # === Totals (cached, see dashboard_app/counters.py) ===
+    def cache_missed():
+        charge_to(request, "dashboard_app:admin_dashboard:miss")
+
+    totals = counters.admin_totals(on_miss=cache_missed)
 
     # === Fetch Logs ===
     recent_activities = []
     try:
-        all_logs = list_logs(limit=10) 
+        all_logs = counters.recent_activity(limit=10, on_miss=cache_missed)
         for log_data in all_logs:
             class LogObj:
                 def __init__(self, data):
@@ -242,30 +246,29 @@ def admin_dashboard_view(request):
 
     # === Fetch Real Notifications ===
     notifications = []
-    if admin_obj:
-        try:
-            notifs_qs = Notification.objects.filter(
-                receiver_admin=admin_obj
-            ).order_by('-created_at')[:5]
+    try:
+        notifs_qs = Notification.objects.filter(
+            receiver_admin_id=admin.pk
+        ).order_by('-created_at')[:5]
 
-            for n in notifs_qs:
-                notifications.append({
-                    "id": n.notification_id,
-                    "title": n.title,
-                    "message": n.message,
-                    "type": n.type,
-                    "time": format_ph_time(n.created_at),
-                })
-        except Exception as e:
-            logger.error(f"Error fetching admin notifications: {e}")
+        for n in notifs_qs:
+            notifications.append({
+                "id": n.notification_id,
+                "title": n.title,
+                "message": n.message,
+                "type": n.type,
+                "time": format_ph_time(n.created_at),
+            })
+    except Exception as e:
+        logger.error(f"Error fetching admin notifications: {e}")
 
     context = {
         "admin_username": request.session["admin_username"],
         "admin_first_name": request.session.get("admin_first_name"),
         "is_superadmin": is_superadmin,
-        "total_admins": admins_count,
-        "total_staff": staff_count,
-        "total_visitors": visitors_count,
+        "total_admins": totals["admins"],
+        "total_staff": totals["staff"],
+        "total_visitors": totals["visitors"],
         "recent_activities": recent_activities,
         "notifications": notifications,
     }
@@ -283,7 +286,7 @@ def admin_recent_activities_api(request):
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
     try:
-        all_logs = list_logs(limit=10)
+        all_logs = counters.recent_activity(limit=10)
         activities = []
         for log in all_logs:
             activities.append({
@@ -296,6 +299,12 @@ def admin_recent_activities_api(request):
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
+def admin_db_pool_api(request):
+    """Database connection metrics of the worker serving this request (admins only)."""
+    if request.principals.get("admin") is None:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    return JsonResponse(db_pool.stats())
+
 def create_notification(receiver_admin=None, receiver_user=None, title="", message="", type="system_alert", visit=None):
     """Helper to create a notification in the DB."""
     try:
@@ -312,30 +321,26 @@ def create_notification(receiver_admin=None, receiver_user=None, title="", messa
 
 def admin_notifications_api(request):
     """API to fetch notifications dynamically."""
-    if "admin_username" not in request.session:
+    admin = request.principals.get("admin")
+    if admin is None:
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
-    current_admin_username = request.session["admin_username"]
-    try:
-        admin_obj = Administrator.objects.get(username=current_admin_username)
-        notifications_qs = Notification.objects.filter(
-            receiver_admin=admin_obj
-        ).order_by('-created_at')[:20]
-
-        notifications_data = []
-        for n in notifications_qs:
-            notifications_data.append({
-                "id": n.notification_id,
-                "title": n.title,
-                "message": n.message,
-                "type": n.type,
-                "time": format_ph_time(n.created_at),
-                "is_read": n.is_read 
-            })
+    notifications_qs = Notification.objects.filter(
+        receiver_admin_id=admin.pk
+    ).order_by('-created_at')[:20]
+
+    notifications_data = []
+    for n in notifications_qs:
+        notifications_data.append({
+            "id": n.notification_id,
+            "title": n.title,
+            "message": n.message,
+            "type": n.type,
+            "time": format_ph_time(n.created_at),
+            "is_read": n.is_read 
+        })
 
-        return JsonResponse({"notifications": notifications_data})
-    except Administrator.DoesNotExist:
-        return JsonResponse({"notifications": []})
+    return JsonResponse({"notifications": notifications_data})
 
 @csrf_exempt
 @require_POST
@@ -343,7 +348,8 @@ def delete_notification_api(request):
     """
     Permanently deletes a single notification (Admin).
     """
-    if "admin_username" not in request.session:
+    admin = request.principals.get("admin")
+    if admin is None:
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
     try:
@@ -353,9 +359,7 @@ def delete_notification_api(request):
         if not notif_id:
             return JsonResponse({"error": "Missing notification ID"}, status=400)
 
-        current_admin = Administrator.objects.get(username=request.session["admin_username"])
-        
-        notif = Notification.objects.get(notification_id=notif_id, receiver_admin=current_admin)
+        notif = Notification.objects.get(notification_id=notif_id, receiver_admin_id=admin.pk)
         notif.delete() 
 
         return JsonResponse({"success": True})
@@ -370,15 +374,13 @@ def clear_notifications_api(request):
     """
     Permanently deletes ALL notifications for the current admin.
     """
-    if "admin_username" not in request.session:
+    admin = request.principals.get("admin")
+    if admin is None:
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
     try:
-        admin_obj = Administrator.objects.get(username=request.session["admin_username"])
-        Notification.objects.filter(receiver_admin=admin_obj).delete()
+        Notification.objects.filter(receiver_admin_id=admin.pk).delete()
         return JsonResponse({"success": True})
-    except Administrator.DoesNotExist:
-        return JsonResponse({"error": "Admin not found"}, status=404)
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
 
@@ -389,39 +391,36 @@ def clear_notifications_api(request):
 
 def visitor_notifications_api(request):
     """API to fetch visitor notifications"""
-    if "user_email" not in request.session:
+    visitor = request.principals.get("visitor")
+    if visitor is None:
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
-    try:
-        user = User.objects.get(email=request.session["user_email"])
-        qs = Notification.objects.filter(receiver_user=user).order_by('-created_at')[:20]
-        
-        data = [{
-            "id": n.notification_id,
-            "title": n.title,
-            "message": n.message,
-            "type": n.type,
-            "time": format_ph_time(n.created_at),
-            "is_read": n.is_read
-        } for n in qs]
-        
-        return JsonResponse({"notifications": data})
-    except User.DoesNotExist:
-        return JsonResponse({"notifications": []})
+    qs = Notification.objects.filter(receiver_user_id=visitor.pk).order_by('-created_at')[:20]
+
+    data = [{
+        "id": n.notification_id,
+        "title": n.title,
+        "message": n.message,
+        "type": n.type,
+        "time": format_ph_time(n.created_at),
+        "is_read": n.is_read
+    } for n in qs]
+
+    return JsonResponse({"notifications": data})
 
 @csrf_exempt
 @require_POST
 def delete_visitor_notification_api(request):
     """Visitor Delete Single"""
-    if "user_email" not in request.session:
+    visitor = request.principals.get("visitor")
+    if visitor is None:
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
     try:
         body = json.loads(request.body)
-        user = User.objects.get(email=request.session["user_email"])
         Notification.objects.filter(
             notification_id=body.get("notif_id"), 
-            receiver_user=user
+            receiver_user_id=visitor.pk
         ).delete()
         return JsonResponse({"success": True})
     except Exception as e:
@@ -431,12 +430,12 @@ def delete_visitor_notification_api(request):
 @require_POST
 def clear_visitor_notifications_api(request):
     """Visitor Clear All"""
-    if "user_email" not in request.session:
+    visitor = request.principals.get("visitor")
+    if visitor is None:
         return JsonResponse({"error": "Unauthorized"}, status=403)
 
     try:
-        user = User.objects.get(email=request.session["user_email"])
-        Notification.objects.filter(receiver_user=user).delete()
+        Notification.objects.filter(receiver_user_id=visitor.pk).delete()
         return JsonResponse({"success": True})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=500)
@@ -446,16 +445,6 @@ def clear_visitor_notifications_api(request):
 # ===== STAFF DASHBOARD =====
 # ============================================================================
 
-def staff_required(view_func):
-    """Decorator to ensure only staff can access certain views"""
-    def wrapper(request, *args, **kwargs):
-        if 'staff_username' not in request.session:
-            messages.warning(request, "Please log in as staff to access this page.")
-            return redirect('login_app:login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
-
-
 @staff_required
 def staff_dashboard_view(request):
     """Main staff dashboard with stats and quick code checker"""
@@ -471,42 +460,47 @@ def staff_dashboard_view(request):
     cutoff_time = dtime(21, 0)
 
     if now_ph.time() >= cutoff_time:
-        active_visits_to_complete = Visit.objects.filter(
+        active_visits_to_complete = list(Visit.objects.filter(
             visit_date=today,
             status='Active',
-        )
+        ))
         for visit in active_visits_to_complete:
             if visit.end_time is None or visit.end_time < cutoff_time:
                 visit.end_time = cutoff_time
             visit.status = 'Completed'
-            visit.save()
 
-        upcoming_visits_to_expire = Visit.objects.filter(
+        upcoming_visits_to_expire = list(Visit.objects.filter(
             visit_date=today,
             status='Upcoming',
-        )
+        ))
         for visit in upcoming_visits_to_expire:
             if visit.start_time is None:
                 visit.start_time = cutoff_time
             if visit.end_time is None:
                 visit.end_time = cutoff_time
             visit.status = 'Expired'
-            visit.save()
+
+        Visit.objects.bulk_update(
+            active_visits_to_complete + upcoming_visits_to_expire,
+            ['status', 'start_time', 'end_time'],
+            batch_size=500,
+        )
 
     try:
-        today_visits_qs = Visit.objects.filter(visit_date=today).order_by('start_time', 'pk')
+        today_visits = list(Visit.objects.filter(visit_date=today).order_by('start_time', 'pk'))
+        changed_visits = []
 
-        for visit in today_visits_qs:
+        for visit in today_visits:
             if visit.status in ['Completed', 'Expired']:
                 continue
 
             if visit.start_time:
-                visit_start = datetime.combine(visit.visit_date, visit.start_time).replace(tzinfo=PHILIPPINES_TZ)
+                visit_start = PHILIPPINES_TZ.localize(datetime.combine(visit.visit_date, visit.start_time))
 
                 if visit.end_time:
-                    visit_end = datetime.combine(visit.visit_date, visit.end_time).replace(tzinfo=PHILIPPINES_TZ)
+                    visit_end = PHILIPPINES_TZ.localize(datetime.combine(visit.visit_date, visit.end_time))
                 else:
-                    visit_end = datetime.combine(visit.visit_date, datetime.max.time()).replace(tzinfo=PHILIPPINES_TZ)
+                    visit_end = PHILIPPINES_TZ.localize(datetime.combine(visit.visit_date, datetime.max.time()))
 
                 # ================= BUG FIX APPLIED HERE =================
                 # If a visit is ALREADY Active, do NOT revert it to Upcoming,
@@ -530,15 +524,22 @@ def staff_dashboard_view(request):
 
             if visit.status != new_status:
                 visit.status = new_status
-                visit.save()
+                changed_visits.append(visit)
 
-        today_visits_count = today_visits_qs.count()
-        active_visits_count = today_visits_qs.filter(status='Active').count()
-        checked_in_count = today_visits_qs.filter(status__in=['Active', 'Completed']).count()
+        Visit.objects.bulk_update(changed_visits, ['status'], batch_size=500)
 
+        # Counted from the list already loaded (no extra COUNT queries)
+        today_visits_count = len(today_visits)
+        active_visits_count = sum(1 for v in today_visits if v.status == 'Active')
+        checked_in_count = sum(1 for v in today_visits if v.status in ['Active', 'Completed'])
+
+        # Today's PH-time window as a range (created_at__date would compare UTC
+        # dates and can't use system_logs_action_created_idx)
+        day_start = PHILIPPINES_TZ.localize(datetime.combine(today, dtime.min))
         recent_checkins = SystemLog.objects.filter(
             action_type__in=["Visitor Check-In", "Visitor Check-Out", "Walk-In Registration"],
-            created_at__date=today,
+            created_at__gte=day_start,
+            created_at__lt=day_start + timedelta(days=1),
         ).order_by("-created_at")[:15]
 
         for checkin in recent_checkins:
@@ -547,7 +548,8 @@ def staff_dashboard_view(request):
             except Exception:
                 checkin.display_time = str(checkin.created_at)
 
-        code_check_result = request.session.pop('code_check_result', None)
+        entered_code = checked_code(request)
+        code_check_result = code_check_result_for(entered_code) if entered_code else None
 
         context = {
             'staff_username': staff_username,
@@ -556,7 +558,7 @@ def staff_dashboard_view(request):
             'today_visits_count': today_visits_count,
             'active_visits_count': active_visits_count,
             'checked_in_count': checked_in_count,
-            'today_visits': list(today_visits_qs),
+            'today_visits': today_visits,
             'recent_checkins': recent_checkins,
             'code_check_result': code_check_result,
         }
@@ -576,11 +578,73 @@ def staff_dashboard_view(request):
             'recent_checkins': [],
         })
 
+# check_code() redirects with the code signed for the staff member, so the
+# result page can't be used to look codes up past the check_code throttle
+CODE_RESULT_SALT = "dashboard_app.check_code"
+CODE_RESULT_MAX_AGE = 120  # seconds
+
+def signed_code(visit_code, staff_username):
+    return signing.dumps([visit_code, staff_username], salt=CODE_RESULT_SALT)
+
+def checked_code(request):
+    """The code in ?code=, if check_code() signed it for this staff member (else "")."""
+    token = request.GET.get('code', '')
+    if not token:
+        return ''
+    try:
+        visit_code, staff_username = signing.loads(token, salt=CODE_RESULT_SALT, max_age=CODE_RESULT_MAX_AGE)
+    except signing.BadSignature:
+        return ''
+    if staff_username != request.session.get('staff_username'):
+        return ''
+    return visit_code
+
+def code_check_result_for(visit_code):
+    """
+    The result card for a checked code. check_code() redirects here with
+    a signed ?code=..., so the result is rebuilt from the visit instead of
+    being parked in the session between the POST and the GET.
+    """
+    try:
+        visit = Visit.objects.get(code=visit_code)
+    except Visit.DoesNotExist:
+        return {
+            'status': 'error',
+            'message': f'Visit code "{visit_code}" not found in the system.'
+        }
+
+    today = django_now().astimezone(PHILIPPINES_TZ).date()
+    if visit.visit_date != today:
+        scheduled_str = visit.visit_date.strftime("%b %d, %Y") if visit.visit_date else "an unknown date"
+        return {
+            "status": "error",
+            "message": (
+                f'Visit code "{visit_code}" is scheduled for {scheduled_str}, '
+                f'not today. Staff can only process visit codes for today\'s date.'
+            ),
+        }
+
+    return {
+        'status': 'success',
+        'message': 'Visit code found and verified!',
+        'visit': {
+            'code': visit.code,
+            'user_email': visit.user_email,
+            'purpose': visit.purpose,
+            'department': visit.department,
+            'visit_date': visit.visit_date.isoformat() if visit.visit_date else None,
+            'status': visit.status,
+            'start_time': visit.start_time.isoformat() if visit.start_time else None,
+            'end_time': visit.end_time.isoformat() if visit.end_time else None,
+        }
+    }
+
+
 @staff_required
 def code_checker(request):
     staff_first_name = request.session.get('staff_first_name', 'Staff')
-    code_check_result = request.session.pop('code_check_result', None)
-    entered_code = request.session.pop('entered_code', None)
+    entered_code = checked_code(request)
+    code_check_result = code_check_result_for(entered_code) if entered_code else None
     context = {
         'staff_first_name': staff_first_name,
         'code_check_result': code_check_result,
@@ -590,14 +654,18 @@ def code_checker(request):
 
 @staff_required
 @require_POST
+@throttle(
+    "check_code",
+    identifier=lambda request: request.session.get('staff_username'),
+    template='dashboard_app/code_checker.html',
+    context=lambda request: {'staff_first_name': request.session.get('staff_first_name', 'Staff')},
+)
 def check_code(request):
     visit_code = request.POST.get('visit_code', '').strip().upper()
     if not visit_code:
         messages.error(request, "Please enter a visit code.")
         return redirect('dashboard_app:code_checker')
 
-    request.session['entered_code'] = visit_code
-
     try:
         try:
             visit = Visit.objects.get(code=visit_code)
@@ -605,17 +673,9 @@ def check_code(request):
             today = now_ph.date()
             cutoff_time = dtime(21, 0)
 
-            # 🔒 HARD RULE: only allow staff to check codes for TODAY
-            if visit.visit_date != today:
-                scheduled_str = visit.visit_date.strftime("%b %d, %Y") if visit.visit_date else "an unknown date"
-                request.session['code_check_result'] = {
-                    "status": "error",
-                    "message": (
-                        f'Visit code "{visit_code}" is scheduled for {scheduled_str}, '
-                        f'not today. Staff can only process visit codes for today\'s date.'
-                    ),
-                }
-            else:
+            # 🔒 HARD RULE: only allow staff to process codes for TODAY
+            # (code_check_result_for() explains other dates on the result card)
+            if visit.visit_date == today:
                 # ✅ Only for TODAY: apply your status logic
                 if now_ph.time() >= cutoff_time:
                     if visit.status == "Active":
@@ -632,18 +692,18 @@ def check_code(request):
                         visit.save()
                 else:
                     if visit.start_time:
-                        visit_start = datetime.combine(
+                        visit_start = PHILIPPINES_TZ.localize(datetime.combine(
                             visit.visit_date, visit.start_time
-                        ).replace(tzinfo=PHILIPPINES_TZ)
+                        ))
 
                         if visit.end_time:
-                            visit_end = datetime.combine(
+                            visit_end = PHILIPPINES_TZ.localize(datetime.combine(
                                 visit.visit_date, visit.end_time
-                            ).replace(tzinfo=PHILIPPINES_TZ)
+                            ))
                         else:
-                            visit_end = datetime.combine(
+                            visit_end = PHILIPPINES_TZ.localize(datetime.combine(
                                 visit.visit_date, datetime.max.time()
-                            ).replace(tzinfo=PHILIPPINES_TZ)
+                            ))
 
                         # Sticky Active status
                         if visit.status == "Active":
@@ -664,35 +724,17 @@ def check_code(request):
                         visit.status = new_status
                         visit.save()
 
-                # Build SUCCESS result only if date is today
-                if visit.visit_date == today:
-                    request.session['code_check_result'] = {
-                        'status': 'success',
-                        'message': 'Visit code found and verified!',
-                        'visit': {
-                            'code': visit.code,
-                            'user_email': visit.user_email,
-                            'purpose': visit.purpose,
-                            'department': visit.department,
-                            'visit_date': visit.visit_date.isoformat() if visit.visit_date else None,
-                            'status': visit.status,
-                            'start_time': visit.start_time.isoformat() if visit.start_time else None,
-                            'end_time': visit.end_time.isoformat() if visit.end_time else None,
-                        }
-                    }
-
         except Visit.DoesNotExist:
-            request.session['code_check_result'] = {
-                'status': 'error',
-                'message': f'Visit code "{visit_code}" not found in the system.'
-            }
+            pass
 
-        # Same redirect logic as before
+        # Same redirect logic as before; the code travels in the URL, not the session
         referer = request.META.get('HTTP_REFERER', '')
         if 'staff_dashboard' in referer or ('staff' in referer and 'dashboard' in referer):
-            return redirect('dashboard_app:staff_dashboard')
+            target = reverse('dashboard_app:staff_dashboard')
         else:
-            return redirect('dashboard_app:code_checker')
+            target = reverse('dashboard_app:code_checker')
+        token = signed_code(visit_code, request.session.get('staff_username'))
+        return redirect(f"{target}?{urlencode({'code': token})}")
 
     except Exception as e:
         logger.error(f"Error checking code: {str(e)}")
@@ -0,0 +1,242 @@
+# dashboard_app/visit_codes.py
+"""
+Collision-free visit code allocation.
+
+Visit codes look like CIT-CCS-7QX2M. The 5-character suffix is no longer
+random: each code takes the next number from a database counter and pushes
+it through a keyed Feistel permutation over 36^5 values, then base-36
+encodes the result. Distinct counter values always give distinct suffixes,
+so there is nothing to check with `Visit.objects.filter(code=...).exists()`,
+and consecutive codes still look unrelated to each other.
+
+The counter is handed out in blocks (hi/lo): a worker reserves
+CODE_BLOCK_SIZE numbers with one query and then allocates locally, so
+almost every booking costs zero queries for its code.
+
+A block must stay taken even when the booking that reserved it rolls back
+(duplicate open visit, department full, ...), or another worker would get
+it again. On PostgreSQL blocks come from a sequence (nextval() is never
+rolled back). Elsewhere the visit_code_number counter row counts single
+numbers: outside a transaction a whole block is taken and its UPDATE
+commits at once; inside one exactly the numbers needed right now are
+taken (they are given back with the rollback) and nothing is kept for later.
+
+VISIT_CODE_KEY must never change once codes have been issued, otherwise new
+codes may repeat old ones.
+"""
+import hashlib
+import hmac
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import Visit, VisitCodeBlock
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SUFFIX_LENGTH = 5
+DOMAIN = len(ALPHABET) ** SUFFIX_LENGTH   # 60,466,176 possible suffixes
+
+# Feistel network over 26 bits (2^26 >= 36^5), cycle-walked into DOMAIN
+HALF_BITS = 13
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 4
+
+CODE_BLOCK_SIZE = 100
+COUNTER_NAME = "visit_code_number"    # next free number (SQLite and other non-PostgreSQL databases)
+BLOCK_COUNTER_NAME = "visit_code"     # older counter, in blocks; only read to seed the one above
+SEQUENCE_NAME = "visit_code_block_seq"  # PostgreSQL, see migration 0003
+
+
+class VisitCodeExhausted(Exception):
+    """Every suffix in the 36^5 space has been handed out."""
+
+
+def _key():
+    secret = getattr(settings, "VISIT_CODE_KEY", None) or settings.SECRET_KEY
+    return hashlib.sha256(f"visit-code:{secret}".encode()).digest()
+
+
+def _round(key, i, value):
+    digest = hmac.new(key, f"{i}:{value}".encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], "big") & HALF_MASK
+
+
+def permute(n, key=None):
+    """Keyed bijection of [0, DOMAIN) onto itself."""
+    if not 0 <= n < DOMAIN:
+        raise ValueError(f"{n} is outside the visit code space")
+
+    key = key or _key()
+    value = n
+    while True:
+        left, right = value >> HALF_BITS, value & HALF_MASK
+        for i in range(ROUNDS):
+            left, right = right, left ^ _round(key, i, right)
+        value = (left << HALF_BITS) | right
+        # Cycle-walk: stay inside [0, DOMAIN) while keeping the mapping 1:1
+        if value < DOMAIN:
+            return value
+
+
+def encode_suffix(n):
+    chars = []
+    for _ in range(SUFFIX_LENGTH):
+        n, rem = divmod(n, len(ALPHABET))
+        chars.append(ALPHABET[rem])
+    return "".join(reversed(chars))
+
+
+class VisitCodeAllocator:
+    """Per-process hi/lo allocator of unique visit code suffixes."""
+
+    def __init__(self, block_size=CODE_BLOCK_SIZE):
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0
+        self._ranges = []
+        self._pid = None
+
+    def _create_counter(self, count):
+        """First use: start after every block the older block counter handed out."""
+        blocks = VisitCodeBlock.objects.filter(name=BLOCK_COUNTER_NAME).values_list("next_block", flat=True).first()
+        first = (blocks or 0) * CODE_BLOCK_SIZE
+        try:
+            with transaction.atomic():
+                VisitCodeBlock.objects.create(name=COUNTER_NAME, next_block=first + count)
+        except IntegrityError:
+            # Another worker created it first
+            VisitCodeBlock.objects.filter(name=COUNTER_NAME).update(next_block=F("next_block") + count)
+
+    def _take_numbers(self, count):
+        """First of `count` consecutive numbers from the visit_code_number counter."""
+        counter = VisitCodeBlock.objects.filter(name=COUNTER_NAME)
+        # The UPDATE locks the row until the read below (no savepoint needed)
+        with transaction.atomic(savepoint=False):
+            if not counter.update(next_block=F("next_block") + count):
+                self._create_counter(count)
+            first = counter.values_list("next_block", flat=True).get() - count
+        if first + count > DOMAIN:
+            raise VisitCodeExhausted("No visit codes left to allocate.")
+        return first
+
+    def _take_ranges(self, blocks):
+        """(start, end) ranges that stay ours whatever the caller's transaction does."""
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s) FROM generate_series(1, %s)", [SEQUENCE_NAME, blocks])
+                return [self._block_range(row[0]) for row in sorted(cursor.fetchall())]
+        first = self._take_numbers(blocks * self.block_size)
+        return [(first, first + blocks * self.block_size)]
+
+    def _block_range(self, block):
+        start = block * self.block_size
+        if start >= DOMAIN:
+            raise VisitCodeExhausted("No visit codes left to allocate.")
+        return start, min(start + self.block_size, DOMAIN)
+
+    def reserve(self, count=1):
+        """Next `count` counter values (bulk requests reserve all their blocks at once)."""
+        if connection.vendor != "postgresql" and connection.in_atomic_block:
+            # The counter UPDATE belongs to the caller's transaction and is
+            # undone with it, so take exactly what is needed and keep nothing
+            first = self._take_numbers(count)
+            return list(range(first, first + count))
+
+        numbers = []
+        with self._lock:
+            # A block reserved before a fork must not be reused by the children
+            if self._pid != os.getpid():
+                self._next = self._end = 0
+                self._ranges = []
+                self._pid = os.getpid()
+
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    if not self._ranges:
+                        missing = count - len(numbers)
+                        self._ranges = self._take_ranges(-(-missing // self.block_size))
+                    self._next, self._end = self._ranges.pop(0)
+                take = min(count - len(numbers), self._end - self._next)
+                numbers.extend(range(self._next, self._next + take))
+                self._next += take
+        return numbers
+
+    def suffixes(self, count=1):
+        key = _key()
+        return [encode_suffix(permute(n, key)) for n in self.reserve(count)]
+
+
+allocator = VisitCodeAllocator()
+
+
+def code_prefix(part):
+    """'CIT-XXX' with exactly 3 alphanumeric characters (VIS if empty)."""
+    cleaned = "".join(ch for ch in (part or "").upper() if ch.isalnum()) or "VIS"
+    return f"CIT-{cleaned[:3]}"
+
+
+def new_visit_code(part):
+    return f"{code_prefix(part)}-{allocator.suffixes(1)[0]}"
+
+
+def new_visit_codes(part, count):
+    prefix = code_prefix(part)
+    return [f"{prefix}-{suffix}" for suffix in allocator.suffixes(count)]
+
+
+def new_unused_visit_codes(part, count):
+    """
+    `count` codes for a bulk insert, checked once (one query) against codes
+    left by the old random generator.
+    """
+    codes = new_visit_codes(part, count)
+    while True:
+        clashing = set(Visit.objects.filter(code__in=codes).values_list("code", flat=True))
+        if not clashing:
+            return codes
+        logger.warning(f"{len(clashing)} visit code(s) clash with legacy codes, replacing.")
+        replacements = iter(new_visit_codes(part, len(clashing)))
+        codes = [next(replacements) if code in clashing else code for code in codes]
+
+
+def save_with_code(visit, part, attempts=3):
+    """
+    Assign a fresh code to `visit` and insert it.
+
+    Allocated suffixes never repeat each other, but codes issued by the old
+    random generator are still in the table; on the (rare) clash with one of
+    those the visit simply gets the next code. Any other IntegrityError is
+    re-raised for the caller to handle.
+    """
+    for _ in range(attempts):
+        visit.code = new_visit_code(part)
+        try:
+            with transaction.atomic():
+                visit.save()
+            return visit
+        except IntegrityError:
+            if not Visit.objects.filter(code=visit.code).exists():
+                raise
+            logger.warning(f"Visit code {visit.code} clashes with a legacy code, retrying.")
+    raise IntegrityError("Could not assign a unique visit code.")
+
+
+def create_with_codes(visits, part):
+    """
+    Insert several visits with freshly allocated codes: one legacy-clash
+    check and one bulk INSERT. A single visit goes through save_with_code().
+    """
+    if len(visits) == 1:
+        return [save_with_code(visits[0], part)]
+
+    for visit, code in zip(visits, new_unused_visit_codes(part, len(visits))):
+        visit.code = code
+    with transaction.atomic():
+        return Visit.objects.bulk_create(visits)
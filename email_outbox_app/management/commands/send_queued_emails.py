@@ -0,0 +1,45 @@
+# email_outbox_app/management/commands/send_queued_emails.py
+"""
+Deliver queued emails from the outbox.
+
+    python manage.py send_queued_emails           # drain once (cron)
+    python manage.py send_queued_emails --loop    # long-running worker
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from email_outbox_app import services
+
+
+class Command(BaseCommand):
+    help = "Send due emails from the outbox (batched, with retries and dead-lettering)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=services.BATCH_SIZE)
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling the outbox instead of exiting when it is empty.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep between polls with --loop.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+
+        while True:
+            sent, failed = services.drain(batch_size)
+            if sent or failed or not options["loop"]:
+                self.stdout.write(f"{sent} email(s) sent, {failed} failed.")
+
+            if not options["loop"]:
+                return
+
+            close_old_connections()
+            time.sleep(options["interval"])
@@ -0,0 +1,42 @@
+from django.db import models
+from django.utils import timezone
+
+
+class EmailOutbox(models.Model):
+    """
+    Outgoing email, written in the same transaction as the action that
+    triggers it and delivered later by `manage.py send_queued_emails`.
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_DEAD = 'dead'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_DEAD, 'Dead'),
+    ]
+
+    to_email = models.TextField()
+    subject = models.TextField()
+    body_text = models.TextField()
+    category = models.TextField(blank=True, default='')   # e.g. "visit_booking", "password_reset"
+
+    status = models.TextField(choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'email_outbox'
+        indexes = [
+            # Worker poll: due rows in pending/sending state
+            models.Index(fields=['status', 'next_attempt_at'], name='email_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject} ({self.status})"
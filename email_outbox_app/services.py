@@ -0,0 +1,142 @@
+# email_outbox_app/services.py
+"""
+Email outbox: queue inside the request, deliver from the worker.
+
+`queue_email()` is just an INSERT, so call it inside the same
+`transaction.atomic()` block as the action the email is about: if the
+action rolls back, no email goes out, and if it commits, the email is
+guaranteed to be delivered (or dead-lettered) eventually.
+"""
+import logging
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import EmailOutbox
+from .transports import get_transport
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 6
+
+# Retry delays: 30s, 1m, 2m, 4m, 8m ... capped at 1h, with a little jitter
+BACKOFF_BASE = 30       # seconds
+BACKOFF_MAX = 3600      # seconds
+
+# A claimed row is retried if its worker hasn't finished it by then
+SENDING_LEASE = 300     # seconds
+
+
+def queue_email(to_email, subject, body_text, category=""):
+    return EmailOutbox.objects.create(
+        to_email=to_email,
+        subject=subject,
+        body_text=body_text,
+        category=category,
+    )
+
+
+def queue_emails(emails, category=""):
+    """Queue many (to_email, subject, body_text) tuples with one INSERT."""
+    return EmailOutbox.objects.bulk_create([
+        EmailOutbox(to_email=to_email, subject=subject, body_text=body_text, category=category)
+        for to_email, subject, body_text in emails
+    ])
+
+
+def backoff_delay(attempts):
+    delay = min(BACKOFF_BASE * 2 ** max(attempts - 1, 0), BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size=BATCH_SIZE):
+    """
+    Lease up to `batch_size` due messages to this worker.
+    SKIP LOCKED lets several workers drain the outbox side by side.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status__in=[EmailOutbox.STATUS_PENDING, EmailOutbox.STATUS_SENDING],
+                next_attempt_at__lte=now,
+            )
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+
+        EmailOutbox.objects.filter(id__in=ids).update(
+            status=EmailOutbox.STATUS_SENDING,
+            next_attempt_at=now + timedelta(seconds=SENDING_LEASE),
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids).order_by("id"))
+
+
+def _record_failure(message, error):
+    message.attempts += 1
+    message.last_error = str(error)[:2000]
+
+    if message.attempts >= MAX_ATTEMPTS:
+        message.status = EmailOutbox.STATUS_DEAD
+        logger.error(f"Email {message.id} to {message.to_email} dead-lettered: {error}")
+    else:
+        message.status = EmailOutbox.STATUS_PENDING
+        message.next_attempt_at = timezone.now() + backoff_delay(message.attempts)
+        logger.warning(f"Email {message.id} to {message.to_email} failed (attempt {message.attempts}): {error}")
+
+
+def send_batch(batch_size=BATCH_SIZE, transport=None):
+    """Deliver one batch. Returns (sent, failed)."""
+    batch = claim_batch(batch_size)
+    if not batch:
+        return 0, 0
+
+    sent_ids, failed = [], []
+    transport = transport or get_transport()
+
+    try:
+        with transport:
+            for message in batch:
+                try:
+                    transport.send(message)
+                    sent_ids.append(message.id)
+                except Exception as e:
+                    _record_failure(message, e)
+                    failed.append(message)
+    except Exception as e:
+        # Transport could not even open: every unsent message counts as a failed attempt
+        for message in batch:
+            if message.id not in sent_ids and message not in failed:
+                _record_failure(message, e)
+                failed.append(message)
+
+    if sent_ids:
+        EmailOutbox.objects.filter(id__in=sent_ids).update(
+            status=EmailOutbox.STATUS_SENT,
+            sent_at=timezone.now(),
+            last_error="",
+        )
+    if failed:
+        EmailOutbox.objects.bulk_update(
+            failed, ["status", "attempts", "next_attempt_at", "last_error"]
+        )
+
+    return len(sent_ids), len(failed)
+
+
+def drain(batch_size=BATCH_SIZE, transport=None):
+    """Send batches until nothing is due. Returns (sent, failed)."""
+    total_sent = total_failed = 0
+    while True:
+        sent, failed = send_batch(batch_size, transport)
+        total_sent += sent
+        total_failed += failed
+        if sent + failed < batch_size:
+            return total_sent, total_failed
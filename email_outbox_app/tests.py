@@ -0,0 +1,192 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.utils import timezone
+
+from . import services
+from .models import EmailOutbox
+from .transports import BaseTransport, FileTransport
+
+
+class FailingTransport(BaseTransport):
+    def send(self, message):
+        raise RuntimeError("smtp down")
+
+
+class UnreachableTransport(BaseTransport):
+    def open(self):
+        raise ConnectionError("no route to host")
+
+
+class OutboxTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, "sent.jsonl")
+        settings_override = override_settings(
+            EMAIL_OUTBOX_FILE_PATH=self.path,
+            EMAIL_OUTBOX_TRANSPORT="email_outbox_app.transports.FileTransport",
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def sent_lines(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f]
+
+
+class DeliveryTests(OutboxTestCase):
+
+    def test_drain_delivers_through_file_transport(self):
+        services.queue_email("a@example.com", "Hello", "Body", category="visit_booking")
+        self.assertEqual(services.drain(), (1, 0))
+
+        [line] = self.sent_lines()
+        self.assertEqual((line["to"], line["subject"], line["body"]), ("a@example.com", "Hello", "Body"))
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.status, EmailOutbox.STATUS_SENT)
+        self.assertIsNotNone(message.sent_at)
+
+    def test_drain_runs_until_nothing_is_due(self):
+        services.queue_emails([(f"u{i}@example.com", "S", "B") for i in range(5)])
+        self.assertEqual(services.drain(batch_size=2), (5, 0))
+        self.assertEqual(len(self.sent_lines()), 5)
+        self.assertEqual(services.drain(batch_size=2), (0, 0))
+
+    def test_command(self):
+        services.queue_email("a@example.com", "Hello", "Body")
+        out = StringIO()
+        call_command("send_queued_emails", stdout=out)
+        self.assertIn("1 email(s) sent, 0 failed.", out.getvalue())
+
+
+class LeaseTests(OutboxTestCase):
+
+    def test_claimed_rows_are_leased(self):
+        services.queue_emails([(f"u{i}@example.com", "S", "B") for i in range(3)])
+        batch = services.claim_batch()
+        self.assertEqual(len(batch), 3)
+        self.assertTrue(all(m.status == EmailOutbox.STATUS_SENDING for m in batch))
+        self.assertTrue(all(m.next_attempt_at > timezone.now() for m in batch))
+        # Leased rows aren't handed to another worker
+        self.assertEqual(services.claim_batch(), [])
+
+    def test_expired_lease_is_claimed_again(self):
+        services.queue_email("a@example.com", "S", "B")
+        services.claim_batch()
+        # The worker died mid-batch; its lease runs out
+        EmailOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(len(services.claim_batch()), 1)
+
+    def test_not_yet_due_rows_wait(self):
+        EmailOutbox.objects.create(
+            to_email="a@example.com", subject="S", body_text="B",
+            next_attempt_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(services.claim_batch(), [])
+
+
+class RetryTests(OutboxTestCase):
+
+    def test_failure_is_retried_with_backoff(self):
+        services.queue_email("a@example.com", "S", "B")
+        before = timezone.now()
+        self.assertEqual(services.send_batch(transport=FailingTransport()), (0, 1))
+
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.status, EmailOutbox.STATUS_PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, "smtp down")
+        delay = (message.next_attempt_at - before).total_seconds()
+        self.assertTrue(services.BACKOFF_BASE * 0.8 <= delay <= services.BACKOFF_BASE * 1.2 + 1)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        self.assertLessEqual(services.backoff_delay(1).total_seconds(), services.BACKOFF_BASE * 1.2)
+        self.assertGreaterEqual(services.backoff_delay(3).total_seconds(), services.BACKOFF_BASE * 4 * 0.8)
+        self.assertLessEqual(services.backoff_delay(50).total_seconds(), services.BACKOFF_MAX * 1.2)
+
+    def test_dead_lettered_after_max_attempts(self):
+        services.queue_email("a@example.com", "S", "B")
+        EmailOutbox.objects.update(attempts=services.MAX_ATTEMPTS - 1)
+        services.send_batch(transport=FailingTransport())
+
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.status, EmailOutbox.STATUS_DEAD)
+        self.assertEqual(message.attempts, services.MAX_ATTEMPTS)
+        EmailOutbox.objects.update(next_attempt_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(services.claim_batch(), [])
+
+    def test_transport_that_cannot_open_fails_the_batch(self):
+        services.queue_emails([(f"u{i}@example.com", "S", "B") for i in range(3)])
+        self.assertEqual(services.send_batch(transport=UnreachableTransport()), (0, 3))
+        self.assertEqual(
+            set(EmailOutbox.objects.values_list("status", "attempts")),
+            {(EmailOutbox.STATUS_PENDING, 1)},
+        )
+
+    def test_base_transport_send_is_abstract(self):
+        with self.assertRaises(NotImplementedError):
+            BaseTransport().send(None)
+        services.queue_email("a@example.com", "S", "B")
+        self.assertEqual(services.send_batch(transport=BaseTransport()), (0, 1))
+
+    def test_queue_rolls_back_with_the_action(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                services.queue_email("a@example.com", "S", "B")
+                raise RuntimeError("booking failed")
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+class FileTransportTests(OutboxTestCase):
+
+    def test_appends_json_lines(self):
+        message = EmailOutbox(to_email="a@example.com", subject="S", body_text="B")
+        with FileTransport() as transport:
+            transport.send(message)
+            transport.send(message)
+        self.assertEqual([line["to"] for line in self.sent_lines()], ["a@example.com"] * 2)
+
+
+@skipUnlessDBFeature("has_select_for_update_skip_locked")
+class SkipLockedTests(TransactionTestCase):
+    """Two workers claiming at once (PostgreSQL)."""
+
+    available_apps = ["email_outbox_app"]
+
+    def test_locked_rows_are_skipped(self):
+        services.queue_emails([(f"u{i}@example.com", "S", "B") for i in range(4)])
+        locked_id = EmailOutbox.objects.order_by("id").values_list("id", flat=True)[0]
+        locked, release = threading.Event(), threading.Event()
+
+        def other_worker():
+            try:
+                with transaction.atomic():
+                    EmailOutbox.objects.select_for_update().get(id=locked_id)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=other_worker)
+        thread.start()
+        try:
+            self.assertTrue(locked.wait(10))
+            claimed = {m.id for m in services.claim_batch()}
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(len(claimed), 3)
+        self.assertNotIn(locked_id, claimed)
@@ -0,0 +1,99 @@
+# email_outbox_app/transports.py
+"""
+Pluggable delivery for the email outbox.
+
+A transport is opened once per worker batch, so the underlying client is
+reused for every message in it. Pick one with EMAIL_OUTBOX_TRANSPORT
+(dotted path); by default SendGrid is used when SENDGRID_API_KEY is set and
+the console transport otherwise.
+"""
+import json
+import logging
+import os
+from datetime import datetime
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class BaseTransport:
+    """open() → send() for each message → close(). send() raises on failure."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, message):
+        raise NotImplementedError
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SendGridTransport(BaseTransport):
+    def open(self):
+        from sendgrid import SendGridAPIClient
+
+        self.client = SendGridAPIClient(settings.SENDGRID_API_KEY)
+
+    def send(self, message):
+        from sendgrid.helpers.mail import Mail
+
+        mail = Mail(
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to_emails=message.to_email,
+            subject=message.subject,
+            plain_text_content=message.body_text,
+        )
+        response = self.client.send(mail)
+
+        # SendGrid returns 202 for accepted
+        if response.status_code not in (200, 202):
+            raise RuntimeError(f"SendGrid returned {response.status_code}")
+
+
+class ConsoleTransport(BaseTransport):
+    """Logs messages instead of sending them (local development)."""
+
+    def send(self, message):
+        logger.info(
+            f"[email outbox] To: {message.to_email} | Subject: {message.subject}\n{message.body_text}"
+        )
+
+
+class FileTransport(BaseTransport):
+    """Appends each message as one JSON line to EMAIL_OUTBOX_FILE_PATH (tests)."""
+
+    def open(self):
+        path = getattr(settings, "EMAIL_OUTBOX_FILE_PATH", "sent_emails.jsonl")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.stream = open(path, "a", encoding="utf-8")
+
+    def close(self):
+        self.stream.close()
+
+    def send(self, message):
+        self.stream.write(json.dumps({
+            "to": message.to_email,
+            "subject": message.subject,
+            "body": message.body_text,
+            "sent_at": datetime.now().isoformat(),
+        }) + "\n")
+        self.stream.flush()
+
+
+def get_transport():
+    path = getattr(settings, "EMAIL_OUTBOX_TRANSPORT", None)
+    if path:
+        return import_string(path)()
+    if settings.SENDGRID_API_KEY:
+        return SendGridTransport()
+    return ConsoleTransport()
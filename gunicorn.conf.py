@@ -0,0 +1,7 @@
+# gunicorn.conf.py
+# Read by gunicorn from the working directory. The same variables size the
+# database connections in settings.py (one per thread, see DB_POOL_MODE).
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
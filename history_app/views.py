@@ -217,7 +217,7 @@ def cancel_visit(request):
         visit_date = visit.visit_date or "N/A"
         department = visit.department or "N/A"
 
-        # ---------- DELETE VISIT ----------
+        # ---------- DELETE VISIT (its department slot is freed by capacity.visit_deleted) ----------
         visit.delete()
 
         # ---------- LOG THE CANCELLATION ----------
@@ -4,3 +4,23 @@ from django.apps import AppConfig
 class LoginAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'login_app'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from register_app.models import User
+        from . import principals
+        from .models import Administrator, FrontDeskStaff
+
+        # A new/renamed account must not stay hidden behind a cached login
+        # miss, and a changed/deleted one must not live on in the session cache
+        for model in (User, Administrator, FrontDeskStaff):
+            post_save.connect(
+                principals.account_saved,
+                sender=model,
+                dispatch_uid=f"login_principal_{model.__name__}_saved",
+            )
+            post_delete.connect(
+                principals.account_saved,
+                sender=model,
+                dispatch_uid=f"login_principal_{model.__name__}_deleted",
+            )
@@ -0,0 +1,30 @@
+# login_app/decorators.py
+"""
+Access checks for the session roles. They read request.principals (set by
+PrincipalMiddleware), so a deactivated or deleted account loses access on
+its next request instead of at logout.
+"""
+from functools import wraps
+
+from django.contrib import messages
+from django.shortcuts import redirect
+
+
+def role_required(role, message, level=messages.WARNING, superadmin=False):
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            principal = getattr(request, "principals", {}).get(role)
+            if principal and principal.is_active and (principal.is_superadmin or not superadmin):
+                return view_func(request, *args, **kwargs)
+            messages.add_message(request, level, message)
+            return redirect("login_app:login")
+        return wrapper
+    return decorator
+
+
+staff_required = role_required("staff", "Please log in as staff to access this page.")
+admin_required = role_required("admin", "You must be an admin to access this page.", level=messages.ERROR)
+superadmin_required = role_required(
+    "admin", "You must be a superadmin to access this page.", level=messages.ERROR, superadmin=True,
+)
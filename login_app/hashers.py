@@ -0,0 +1,73 @@
+# login_app/hashers.py
+"""
+Password hashing policy for User, Administrator and FrontDeskStaff.
+
+settings.PASSWORD_HASHERS is built from PASSWORD_HASH_ALGORITHM and
+PASSWORD_HASH_COST (see settings.py). The first hasher in the list hashes
+new passwords; all of them can still verify old hashes. verify_password()
+rewrites a stored hash that was made with another algorithm or cost on the
+next successful login, so changing the policy needs no data migration.
+
+Pick a cost with `python manage.py benchmark_password_hashing`.
+"""
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+class TunableCostMixin:
+    """
+    The hasher's work parameter comes from the constructor or, for the
+    hasher selected by PASSWORD_HASH_ALGORITHM, from PASSWORD_HASH_COST.
+    """
+    policy_name = None
+    cost_attribute = None
+
+    def __init__(self, cost=None):
+        if cost is None and getattr(settings, "PASSWORD_HASH_ALGORITHM", None) == self.policy_name:
+            cost = getattr(settings, "PASSWORD_HASH_COST", None)
+        if cost:
+            setattr(self, self.cost_attribute, int(cost))
+
+    @property
+    def cost(self):
+        return getattr(self, self.cost_attribute)
+
+
+class TunablePBKDF2PasswordHasher(TunableCostMixin, hashers.PBKDF2PasswordHasher):
+    """PBKDF2-SHA256; cost = iterations."""
+    policy_name = "pbkdf2"
+    cost_attribute = "iterations"
+
+
+class TunableScryptPasswordHasher(TunableCostMixin, hashers.ScryptPasswordHasher):
+    """scrypt; cost = work factor N (a power of two)."""
+    policy_name = "scrypt"
+    cost_attribute = "work_factor"
+
+
+class TunableArgon2PasswordHasher(TunableCostMixin, hashers.Argon2PasswordHasher):
+    """Argon2id (needs argon2-cffi); cost = time cost."""
+    policy_name = "argon2"
+    cost_attribute = "time_cost"
+
+
+class TunableBCryptSHA256PasswordHasher(TunableCostMixin, hashers.BCryptSHA256PasswordHasher):
+    """bcrypt (needs bcrypt); cost = log2 rounds."""
+    policy_name = "bcrypt"
+    cost_attribute = "rounds"
+
+
+def verify_password(raw_password, account, model=None):
+    """
+    check_password() for our own account tables. When the stored hash is
+    out of date with the policy, the new hash is written back with a single
+    UPDATE of the password column and set on `account`.
+    """
+    model = model or type(account)
+
+    def setter(raw_password):
+        encoded = hashers.make_password(raw_password)
+        model.objects.filter(pk=account.pk).update(password=encoded)
+        account.password = encoded
+
+    return hashers.check_password(raw_password, account.password, setter)
@@ -0,0 +1,103 @@
+# login_app/management/commands/benchmark_password_hashing.py
+"""
+Measure password hashing speed on this machine, to choose
+PASSWORD_HASH_ALGORITHM / PASSWORD_HASH_COST against a login latency budget.
+
+    python manage.py benchmark_password_hashing
+    python manage.py benchmark_password_hashing --cost 200000 --cost 400000
+    python manage.py benchmark_password_hashing --algorithm scrypt --cost 8192 --cost 16384
+
+Every login (and password change) runs one hash in a gunicorn worker, so
+"hashes/s per worker" is the login throughput of one worker with nothing
+else to do. Run it on the production dyno size, not a laptop.
+"""
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from login_app import hashers
+
+ALGORITHMS = {
+    "pbkdf2": hashers.TunablePBKDF2PasswordHasher,
+    "scrypt": hashers.TunableScryptPasswordHasher,
+    "argon2": hashers.TunableArgon2PasswordHasher,
+    "bcrypt": hashers.TunableBCryptSHA256PasswordHasher,
+}
+
+
+class Command(BaseCommand):
+    help = "Benchmark password hashes per second per worker for the configured (or given) costs."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--algorithm",
+            choices=sorted(ALGORITHMS),
+            help="Hasher to measure (default: PASSWORD_HASH_ALGORITHM).",
+        )
+        parser.add_argument(
+            "--cost",
+            type=int,
+            action="append",
+            help="Cost to measure; repeat for several (default: the configured cost).",
+        )
+        parser.add_argument("--seconds", type=float, default=2.0, help="Time spent per cost.")
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            default=250.0,
+            help="Hashing time allowed per login.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=int(os.getenv("WEB_CONCURRENCY", "1")),
+            help="Gunicorn workers sharing the CPU (default: WEB_CONCURRENCY or 1).",
+        )
+
+    def handle(self, *args, **options):
+        algorithm = options["algorithm"] or settings.PASSWORD_HASH_ALGORITHM
+        if algorithm not in ALGORITHMS:
+            raise CommandError(f"Unknown PASSWORD_HASH_ALGORITHM: {algorithm}")
+
+        hasher_class = ALGORITHMS[algorithm]
+        costs = options["cost"] or [None]
+        budget = options["budget_ms"]
+        workers = max(1, options["workers"])
+
+        preferred = import_string(settings.PASSWORD_HASHERS[0])
+        self.stdout.write(
+            f"Configured: {preferred.algorithm} (cost {preferred().cost}); "
+            f"budget {budget:.0f} ms per login, {workers} worker(s)."
+        )
+        self.stdout.write(f"{'algorithm':<16}{'cost':>10}{'ms/hash':>10}{'hashes/s/worker':>18}{'logins/s total':>16}")
+
+        for cost in costs:
+            try:
+                hasher = hasher_class(cost)
+                ms = self.measure(hasher, options["seconds"])
+            except (ValueError, TypeError) as e:
+                # e.g. argon2-cffi / bcrypt not installed, invalid scrypt work factor
+                self.stderr.write(f"{algorithm} cost {cost}: {e}")
+                continue
+
+            per_worker = 1000.0 / ms
+            line = (
+                f"{hasher.algorithm:<16}{hasher.cost:>10}{ms:>10.1f}"
+                f"{per_worker:>18.1f}{per_worker * min(workers, os.cpu_count() or 1):>16.1f}"
+            )
+            style = self.style.SUCCESS if ms <= budget else self.style.WARNING
+            self.stdout.write(style(line))
+
+    def measure(self, hasher, seconds):
+        """Average milliseconds per encode() over about `seconds` (at least 3 runs)."""
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            hasher.encode("benchmark-password", hasher.salt())
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if runs >= 3 and elapsed >= seconds:
+                return elapsed * 1000.0 / runs
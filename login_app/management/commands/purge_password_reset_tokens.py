@@ -0,0 +1,52 @@
+# login_app/management/commands/purge_password_reset_tokens.py
+"""
+Delete expired password reset tokens in small batches.
+
+Each batch picks up to --batch-size ids through the expires_at index and
+deletes them in its own short transaction, so the sweep never holds long
+locks on the table. Run it from a cron job (hourly is plenty); reset
+links already ignore expired rows, this only keeps the table small.
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from login_app.models import PasswordResetToken
+
+
+class Command(BaseCommand):
+    help = "Delete expired password reset tokens in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0.0,
+            help="Seconds to sleep between batches.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        cutoff = timezone.now()
+
+        deleted = 0
+        while True:
+            ids = list(
+                PasswordResetToken.objects.filter(expires_at__lte=cutoff)
+                .order_by("expires_at")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+
+            with transaction.atomic():
+                PasswordResetToken.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+
+            if len(ids) < batch_size:
+                break
+            if options["pause"]:
+                time.sleep(options["pause"])
+
+        self.stdout.write(self.style.SUCCESS(f"{deleted} expired password reset token(s) deleted."))
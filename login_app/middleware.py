@@ -0,0 +1,21 @@
+# login_app/middleware.py
+from . import principals
+
+
+class PrincipalMiddleware:
+    """
+    Resolves the logged-in accounts once per request (see principals.for_session):
+
+        request.principals  {role: Principal} for every role on the session
+        request.principal   the highest-priority one (admin, staff, visitor) or None
+
+    Anonymous requests cost nothing: no session role key, no lookup.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.principals = principals.for_session(request.session)
+        request.principal = next(iter(request.principals.values()), None)
+        return self.get_response(request)
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 05:45
+
+import datetime
+
+import login_app.models
+from django.db import migrations, models
+
+
+def expire_from_created_at(apps, schema_editor):
+    # Existing tokens keep their old lifetime: one hour from creation
+    PasswordResetToken = apps.get_model('login_app', 'PasswordResetToken')
+    PasswordResetToken.objects.update(expires_at=models.F('created_at') + datetime.timedelta(hours=1))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login_app', '0002_passwordresettoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passwordresettoken',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=login_app.models.reset_token_expiry),
+        ),
+        migrations.RunPython(expire_from_created_at, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.contrib.auth.hashers import make_password
 from django.utils import timezone
 
 from register_app.models import User
+from .hashers import verify_password
 import uuid
 
 
@@ -27,7 +31,8 @@ class Administrator(models.Model):
         self.password = make_password(raw_password)
 
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        # Upgrades the stored hash when the hashing policy changed
+        return verify_password(raw_password, self)
 
 
 class FrontDeskStaff(models.Model):
@@ -50,13 +55,35 @@ class FrontDeskStaff(models.Model):
         self.password = make_password(raw_password)
 
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        # Upgrades the stored hash when the hashing policy changed
+        return verify_password(raw_password, self)
+
+
+def reset_token_expiry():
+    return timezone.now() + timedelta(minutes=getattr(settings, "PASSWORD_RESET_TOKEN_MINUTES", 60))
+
+
+class PasswordResetTokenManager(models.Manager):
+    def valid(self):
+        """Unexpired tokens (filtered in the query, on the expires_at index)."""
+        return self.filter(expires_at__gt=timezone.now())
+
+    def issue(self, user):
+        """
+        A fresh token for `user`. Older tokens of the user are deleted, so at
+        most one link per visitor works and the table can't grow per request.
+        """
+        with transaction.atomic():
+            self.filter(user=user).delete()
+            return self.create(user=user)
 
 
 class PasswordResetToken(models.Model):
     """
     Password reset tokens for VISITOR users (register_app.User).
     Admin/staff you already handle with temp passwords.
+
+    Expired tokens are deleted by `python manage.py purge_password_reset_tokens`.
     """
     user = models.ForeignKey(
         User,
@@ -69,10 +96,13 @@ class PasswordResetToken(models.Model):
         default=uuid.uuid4
     )
     created_at = models.DateTimeField(default=timezone.now)
+    # Token valid for PASSWORD_RESET_TOKEN_MINUTES (1 hour by default)
+    expires_at = models.DateTimeField(default=reset_token_expiry, db_index=True)
+
+    objects = PasswordResetTokenManager()
 
     def is_expired(self):
-        # Token valid for 1 hour (adjust if needed)
-        return self.created_at < timezone.now() - timezone.timedelta(hours=1)
+        return self.expires_at <= timezone.now()
 
     def __str__(self):
         return f"Password reset token for {self.user.email}"
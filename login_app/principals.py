@@ -0,0 +1,210 @@
+# login_app/principals.py
+"""
+Resolve a login identifier to an account in one round trip.
+
+Visitors (register_app.User, by email), administrators and front desk staff
+(by username) live in three tables. Instead of trying them one after the
+other, resolve() sends a single UNION query that returns the role, password
+hash and account flags of every match; the highest-priority role wins
+(admin before staff, as the old cascade did).
+
+Identifiers that match nothing are remembered for a few seconds, so a burst
+of failed or mistyped logins doesn't reach the database again.
+
+Logged-in requests use for_session(): the account behind each role key in
+the session (admin_username, staff_username, user_email) is cached for
+PRINCIPAL_CACHE_TTL seconds without its password hash. PrincipalMiddleware
+(login_app/middleware.py) attaches it to the request, so views and the
+*_required decorators don't look the account up again.
+
+Saving or deleting an account forgets both cache entries for it (see
+login_app/apps.py). The signal only reaches the cache of the worker that
+made the change, so both caches are used only when the default cache is
+shared by all workers (CACHE_URL). With the per-process local-memory
+cache every lookup goes to the database: otherwise another worker could
+keep a deactivated account logged in, or a just-registered one hidden,
+until its entry expires.
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import BooleanField, CharField, Value
+
+from register_app.models import User, normalize_email
+
+from .hashers import verify_password
+from .models import Administrator, FrontDeskStaff
+
+logger = logging.getLogger(__name__)
+
+NEGATIVE_CACHE_TTL = getattr(settings, "LOGIN_NEGATIVE_CACHE_TTL", 10)  # seconds
+PRINCIPAL_CACHE_TTL = getattr(settings, "PRINCIPAL_CACHE_TTL", 60)  # seconds
+
+# role -> (model, session key, session first-name key, landing page)
+ROLES = {
+    'admin': (Administrator, 'admin_username', 'admin_first_name', 'dashboard_app:admin_dashboard'),
+    'staff': (FrontDeskStaff, 'staff_username', 'staff_first_name', 'dashboard_app:staff_dashboard'),
+    'visitor': (User, 'user_email', 'user_first_name', 'dashboard_app:dashboard'),
+}
+ROLE_PRIORITY = ('admin', 'staff', 'visitor')
+
+
+class Principal:
+    """The account an identifier resolved to (no model instance needed)."""
+
+    def __init__(self, role, pk, first_name, last_name, password,
+                 is_active=True, is_temp_password=False, is_superadmin=False, identifier=None):
+        self.role = role
+        self.pk = pk
+        self.first_name = first_name
+        self.last_name = last_name
+        self.password = password
+        self.is_active = is_active
+        self.is_temp_password = is_temp_password
+        self.is_superadmin = is_superadmin
+        # As stored: the visitor's email (original case) or the username
+        self.identifier = identifier
+
+    @property
+    def model(self):
+        return ROLES[self.role][0]
+
+    @property
+    def session_key(self):
+        return ROLES[self.role][1]
+
+    @property
+    def session_name(self):
+        return ROLES[self.role][2]
+
+    @property
+    def redirect_url(self):
+        return ROLES[self.role][3]
+
+    def check_password(self, raw_password):
+        # Upgrades the stored hash when the hashing policy changed
+        return verify_password(raw_password, self, model=self.model)
+
+
+def cache_is_shared():
+    """Whether cache entries (and their invalidation) are seen by every worker."""
+    return not isinstance(caches["default"], LocMemCache)
+
+
+def _miss_key(identifier):
+    return "login_principal_miss:" + hashlib.md5(identifier.encode()).hexdigest()
+
+
+def _principal_key(role, identifier):
+    return f"principal:{role}:" + hashlib.md5(identifier.encode()).hexdigest()
+
+
+def forget_miss(identifier):
+    """Drop the negative-cache entry for an identifier (account created/renamed)."""
+    if identifier and cache_is_shared():
+        cache.delete(_miss_key(identifier.strip().lower()))
+
+
+def forget_principal(role, identifier):
+    """Drop the cached session principal for an account (saved/deleted)."""
+    if identifier and cache_is_shared():
+        cache.delete(_principal_key(role, identifier.strip().lower()))
+
+
+def account_saved(sender, instance, **kwargs):
+    identifier = getattr(instance, 'username', None) or getattr(instance, 'email', None)
+    forget_miss(identifier)
+    for role, (model, *_) in ROLES.items():
+        if model is sender:
+            forget_principal(role, identifier)
+
+
+def _role_query(role, identifier):
+    """
+    The account row(s) of one role. Every role selects:
+
+        (role, pk, first_name, last_name, password, is_active, is_temp_password, is_superadmin,
+         identifier)
+    """
+    true = Value(True, output_field=BooleanField())
+    false = Value(False, output_field=BooleanField())
+
+    if role == 'visitor':
+        return User.objects.filter(email_norm=normalize_email(identifier)).values_list(
+            Value('visitor', output_field=CharField()), 'user_id', 'first_name', 'last_name',
+            'password', true, false, false, 'email',
+        )
+    if role == 'admin':
+        return Administrator.objects.filter(username=identifier).values_list(
+            Value('admin', output_field=CharField()), 'admin_id', 'first_name', 'last_name',
+            'password', 'is_active', 'is_temp_password', 'is_superadmin', 'username',
+        )
+    return FrontDeskStaff.objects.filter(username=identifier).values_list(
+        Value('staff', output_field=CharField()), 'staff_id', 'first_name', 'last_name',
+        'password', 'is_active', 'is_temp_password', false, 'username',
+    )
+
+
+def _principal_query(identifier):
+    """
+    UNION of the account tables. Emails only ever identify visitors and
+    usernames only staff/admins, so the branch that can't match is left out.
+    """
+    if '@' in identifier:
+        return _role_query('visitor', identifier)
+    return _role_query('admin', identifier).union(_role_query('staff', identifier), all=True)
+
+
+def resolve(identifier):
+    """
+    The Principal for a login identifier (email or username, already
+    stripped/lowercased), or None when no account matches.
+    """
+    if not identifier:
+        return None
+
+    shared = cache_is_shared()
+    miss_key = _miss_key(identifier)
+    if shared and cache.get(miss_key):
+        return None
+
+    rows = list(_principal_query(identifier))
+    if not rows:
+        if shared:
+            cache.set(miss_key, True, NEGATIVE_CACHE_TTL)
+        return None
+
+    rows.sort(key=lambda row: ROLE_PRIORITY.index(row[0]))
+    return Principal(*rows[0])
+
+
+def for_session(session):
+    """
+    {role: Principal} for every role logged in on this session, highest
+    priority first. Principals come from the cache when possible and never
+    carry the password hash (cached only when the cache is shared).
+    """
+    found = {}
+    shared = cache_is_shared()
+    for role in ROLE_PRIORITY:
+        identifier = session.get(ROLES[role][1])
+        if not identifier:
+            continue
+
+        identifier = identifier.strip().lower()
+        key = _principal_key(role, identifier)
+        row = cache.get(key) if shared else None
+        if row is None:
+            row = next(iter(_role_query(role, identifier)[:1]), False)
+            if row:
+                row = row[:4] + (None,) + row[5:]  # no hash in the cache
+            if shared:
+                cache.set(key, row, PRINCIPAL_CACHE_TTL)
+
+        # False: the account is gone (deleted since the login)
+        if row:
+            found[role] = Principal(*row)
+    return found
@@ -1,3 +1,386 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher, identify_hasher, make_password
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from register_app.models import User
+
+from . import principals, throttling
+from .decorators import staff_required, superadmin_required
+from .hashers import TunablePBKDF2PasswordHasher
+from .models import Administrator, FrontDeskStaff, PasswordResetToken
+
+
+class LoginSessionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.visitor = User(
+            first_name="Vic", last_name="Visitor", email="Vic.Visitor@Example.com",
+            phone="09171234567", visitor_type="Guest",
+        )
+        self.visitor.set_password("s3cret-pass")
+        self.visitor.save()
+
+    def test_session_holds_the_stored_email(self):
+        response = self.client.post(reverse("login_app:login"), {
+            "identifier": "  VIC.visitor@example.COM ", "password": "s3cret-pass",
+        })
+        self.assertRedirects(response, reverse("dashboard_app:dashboard"), fetch_redirect_response=False)
+        self.assertEqual(self.client.session["user_email"], "Vic.Visitor@Example.com")
+
+    def test_wrong_password_logs_nobody_in(self):
+        self.client.post(reverse("login_app:login"), {
+            "identifier": "vic.visitor@example.com", "password": "nope",
+        })
+        self.assertNotIn("user_email", self.client.session)
+
+
+class PasswordRehashTests(TestCase):
+    """verify_password() upgrades hashes made under an older policy on login."""
+
+    def setUp(self):
+        cache.clear()
+        self.old_hash = TunablePBKDF2PasswordHasher(cost=1000).encode("s3cret-pass", "oldsalt")
+        self.visitor = User.objects.create(
+            first_name="Vic", last_name="Visitor", email="vic@example.com",
+            phone="09171234567", password=self.old_hash, visitor_type="Guest",
+        )
+
+    def log_in(self, identifier, password):
+        return self.client.post(reverse("login_app:login"), {"identifier": identifier, "password": password})
+
+    def test_outdated_cost_is_rehashed(self):
+        self.log_in("vic@example.com", "s3cret-pass")
+        self.assertEqual(self.client.session["user_email"], "vic@example.com")
+
+        self.visitor.refresh_from_db()
+        self.assertNotEqual(self.visitor.password, self.old_hash)
+        hasher = identify_hasher(self.visitor.password)
+        self.assertEqual(hasher.decode(self.visitor.password)["iterations"], TunablePBKDF2PasswordHasher().iterations)
+        self.assertTrue(hasher.verify("s3cret-pass", self.visitor.password))
+
+    def test_outdated_algorithm_is_rehashed(self):
+        staff = FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password=make_password("s3cret-pass", hasher=PBKDF2SHA1PasswordHasher()),
+            contact_number="09170000001",
+        )
+        self.log_in("sam", "s3cret-pass")
+
+        staff.refresh_from_db()
+        self.assertEqual(identify_hasher(staff.password).algorithm, TunablePBKDF2PasswordHasher.algorithm)
+
+    def test_wrong_password_leaves_the_hash_alone(self):
+        self.log_in("vic@example.com", "wrong-pass")
+        self.assertNotIn("user_email", self.client.session)
+
+        self.visitor.refresh_from_db()
+        self.assertEqual(self.visitor.password, self.old_hash)
+
+
+class ResolveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create(
+            first_name="Vic", last_name="Visitor", email="Vic.Visitor@Example.com",
+            phone="09171234567", password="x", visitor_type="Guest",
+        )
+        Administrator.objects.create(
+            first_name="Ada", last_name="Admin", username="sam", email="ada@cit.edu",
+            password="x", contact_number="09170000002",
+        )
+        FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_visitor_by_email(self):
+        principal = principals.resolve("vic.visitor@example.com")
+        self.assertEqual((principal.role, principal.identifier), ("visitor", "Vic.Visitor@Example.com"))
+
+    def test_admin_wins_over_staff_with_the_same_username(self):
+        self.assertEqual(principals.resolve("sam").role, "admin")
+
+    def test_no_account(self):
+        self.assertIsNone(principals.resolve("nobody@example.com"))
+        self.assertIsNone(principals.resolve(""))
+
+    def test_local_memory_cache_remembers_no_misses(self):
+        self.assertFalse(principals.cache_is_shared())
+        principals.resolve("nobody@example.com")
+        with self.assertNumQueries(1):
+            self.assertIsNone(principals.resolve("nobody@example.com"))
+
+
+@mock.patch.object(principals, "cache_is_shared", return_value=True)
+class SharedCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_miss_is_remembered(self, _shared):
+        principals.resolve("nobody@example.com")
+        with self.assertNumQueries(0):
+            self.assertIsNone(principals.resolve("nobody@example.com"))
+
+    def test_new_account_clears_the_miss(self, _shared):
+        self.assertIsNone(principals.resolve("new@example.com"))
+        User.objects.create(
+            first_name="New", last_name="Visitor", email="New@Example.com",
+            phone="09171234568", password="x", visitor_type="Guest",
+        )
+        self.assertEqual(principals.resolve("new@example.com").role, "visitor")
+
+    def test_saved_account_clears_the_session_principal(self, _shared):
+        staff = FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+        session = {"staff_username": "sam"}
+        self.assertTrue(principals.for_session(session)["staff"].is_active)
+        with self.assertNumQueries(0):
+            principals.for_session(session)
+
+        staff.is_active = False
+        staff.save()
+        self.assertFalse(principals.for_session(session)["staff"].is_active)
+
+
+class PrincipalMiddlewareTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+
+    def setUp(self):
+        cache.clear()
+        session = self.client.session
+        session["staff_username"] = "sam"
+        session["staff_first_name"] = "Sam"
+        session.save()
+
+    def test_request_carries_the_session_principal(self):
+        response = self.client.get(reverse("dashboard_app:staff_dashboard"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.wsgi_request.principal.role, "staff")
+        self.assertEqual(list(response.wsgi_request.principals), ["staff"])
+
+    def test_deactivation_outside_this_worker_applies_on_the_next_request(self):
+        self.client.get(reverse("dashboard_app:staff_dashboard"))
+        # update() sends no post_save, like a change made by another worker
+        FrontDeskStaff.objects.filter(username="sam").update(is_active=False)
+
+        response = self.client.get(reverse("dashboard_app:staff_dashboard"))
+        self.assertRedirects(response, reverse("login_app:login"), fetch_redirect_response=False)
+
+
+class RoleRequiredTests(TestCase):
+
+    def request_as(self, **principals_by_role):
+        request = RequestFactory().get("/")
+        request.session = SessionStore()
+        request._messages = FallbackStorage(request)
+        request.principals = principals_by_role
+        return request
+
+    def principal(self, role, **kwargs):
+        return principals.Principal(role, 1, "Sam", "Staff", None, **kwargs)
+
+    def view(self, decorator):
+        return decorator(lambda request: HttpResponse("ok"))
+
+    def test_role_present(self):
+        response = self.view(staff_required)(self.request_as(staff=self.principal("staff")))
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_missing_or_inactive(self):
+        for request in (
+            self.request_as(),
+            self.request_as(visitor=self.principal("visitor")),
+            self.request_as(staff=self.principal("staff", is_active=False)),
+        ):
+            response = self.view(staff_required)(request)
+            self.assertEqual(response.url, reverse("login_app:login"))
+
+    def test_superadmin_only(self):
+        view = self.view(superadmin_required)
+        admin = self.request_as(admin=self.principal("admin"))
+        superadmin = self.request_as(admin=self.principal("admin", is_superadmin=True))
+
+        self.assertEqual(view(admin).url, reverse("login_app:login"))
+        self.assertEqual([str(m) for m in admin._messages], ["You must be a superadmin to access this page."])
+        self.assertEqual(view(superadmin).status_code, 200)
+
+
+@override_settings(THROTTLE_RATES={"login:ip": "2/m"})
+class TokenBucketTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate("30/10m"), (30, 30 / 600))
+        self.assertEqual(throttling.parse_rate("3/h"), (3, 3 / 3600))
+
+    def test_empty_bucket_refills_over_the_period(self):
+        self.assertEqual(throttling.take_token("login:ip", "1.2.3.4", now=1000), 0)
+        self.assertEqual(throttling.take_token("login:ip", "1.2.3.4", now=1000), 0)
+        self.assertEqual(throttling.take_token("login:ip", "1.2.3.4", now=1000), 30)
+        self.assertEqual(throttling.take_token("login:ip", "5.6.7.8", now=1000), 0)
+
+        self.assertEqual(throttling.take_token("login:ip", "1.2.3.4", now=1030), 0)
+        self.assertEqual(throttling.take_token("login:ip", "1.2.3.4", now=1030), 30)
+
+    def test_unconfigured_scope_is_not_limited(self):
+        for _ in range(5):
+            self.assertEqual(throttling.take_token("other:ip", "1.2.3.4", now=1000), 0)
+
+
+@override_settings(THROTTLE_RATES={
+    "login:ip": "2/m",
+    "forgot_password:identifier": "1/h",
+    "check_code:identifier": "1/m",
+})
+class ThrottledEndpointTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        clock = mock.patch.object(throttling, "time")
+        self.clock = clock.start().time
+        self.addCleanup(clock.stop)
+        self.clock.return_value = 1000.0
+
+    def assertThrottled(self, response, retry_after):
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], str(retry_after))
+
+    def test_login(self):
+        url = reverse("login_app:login")
+        for _ in range(2):
+            self.assertNotEqual(self.client.post(url, {"identifier": "a@example.com", "password": "x"}).status_code, 429)
+        self.assertThrottled(self.client.post(url, {"identifier": "b@example.com", "password": "x"}), 30)
+        self.assertNotEqual(self.client.get(url).status_code, 429)
+
+        self.clock.return_value += 30
+        self.assertNotEqual(self.client.post(url, {"identifier": "b@example.com", "password": "x"}).status_code, 429)
+        self.assertEqual(throttling.throttled_counts()["login"], 1)
+
+    def test_forgot_password_per_email(self):
+        url = reverse("login_app:forgot_password")
+        self.assertNotEqual(self.client.post(url, {"email": "ana@example.com"}).status_code, 429)
+        self.assertThrottled(self.client.post(url, {"email": " ANA@example.com"}), 3600)
+        self.assertNotEqual(self.client.post(url, {"email": "ben@example.com"}).status_code, 429)
+
+    def test_check_code_per_staff_member(self):
+        FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+        session = self.client.session
+        session["staff_username"] = "sam"
+        session["staff_first_name"] = "Sam"
+        session.save()
+
+        url = reverse("dashboard_app:check_code")
+        self.assertNotEqual(self.client.post(url, {"visit_code": "CIT-NONE1"}).status_code, 429)
+        self.assertThrottled(self.client.post(url, {"visit_code": "CIT-NONE2"}), 60)
+
+        self.clock.return_value += 60
+        self.assertNotEqual(self.client.post(url, {"visit_code": "CIT-NONE3"}).status_code, 429)
+
+
+class PasswordResetTokenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.visitor = User.objects.create(
+            first_name="Vic", last_name="Visitor", email="vic@example.com",
+            phone="09171234567", password="x", visitor_type="Guest",
+        )
+
+    def expired(self, user=None, **ago):
+        return PasswordResetToken.objects.create(
+            user=user or self.visitor, expires_at=timezone.now() - timedelta(**ago or {"minutes": 1}),
+        )
+
+    def test_valid_leaves_out_expired_tokens(self):
+        expired = self.expired()
+        fresh = PasswordResetToken.objects.create(user=self.visitor)
+        self.assertTrue(expired.is_expired())
+        self.assertEqual(list(PasswordResetToken.objects.valid()), [fresh])
+
+    def test_issue_replaces_the_users_older_tokens(self):
+        other = User.objects.create(
+            first_name="Ola", last_name="Other", email="ola@example.com",
+            phone="09177654321", password="x", visitor_type="Guest",
+        )
+        others = PasswordResetToken.objects.create(user=other)
+        first = PasswordResetToken.objects.issue(self.visitor)
+        second = PasswordResetToken.objects.issue(self.visitor)
+
+        self.assertNotEqual(first.token, second.token)
+        self.assertEqual(
+            set(PasswordResetToken.objects.values_list("pk", flat=True)), {others.pk, second.pk}
+        )
+        self.assertGreater(second.expires_at, timezone.now())
+
+    def test_expired_link_is_refused(self):
+        token = self.expired().token
+        url = reverse("login_app:reset_password", args=[token])
+        for response in (
+            self.client.get(url),
+            self.client.post(url, {"password": "N3w-pass!", "confirm_password": "N3w-pass!"}),
+        ):
+            self.assertRedirects(response, reverse("login_app:forgot_password"), fetch_redirect_response=False)
+
+        self.visitor.refresh_from_db()
+        self.assertEqual(self.visitor.password, "x")
+
+    def test_used_link_cannot_be_reused(self):
+        token = PasswordResetToken.objects.issue(self.visitor).token
+        url = reverse("login_app:reset_password", args=[token])
+        response = self.client.post(url, {"password": "N3w-pass!", "confirm_password": "N3w-pass!"})
+        self.assertRedirects(response, reverse("login_app:login"), fetch_redirect_response=False)
+
+        response = self.client.get(url)
+        self.assertRedirects(response, reverse("login_app:forgot_password"), fetch_redirect_response=False)
+
+    def test_purge_deletes_expired_tokens_in_batches(self):
+        users = [
+            User.objects.create(
+                first_name=f"U{i}", last_name="User", email=f"u{i}@example.com",
+                phone=f"0917000000{i}", password="x", visitor_type="Guest",
+            )
+            for i in range(5)
+        ]
+        for i, user in enumerate(users):
+            self.expired(user, hours=i + 1)
+        fresh = PasswordResetToken.objects.create(user=self.visitor)
+
+        out = StringIO()
+        with CaptureQueriesContext(connection) as queries:
+            call_command("purge_password_reset_tokens", "--batch-size", "2", stdout=out)
+
+        self.assertIn("5 expired password reset token(s) deleted.", out.getvalue())
+        self.assertEqual(list(PasswordResetToken.objects.all()), [fresh])
+        deletes = [q["sql"] for q in queries if q["sql"].startswith("DELETE")]
+        self.assertEqual(len(deletes), 3)  # batches of 2, 2 and 1
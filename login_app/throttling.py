@@ -0,0 +1,148 @@
+# login_app/throttling.py
+"""
+Token-bucket throttling for the endpoints that are expensive to hammer:
+login and forgot-password (a password hash / reset email per request) and
+the staff code checker (a visit lookup per request).
+
+Each request takes one token from a bucket per key (client IP and, when
+given, the identifier being tried). A bucket holds up to N tokens and
+refills at N per period, as configured in settings.THROTTLE_RATES:
+
+    THROTTLE_RATES = {"login:ip": "30/10m", "login:identifier": "10/10m", ...}
+
+Buckets live in the Django cache, so they are shared by all gunicorn
+workers when CACHE_URL points to a shared cache (redis, file). If that
+cache fails, a per-process local-memory cache takes over. Concurrent
+requests may read the same bucket state, so a burst can overshoot by a
+token or two; that is fine for abuse protection.
+
+Throttled requests get a 429 with Retry-After and are counted per scope;
+the counters are served by login_app.views.throttle_stats_view.
+"""
+import hashlib
+import logging
+import math
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.shortcuts import render
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+_local_cache = LocMemCache("throttle-fallback", {"OPTIONS": {"MAX_ENTRIES": 10000}})
+
+
+def parse_rate(rate):
+    """"30/10m" -> (capacity 30, refill 30 tokens per 600 s)."""
+    count, _, period = rate.partition("/")
+    period = period.strip() or "m"
+    multiplier = int(period[:-1] or 1)
+    return int(count), int(count) / (multiplier * PERIODS[period[-1]])
+
+
+def client_ip(request):
+    """
+    The client address. Behind Render's proxy the real client is the last
+    X-Forwarded-For hop (earlier hops are whatever the client sent).
+    """
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    if forwarded:
+        return forwarded.split(",")[-1].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def _cache_call(method, *args, **kwargs):
+    """Run a cache operation on the shared cache, falling back to local memory."""
+    try:
+        return getattr(caches[getattr(settings, "THROTTLE_CACHE", "default")], method)(*args, **kwargs)
+    except Exception as e:
+        logger.warning(f"Throttle cache unavailable, using local memory: {e}")
+        return getattr(_local_cache, method)(*args, **kwargs)
+
+
+def take_token(scope, key, now=None):
+    """
+    Take one token from the `scope` bucket of `key`. Returns 0 when allowed,
+    otherwise the seconds until a token is available. Scopes without a
+    configured rate are not limited.
+    """
+    rate = getattr(settings, "THROTTLE_RATES", {}).get(scope)
+    if not rate or not key:
+        return 0
+
+    capacity, refill = parse_rate(rate)
+    now = time.time() if now is None else now
+    cache_key = f"throttle:{scope}:" + hashlib.md5(str(key).encode()).hexdigest()
+
+    tokens, updated = _cache_call("get", cache_key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * refill)
+
+    retry_after = 0
+    if tokens >= 1:
+        tokens -= 1
+    else:
+        retry_after = math.ceil((1 - tokens) / refill)
+
+    # Expire once the bucket would be full again anyway
+    _cache_call("set", cache_key, (tokens, now), math.ceil(capacity / refill) + 1)
+    return retry_after
+
+
+def count_throttled(scope):
+    key = f"throttle:count:{scope}"
+    if not _cache_call("add", key, 1, None):
+        try:
+            _cache_call("incr", key)
+        except ValueError:
+            _cache_call("set", key, 1, None)
+
+
+def throttled_counts():
+    """{scope: requests throttled} for every configured scope."""
+    scopes = sorted({name.split(":")[0] for name in getattr(settings, "THROTTLE_RATES", {})})
+    return {scope: _cache_call("get", f"throttle:count:{scope}") or 0 for scope in scopes}
+
+
+def throttle(scope, identifier=None, template=None, context=None, methods=("POST",)):
+    """
+    View decorator. Takes a token from the `<scope>:ip` bucket and, when
+    `identifier(request)` returns something, from `<scope>:identifier`.
+    When either is empty the view is skipped and `template` is rendered
+    with status 429 and a Retry-After header.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return view_func(request, *args, **kwargs)
+
+            now = time.time()
+            retry_after = take_token(f"{scope}:ip", client_ip(request), now)
+            ident = identifier(request) if identifier else None
+            if ident:
+                retry_after = max(retry_after, take_token(f"{scope}:identifier", ident.lower(), now))
+
+            if not retry_after:
+                return view_func(request, *args, **kwargs)
+
+            count_throttled(scope)
+            logger.warning(f"Throttled {scope} from {client_ip(request)} (retry in {retry_after}s)")
+
+            wait = f"{retry_after} seconds" if retry_after < 120 else f"{math.ceil(retry_after / 60)} minutes"
+            messages.error(request, f"Too many attempts. Please try again in {wait}.")
+            response = render(
+                request,
+                template,
+                context(request) if context else {},
+                status=429,
+            )
+            response["Retry-After"] = str(retry_after)
+            return response
+        return wrapper
+    return decorator
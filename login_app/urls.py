@@ -9,4 +9,5 @@ urlpatterns = [
     path('change-temp-password/', views.change_temp_password_view, name='change_temp_password'),
     path("forgot-password/", views.forgot_password_view, name="forgot_password"),
     path("reset-password/<str:token>/", views.reset_password_view, name="reset_password"),
+    path("throttle-stats/", views.throttle_stats_view, name="throttle_stats"),
 ]
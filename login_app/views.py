@@ -1,17 +1,19 @@
 # login_app/views.py
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
+from django.http import JsonResponse
 from django.contrib import messages
-from django.contrib.auth.hashers import check_password
 from django.contrib.messages import get_messages
 from django.urls import reverse
 from django.core.mail import send_mail
 from django.conf import settings
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from django.db import transaction
 
 
+from . import principals
+from .throttling import throttle, throttled_counts
 from .models import Administrator, FrontDeskStaff, PasswordResetToken
-from register_app.models import User  # Visitor User model
+from register_app.models import User, normalize_email  # Visitor User model
+from email_outbox_app import services as outbox
 
 import re
 
@@ -38,6 +40,11 @@ def is_strong_password(password):
     return True
 
 
+@throttle(
+    "login",
+    identifier=lambda request: request.POST.get("identifier", "").strip(),
+    template="login_app/login.html",
+)
 def login_view(request):
     if request.method == 'POST':
         # Handle change password form
@@ -94,51 +101,17 @@ def login_view(request):
         identifier = request.POST.get('identifier', '').strip().lower()
         password = request.POST.get('password', '')
         valid = False
-        user_obj = None
-        role = None
 
-        # Auto-detect role based on identifier
-        if '@' in identifier:
-            # Assume visitor (email) - Use Django ORM
-            role = 'visitor'
-            try:
-                user_obj = User.objects.get(email=identifier)
-                session_key = 'user_email'
-                session_name = 'user_first_name'
-                redirect_url = 'dashboard_app:dashboard'
-            except User.DoesNotExist:
-                user_obj = None
-        else:
-            # Assume username, try admin first - Use Django ORM
-            try:
-                user_obj = Administrator.objects.get(username=identifier)
-                role = 'admin'
-                session_key = 'admin_username'
-                session_name = 'admin_first_name'
-                redirect_url = 'dashboard_app:admin_dashboard'
-            except Administrator.DoesNotExist:
-                # Try staff - Use Django ORM
-                try:
-                    user_obj = FrontDeskStaff.objects.get(username=identifier)
-                    role = 'staff'
-                    session_key = 'staff_username'
-                    session_name = 'staff_first_name'
-                    redirect_url = 'dashboard_app:staff_dashboard'
-                except FrontDeskStaff.DoesNotExist:
-                    user_obj = None
+        # One query over the visitor, admin and staff tables
+        user_obj = principals.resolve(identifier)
 
         # Check if user exists and validate password
         if user_obj:
-            # Password verification using model methods
-            if hasattr(user_obj, 'check_password'):
-                valid = user_obj.check_password(password)
-            else:
-                # Fallback for plain text passwords (if any)
-                stored_password = user_obj.password
-                if stored_password.startswith("pbkdf2_") or stored_password.startswith("argon2"):
-                    valid = check_password(password, stored_password)
-                else:
-                    valid = password == stored_password
+            role = user_obj.role
+            session_key = user_obj.session_key
+            session_name = user_obj.session_name
+            redirect_url = user_obj.redirect_url
+            valid = user_obj.check_password(password)
 
             if valid:
                 # Check if staff or admin account is active
@@ -146,8 +119,8 @@ def login_view(request):
                     messages.error(request, "Your account has been deactivated.")
                     return redirect('login_app:login')
 
-                # Store main session
-                request.session[session_key] = identifier
+                # Store main session (the account's own email/username, not what was typed)
+                request.session[session_key] = user_obj.identifier
                 request.session[session_name] = user_obj.first_name
 
                 # 🔹 Store last name per role
@@ -165,12 +138,12 @@ def login_view(request):
                 # Check for temporary password (force change)
                 if getattr(user_obj, "is_temp_password", False) and role in ['admin', 'staff']:
                     request.session["force_pw_role"] = role
-                    request.session["force_pw_user"] = identifier
+                    request.session["force_pw_user"] = user_obj.identifier
                     messages.warning(request, "Please change your temporary password.")
                     # Render login page with change password form instead of redirecting
                     return render(request, 'login_app/login.html', {
                         'show_change_password': True,
-                        'temp_username': identifier,
+                        'temp_username': user_obj.identifier,
                         'temp_role': role
                     })
 
@@ -231,10 +204,15 @@ def change_temp_password_view(request):
     return render(request, "login_app/change_temp_password.html")
 
 
+@throttle(
+    "forgot_password",
+    identifier=lambda request: request.POST.get("email", "").strip(),
+    template="login_app/forgot_password.html",
+)
 def forgot_password_view(request):
     """
     Forgot password for VISITOR users (email-based login).
-    Uses SendGrid Web API to send the reset link.
+    Queues the reset link in the email outbox.
     """
     if request.method == "POST":
         email = request.POST.get("email", "").strip().lower()
@@ -245,7 +223,7 @@ def forgot_password_view(request):
 
         # Try to find user – but don't reveal if it exists (security)
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.get(email_norm=normalize_email(email))
         except User.DoesNotExist:
             messages.success(
                 request,
@@ -253,48 +231,36 @@ def forgot_password_view(request):
             )
             return redirect("login_app:login")
 
-        # Create token
-        reset_token = PasswordResetToken.objects.create(user=user)
-
-        reset_url = request.build_absolute_uri(
-            reverse("login_app:reset_password", args=[reset_token.token])
-        )
-
-        subject = "Campus Pass - Password Reset"
-        body_text = (
-            f"Hi {user.first_name},\n\n"
-            "You requested a password reset for your Campus Pass account.\n"
-            f"Click the link below to set a new password:\n\n{reset_url}\n\n"
-            "If you did not request this, you can ignore this email.\n\n"
-            "CIT-U Campus Pass"
-        )
-
-        # --- SendGrid Web API send ---
+        # Create token + queue the email in one transaction
+        # (delivered by `manage.py send_queued_emails`)
         try:
-            sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-            message = Mail(
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to_emails=user.email,
-                subject=subject,
-                plain_text_content=body_text,
-            )
-            response = sg.send(message)
+            with transaction.atomic():
+                # Replaces any earlier link for this user
+                reset_token = PasswordResetToken.objects.issue(user)
 
-            # SendGrid returns 202 for accepted
-            if response.status_code in (200, 202):
-                messages.success(
-                    request,
-                    "If that email is registered, a password reset link has been sent."
+                reset_url = request.build_absolute_uri(
+                    reverse("login_app:reset_password", args=[reset_token.token])
                 )
-            else:
-                messages.error(
-                    request,
-                    "We couldn't send the reset email right now. Please try again later."
+
+                subject = "Campus Pass - Password Reset"
+                body_text = (
+                    f"Hi {user.first_name},\n\n"
+                    "You requested a password reset for your Campus Pass account.\n"
+                    f"Click the link below to set a new password:\n\n{reset_url}\n\n"
+                    "If you did not request this, you can ignore this email.\n\n"
+                    "CIT-U Campus Pass"
                 )
 
+                outbox.queue_email(user.email, subject, body_text, category="password_reset")
+
+            messages.success(
+                request,
+                "If that email is registered, a password reset link has been sent."
+            )
+
         except Exception as e:
             # Optional: log this if you want
-            print("Error sending SendGrid email:", e)
+            print("Error queueing password reset email:", e)
             messages.error(
                 request,
                 "There was a problem sending the reset email. Please try again later."
@@ -309,11 +275,11 @@ def reset_password_view(request, token):
     """
     Reset password view for visitors, using the emailed token.
     """
-    reset_token = get_object_or_404(PasswordResetToken, token=token)
+    # Expiry is checked in the query; expired rows are left to the sweeper
+    reset_token = PasswordResetToken.objects.valid().select_related("user").filter(token=token).first()
 
-    # Check if token expired
-    if reset_token.is_expired():
-        reset_token.delete()
+    # Expired, already used, or replaced by a newer link
+    if reset_token is None:
         messages.error(request, "This reset link has expired. Please request a new one.")
         return redirect("login_app:forgot_password")
 
@@ -337,8 +303,8 @@ def reset_password_view(request, token):
         user.set_password(password)
         user.save()
 
-        # One-time use
-        reset_token.delete()
+        # One-time use (and any other link still out for this user)
+        PasswordResetToken.objects.filter(user=user).delete()
 
         messages.success(request, "Your password has been updated. You can now sign in.")
         return redirect("login_app:login")
@@ -355,3 +321,13 @@ def logout_view(request):
 
     request.session.flush()
     return redirect('login_app:login')
+
+
+def throttle_stats_view(request):
+    """Throttled-request counters per endpoint (admins only)."""
+    if 'admin_username' not in request.session:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+    return JsonResponse({
+        "throttled": throttled_counts(),
+        "rates": getattr(settings, "THROTTLE_RATES", {}),
+    })
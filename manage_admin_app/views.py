@@ -7,6 +7,7 @@ from manage_reports_logs_app import services as logs_services
 
 # Import Notification Helper and Models
 from dashboard_app.views import create_notification
+from login_app.decorators import superadmin_required
 from login_app.models import Administrator
 
 # ===== Helper for Supabase Response Checking =====
@@ -86,16 +87,6 @@ def send_admin_notifications(request, action_type, target_username, description)
     except Exception as e:
         print(f"Error sending notifications: {e}")
 
-# ===== PERMISSION DECORATOR =====
-def superadmin_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.session.get("user_is_superadmin"):
-            return view_func(request, *args, **kwargs)
-        messages.error(request, "You must be a superadmin to access this page.")
-        return redirect("login_app:login")
-    return wrapper
-
-
 # ===== VIEWS =====
 
 @superadmin_required
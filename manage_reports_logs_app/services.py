@@ -6,6 +6,8 @@ from datetime import datetime
 from django.conf import settings
 from django.utils import timezone
 
+from citu_campuspass.db_router import replica_reads
+
 # Import Django models
 from dashboard_app.models import SystemLog, Visit
 from register_app.models import User
@@ -23,6 +25,7 @@ def _extract_identifier(actor_str):
         return actor_str.split('(')[-1].rstrip(')')
     return actor_str
 
+@replica_reads()
 def list_logs(limit=1000):
     """Fetch all system logs with hydrated actor details."""
     try:
@@ -114,6 +117,7 @@ def create_log(actor, action_type, description, actor_role=""):
 # REPORTS SERVICES
 # ==============================
 
+@replica_reads()
 def list_visits(limit=2000):
     """
     Fetch visit data including related user info.
@@ -159,6 +163,7 @@ def list_visits(limit=2000):
         logger.error(f"Error fetching visits: {e}")
         return []
 
+@replica_reads()
 def list_users(limit=2000):
     """Fetch visitor user data."""
     try:
@@ -174,6 +179,7 @@ def list_users(limit=2000):
         logger.error(f"Error fetching users: {e}")
         return []
 
+@replica_reads()
 def list_staff(limit=1000):
     """Fetch staff data."""
     try:
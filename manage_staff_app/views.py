@@ -7,6 +7,7 @@ from manage_reports_logs_app import services as logs_services
 
 # Import Notification Helper and Models
 from dashboard_app.views import create_notification
+from login_app.decorators import admin_required
 from login_app.models import Administrator
 
 # ===== Helper for Supabase Response Checking =====
@@ -74,16 +75,6 @@ def send_staff_notifications(request, action_type, description):
         print(f"Error sending staff notifications: {e}")
 
 
-# ===== PERMISSION DECORATOR =====
-def admin_required(view_func):
-    def wrapper(request, *args, **kwargs):
-        if request.session.get("admin_username") or request.session.get("user_is_superadmin"):
-            return view_func(request, *args, **kwargs)
-        messages.error(request, "You must be an admin to access this page.")
-        return redirect("login_app:login")
-    return wrapper
-
-
 # ===== STAFF LIST =====
 @admin_required
 def staff_list_view(request):
@@ -1,30 +1,234 @@
 # manage_visit_records_app/services.py
+import csv
+import io
+import re
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from book_visit_app import capacity
+from book_visit_app.departments import visit_code_part
+from citu_campuspass.db_router import replica_reads
+from dashboard_app import visit_codes
 from dashboard_app.models import Visit
+from dashboard_app.services import visit_rows
+from email_outbox_app import services as outbox
+from manage_reports_logs_app import services as logs_services
+from register_app.models import User
+from visitor_search_app import search
 
+@replica_reads()
 def list_visits(limit=1000):
     """
-    Fetch all visit records using Django ORM.
+    Fetch all visit records (with visitor names) as plain dicts.
     """
     try:
-        queryset = Visit.objects.all().order_by('visit_id')
-        if limit is not None:
-            queryset = queryset[:limit]
-        visits = queryset
-        # Convert to list of dictionaries for JSON serialization
-        return [{
-            'visit_id': visit.visit_id,
-            'user_email': visit.user_email,
-            'code': visit.code,
-            'purpose': visit.purpose,
-            'department': visit.department,
-            'visit_date': visit.visit_date,
-            'start_time': visit.start_time,
-            'end_time': visit.end_time,
-            'status': visit.status,
-            'created_at': visit.created_at,
-            'user_id': visit.user_id,
-            'visitor_name': visit.visitor_name if hasattr(visit, 'visitor_name') else None
-        } for visit in visits]
+        return visit_rows(
+            Visit.objects.order_by('visit_id'),
+            with_visitor_name=True,
+            limit=limit,
+        )
     except Exception as e:
         print(f"Error fetching visits: {e}")
-        return []
\ No newline at end of file
+        return []
+
+
+# ============================================================================
+# ===== EVENT PRE-REGISTRATION (bulk CSV import) =====
+# ============================================================================
+
+EVENT_MAX_ROWS = 2000
+EVENT_CSV_COLUMNS = ("first_name", "last_name", "email", "phone")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+class EventImportError(Exception):
+    """The whole import was rejected (bad file, no capacity, ...)."""
+
+
+def parse_guest_csv(uploaded_file):
+    """
+    Read a guest list CSV with a header row: first_name, last_name, email,
+    phone and optionally visitor_type. Returns (guests, errors) where each
+    error is {'line', 'email', 'error'}.
+    """
+    try:
+        text = uploaded_file.read().decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise EventImportError("The file must be a UTF-8 encoded CSV.")
+
+    reader = csv.DictReader(io.StringIO(text))
+    header = [(h or "").strip().lower() for h in (reader.fieldnames or [])]
+    missing = [c for c in EVENT_CSV_COLUMNS if c not in header]
+    if missing:
+        raise EventImportError(f"Missing CSV column(s): {', '.join(missing)}.")
+    reader.fieldnames = header
+
+    guests, errors, seen, seen_phones = [], [], set(), set()
+    for line, row in enumerate(reader, start=2):
+        if len(guests) + len(errors) >= EVENT_MAX_ROWS:
+            raise EventImportError(f"At most {EVENT_MAX_ROWS} guests per import.")
+
+        guest = {k: (row.get(k) or "").strip() for k in EVENT_CSV_COLUMNS}
+        guest["email"] = guest["email"].lower()
+        guest["phone"] = re.sub(r"\D", "", guest["phone"])
+        guest["visitor_type"] = (row.get("visitor_type") or "").strip().title() or "Guest"
+        guest["line"] = line
+
+        if not any(guest[k] for k in EVENT_CSV_COLUMNS):
+            continue  # blank line
+
+        if not all(guest[k] for k in EVENT_CSV_COLUMNS):
+            error = "Missing first name, last name, email or phone."
+        elif not EMAIL_RE.match(guest["email"]):
+            error = "Invalid email address."
+        elif not re.fullmatch(r"09\d{9}", guest["phone"]):
+            error = "Invalid phone number (must be 11 digits starting with 09)."
+        elif guest["email"] in seen:
+            error = "Duplicate email in this file."
+        elif guest["phone"] in seen_phones:
+            error = "Duplicate phone number in this file."
+        else:
+            error = None
+
+        if error:
+            errors.append({"line": line, "email": guest["email"], "error": error})
+        else:
+            seen.add(guest["email"])
+            seen_phones.add(guest["phone"])
+            guests.append(guest)
+
+    return guests, errors
+
+
+def _invitation(user_first_name, code, event_name, department, visit_date, new_account):
+    visit_date_human = visit_date.strftime("%B %d, %Y")
+    body = (
+        f"Hi {user_first_name},\n\n"
+        f"You have been pre-registered for {event_name} at CIT-U.\n\n"
+        f"Visit Details:\n"
+        f"• Visit Code: {code}\n"
+        f"• Visit Date: {visit_date_human}\n"
+        f"• Department: {department}\n\n"
+        f"Please present this code at the front desk during check-in.\n\n"
+    )
+    if new_account:
+        body += (
+            "A CampusPass account was created for this email. "
+            "Use \"Forgot password\" on the login page to set your password.\n\n"
+        )
+    body += "Thank you,\nCIT-U CampusPass System"
+    return f"CIT-U CampusPass • Invitation: {event_name}", body
+
+
+def preregister_event(guests, event_name, department, visit_date, actor):
+    """
+    Create one Upcoming visit per guest in a single transaction:
+    - users matched by normalized email, missing ones bulk-created
+      with an unusable password,
+    - codes allocated in bulk, visits and invitations bulk-inserted,
+    - department quota taken once for the whole batch.
+    Returns (created, errors): created rows are {'line', 'email', 'name', 'code'}.
+    """
+    errors = []
+    if not guests:
+        return [], errors
+
+    emails = [g["email"] for g in guests]
+    existing = {u.email_norm: u for u in User.objects.filter(email_norm__in=emails)}
+
+    # Phones already used by a *different* account
+    phone_owners = dict(
+        User.objects.filter(
+            phone_norm__in=[g["phone"] for g in guests]
+        ).values_list("phone_norm", "email_norm")
+    )
+
+    # Registered guests who already have an open visit that day
+    busy_ids = set(
+        Visit.objects.filter(
+            user_id__in=[u.user_id for u in existing.values()],
+            visit_date=visit_date,
+            status__in=["Upcoming", "Active"],
+        ).values_list("user_id", flat=True)
+    )
+
+    accepted = []
+    for guest in guests:
+        user = existing.get(guest["email"])
+        owner = phone_owners.get(guest["phone"])
+        if not user and owner and owner != guest["email"]:
+            errors.append({"line": guest["line"], "email": guest["email"],
+                           "error": "Phone number is registered to another account."})
+        elif user and user.user_id in busy_ids:
+            errors.append({"line": guest["line"], "email": guest["email"],
+                           "error": "Already has a visit on this date."})
+        else:
+            accepted.append(guest)
+
+    if not accepted:
+        return [], errors
+
+    with transaction.atomic():
+        try:
+            capacity.reserve_slot(department, visit_date, count=len(accepted))
+        except capacity.DepartmentFull:
+            raise EventImportError(
+                f"{department} does not have {len(accepted)} free slots on {visit_date:%B %d, %Y}."
+            )
+
+        new_users = User.objects.bulk_create([
+            User(
+                first_name=g["first_name"],
+                last_name=g["last_name"],
+                email=g["email"],
+                phone=g["phone"],
+                password=make_password(None),
+                visitor_type=g["visitor_type"],
+            )
+            for g in accepted if g["email"] not in existing
+        ])
+        # bulk_create() sends no post_save: make the new accounts searchable once committed
+        transaction.on_commit(lambda: search.index_users(new_users))
+        new_emails = {u.email for u in new_users}
+        users = {**existing, **{u.email_norm: u for u in new_users}}
+
+        codes = visit_codes.new_unused_visit_codes(visit_code_part(department), len(accepted))
+
+        visits, invitations, created = [], [], []
+        for guest, code in zip(accepted, codes):
+            user = users[guest["email"]]
+            visits.append(Visit(
+                user_id=user.user_id,
+                user_email=user.email,
+                code=code,
+                purpose=event_name,
+                department=department,
+                visit_date=visit_date,
+                status="Upcoming",
+            ))
+            invitations.append((user.email, *_invitation(
+                user.first_name, code, event_name, department, visit_date,
+                new_account=guest["email"] in new_emails,
+            )))
+            created.append({
+                "line": guest["line"],
+                "email": user.email,
+                "name": f"{user.first_name} {user.last_name}",
+                "code": code,
+            })
+
+        Visit.objects.bulk_create(visits)
+        outbox.queue_emails(invitations, category="event_invitation")
+
+        logs_services.create_log(
+            actor=actor,
+            action_type="Event Pre-registration",
+            description=(
+                f"Pre-registered {len(visits)} guest(s) for '{event_name}' at {department} "
+                f"on {visit_date}; {len(new_users)} new visitor account(s)."
+            ),
+            actor_role="Admin",
+        )
+
+    return created, errors
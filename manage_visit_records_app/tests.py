@@ -1,3 +1,158 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import is_password_usable
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from book_visit_app.models import DepartmentDailyQuota
+from dashboard_app.models import SystemLog, Visit
+from email_outbox_app.models import EmailOutbox
+from register_app.models import User
+
+from . import services
+
+DEPARTMENT = "College of Computer Studies (CCS)"
+HEADER = "first_name,last_name,email,phone\n"
+
+
+def guest_csv(text):
+    return SimpleUploadedFile("guests.csv", text.encode("utf-8"), content_type="text/csv")
+
+
+class ParseGuestCsvTests(SimpleTestCase):
+
+    def test_rows_are_normalized(self):
+        guests, errors = services.parse_guest_csv(guest_csv(
+            "First_Name, Last_Name ,Email,Phone,Visitor_Type\n"
+            "Ana,Reyes, Ana@Example.com ,0917-123-4567,parent\n"
+            ",,,\n"
+            "Ben,Cruz,ben@example.com,09181234567,\n"
+        ))
+        self.assertEqual(errors, [])
+        self.assertEqual(
+            [(g["line"], g["email"], g["phone"], g["visitor_type"]) for g in guests],
+            [(2, "ana@example.com", "09171234567", "Parent"), (4, "ben@example.com", "09181234567", "Guest")],
+        )
+
+    def test_malformed_rows_are_reported_by_line(self):
+        guests, errors = services.parse_guest_csv(guest_csv(
+            HEADER
+            + "Ana,Reyes,ana@example.com\n"
+            + "Ben,Cruz,not-an-email,09181234567\n"
+            + "Cy,Lim,cy@example.com,0918123\n"
+            + "Dee,Tan,dee@example.com,09191234567\n"
+        ))
+        self.assertEqual([g["email"] for g in guests], ["dee@example.com"])
+        self.assertEqual([(e["line"], e["error"]) for e in errors], [
+            (2, "Missing first name, last name, email or phone."),
+            (3, "Invalid email address."),
+            (4, "Invalid phone number (must be 11 digits starting with 09)."),
+        ])
+
+    def test_duplicate_guests(self):
+        guests, errors = services.parse_guest_csv(guest_csv(
+            HEADER
+            + "Ana,Reyes,ana@example.com,09171234567\n"
+            + "Ana,Reyes,ANA@example.com,09181234567\n"
+            + "Ann,Go,ann@example.com,0917 123 4567\n"
+        ))
+        self.assertEqual(len(guests), 1)
+        self.assertEqual([(e["line"], e["error"]) for e in errors], [
+            (3, "Duplicate email in this file."),
+            (4, "Duplicate phone number in this file."),
+        ])
+
+    def test_bad_files_are_rejected(self):
+        with self.assertRaisesMessage(services.EventImportError, "Missing CSV column(s): phone."):
+            services.parse_guest_csv(guest_csv("first_name,last_name,email\n"))
+        with self.assertRaisesMessage(services.EventImportError, "UTF-8"):
+            services.parse_guest_csv(SimpleUploadedFile("guests.csv", b"\xff\xfe\x00bad"))
+
+    def test_row_limit(self):
+        rows = "".join(f"G{i},Guest,g{i}@example.com,09{i:09d}\n" for i in range(services.EVENT_MAX_ROWS + 1))
+        with self.assertRaisesMessage(services.EventImportError, f"At most {services.EVENT_MAX_ROWS}"):
+            services.parse_guest_csv(guest_csv(HEADER + rows))
+
+
+@override_settings(DEPARTMENT_DAILY_CAPACITY={"CCS": 3})
+class PreregisterEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.visit_date = timezone.localdate() + timedelta(days=2)
+        cls.ana = User.objects.create(
+            first_name="Ana", last_name="Reyes", email="Ana@Example.com",
+            phone="09171234567", password="x", visitor_type="Guest",
+        )
+
+    def guest(self, line, first_name, email, phone):
+        return {"line": line, "first_name": first_name, "last_name": "Guest", "email": email,
+                "phone": phone, "visitor_type": "Guest"}
+
+    def preregister(self, guests):
+        return services.preregister_event(guests, "Open House", DEPARTMENT, self.visit_date, "Ada (ada)")
+
+    def booked(self):
+        quota = DepartmentDailyQuota.objects.filter(department_code="CCS", visit_date=self.visit_date).first()
+        return quota.booked if quota else 0
+
+    def test_existing_and_new_guests(self):
+        created, errors = self.preregister([
+            self.guest(2, "Ana", "ana@example.com", "09171234567"),
+            self.guest(3, "Ben", "ben@example.com", "09181234567"),
+        ])
+
+        self.assertEqual(errors, [])
+        self.assertEqual([c["email"] for c in created], ["Ana@Example.com", "ben@example.com"])
+        self.assertEqual(User.objects.count(), 2)
+        self.assertFalse(is_password_usable(User.objects.get(email="ben@example.com").password))
+        self.assertEqual(
+            sorted(Visit.objects.values_list("user_id", flat=True)),
+            sorted([self.ana.user_id, User.objects.get(email="ben@example.com").user_id]),
+        )
+        self.assertEqual(self.booked(), 2)
+
+        bodies = dict(EmailOutbox.objects.values_list("to_email", "body_text"))
+        self.assertNotIn("A CampusPass account was created", bodies["Ana@Example.com"])
+        self.assertIn("A CampusPass account was created", bodies["ben@example.com"])
+        self.assertEqual(SystemLog.objects.count(), 1)
+
+    def test_conflicting_guests_are_reported_and_skipped(self):
+        Visit.objects.create(
+            user_id=self.ana.user_id, user_email=self.ana.email, code="CIT-ANA1", purpose="Tour",
+            department="Registrar", visit_date=self.visit_date, status="Upcoming",
+        )
+        created, errors = self.preregister([
+            self.guest(2, "Ana", "ana@example.com", "09171234567"),
+            self.guest(3, "Cy", "cy@example.com", "09171234567"),
+            self.guest(4, "Dee", "dee@example.com", "09191234567"),
+        ])
+
+        self.assertEqual([c["email"] for c in created], ["dee@example.com"])
+        self.assertEqual([(e["line"], e["error"]) for e in errors], [
+            (2, "Already has a visit on this date."),
+            (3, "Phone number is registered to another account."),
+        ])
+        self.assertEqual(self.booked(), 1)
+
+    def test_not_enough_slots_imports_nobody(self):
+        guests = [self.guest(i + 2, f"G{i}", f"g{i}@example.com", f"0918000000{i}") for i in range(4)]
+        with self.assertRaisesMessage(services.EventImportError, "does not have 4 free slots"):
+            self.preregister(guests)
+
+        self.assertEqual(User.objects.count(), 1)
+        self.assertFalse(Visit.objects.exists())
+        self.assertEqual(self.booked(), 0)
+
+    def test_failure_after_the_inserts_rolls_everything_back(self):
+        guests = [self.guest(2, "Ben", "ben@example.com", "09181234567")]
+        with mock.patch.object(services.outbox, "queue_emails", side_effect=RuntimeError("outbox down")), \
+                self.assertRaises(RuntimeError):
+            self.preregister(guests)
+
+        self.assertFalse(User.objects.filter(email="ben@example.com").exists())
+        self.assertFalse(Visit.objects.exists())
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertEqual(self.booked(), 0)
@@ -6,4 +6,5 @@ app_name = "visit_records_app"
 urlpatterns = [
     path("", views.visit_records_view, name="visit_records"),
     path("export/", views.export_visits_view, name="export_visits"),
+    path("events/preregister/", views.event_preregistration_view, name="event_preregistration"),
 ]
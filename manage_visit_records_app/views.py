@@ -1,7 +1,11 @@
 # manage_visit_records_app/views.py
 import json
+from datetime import datetime
+from django.contrib import messages
 from django.shortcuts import render
 from django.http import JsonResponse
+from django.utils import timezone
+from book_visit_app.departments import DEPARTMENT_CODE_MAP
 from manage_staff_app.views import admin_required
 from . import services
 
@@ -53,3 +57,69 @@ def export_visits_view(request):
         'visits': filtered_visits,
         'total_count': len(filtered_visits)
     })
+
+
+@admin_required
+def event_preregistration_view(request):
+    """
+    Pre-register a CSV list of guests for a campus event (one department/date).
+    Everything valid is created in one transaction; invalid rows are reported.
+    """
+    context = {
+        "departments": list(DEPARTMENT_CODE_MAP.keys()),
+        "form": {},
+        "created": [],
+        "errors": [],
+        "submitted": False,
+    }
+
+    if request.method != "POST":
+        return render(request, "manage_visit_records_app/event_preregistration.html", context)
+
+    event_name = (request.POST.get("event_name") or "").strip()
+    department = (request.POST.get("department") or "").strip()
+    visit_date_str = (request.POST.get("visit_date") or "").strip()
+    guest_file = request.FILES.get("guest_csv")
+    context["form"] = {"event_name": event_name, "department": department, "visit_date": visit_date_str}
+
+    if not event_name or not department or not visit_date_str or not guest_file:
+        messages.error(request, "Please provide the event name, department, date and guest CSV.")
+        return render(request, "manage_visit_records_app/event_preregistration.html", context)
+
+    try:
+        visit_date = datetime.strptime(visit_date_str, "%Y-%m-%d").date()
+    except ValueError:
+        messages.error(request, "Invalid date format.")
+        return render(request, "manage_visit_records_app/event_preregistration.html", context)
+
+    if visit_date < timezone.localdate():
+        messages.error(request, "Past dates are not allowed.")
+        return render(request, "manage_visit_records_app/event_preregistration.html", context)
+
+    actor = f"{request.session.get('admin_first_name', 'Unknown')} ({request.session.get('admin_username', '-')})"
+
+    try:
+        guests, errors = services.parse_guest_csv(guest_file)
+        created, more_errors = services.preregister_event(
+            guests, event_name, department, visit_date, actor
+        )
+    except services.EventImportError as e:
+        messages.error(request, str(e))
+        return render(request, "manage_visit_records_app/event_preregistration.html", context)
+    except Exception as e:
+        print(f"Error pre-registering event guests: {e}")
+        messages.error(request, "The import failed and nothing was saved. Please try again.")
+        return render(request, "manage_visit_records_app/event_preregistration.html", context)
+
+    errors = sorted(errors + more_errors, key=lambda e: e["line"])
+    context.update({"created": created, "errors": errors, "submitted": True})
+
+    if created:
+        messages.success(
+            request,
+            f"{len(created)} guest(s) pre-registered. Invitations are queued for sending."
+        )
+    if errors:
+        messages.warning(request, f"{len(errors)} row(s) were skipped. See the details below.")
+
+    return render(request, "manage_visit_records_app/event_preregistration.html", context)
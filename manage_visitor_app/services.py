@@ -1,6 +1,18 @@
 # manage_visitor_app/services.py
 from register_app.models import User
 from dashboard_app.models import Visit
+from dashboard_app.services import visit_rows
+
+# Columns shown in the admin visitor detail history table
+HISTORY_FIELDS = (
+    'visit_date',
+    'code',
+    'department',
+    'status',
+    'purpose',
+    'start_time',
+    'end_time',
+)
 
 def list_visitors(limit=500):
     """
@@ -67,19 +79,12 @@ def get_visitor_history(user_id):
     try:
         # Fetch visits filtering by the user_id
         # Using the Visit model imported from dashboard_app.models
-        visits = Visit.objects.filter(user_id=user_id).order_by('-visit_date')
-        
-        return type('obj', (object,), {
-            'data': [{
-                'visit_date': v.visit_date,
-                'code': v.code,
-                'department': v.department,
-                'status': v.status,
-                'purpose': v.purpose,
-                'start_time': v.start_time, # Optional: helpful for detail view
-                'end_time': v.end_time,     # Optional: helpful for detail view
-            } for v in visits]
-        })()
+        visits = visit_rows(
+            Visit.objects.filter(user_id=user_id).order_by('-visit_date'),
+            fields=HISTORY_FIELDS,
+        )
+
+        return type('obj', (object,), {'data': visits})()
     except Exception as e:
         print(f"Error fetching history for {user_id}: {e}")
         return type('obj', (object,), {'data': []})()
\ No newline at end of file
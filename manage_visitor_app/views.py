@@ -5,6 +5,7 @@ from manage_reports_logs_app import services as logs_services
 
 # Import Notification Helper and Models
 from dashboard_app.views import create_notification
+from login_app.decorators import admin_required
 from login_app.models import Administrator
 
 # ===== Helper for Supabase Response Checking =====
@@ -55,16 +56,6 @@ def send_visitor_admin_notifications(request, visitor_id, description):
     except Exception as e:
         print(f"Error sending visitor notifications: {e}")
 
-# ===== DECORATOR =====
-def admin_required(view_func):
-    """Decorator to restrict access to admins."""
-    def wrapper(request, *args, **kwargs):
-        if request.session.get("admin_username") or request.session.get("user_is_superadmin"):
-            return view_func(request, *args, **kwargs)
-        messages.error(request, "You must be an admin to access this page.")
-        return redirect("login_app:login")
-    return wrapper
-
 # ===== VIEWS =====
 
 @admin_required
@@ -3,7 +3,7 @@ from django.shortcuts import render, redirect
 from django.contrib import messages
 import re
 from django.contrib.auth.hashers import check_password, make_password
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from manage_reports_logs_app import services as logs_services
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
@@ -15,11 +15,10 @@ from profile_app.tokens import simple_token_generator
 from login_app.models import PasswordResetToken
 
 from django.conf import settings
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from email_outbox_app import services as outbox
 
 # Import Django models
-from register_app.models import User
+from register_app.models import User, normalize_email, normalize_phone
 from login_app.models import Administrator
 
 # ✅ Import Notification Helper
@@ -91,12 +90,12 @@ def profile_view(request):
                 return redirect('profile_app:profile')
 
             # Duplicate email check
-            if User.objects.filter(email=email).exclude(email=user_email).exists():
+            if User.objects.filter(email_norm=normalize_email(email)).exclude(pk=user.pk).exists():
                 messages.error(request, "Email already registered.")
                 return redirect('profile_app:profile')
 
             # Duplicate phone check
-            if User.objects.filter(phone=phone).exclude(email=user_email).exists():
+            if User.objects.filter(phone_norm=normalize_phone(phone)).exclude(pk=user.pk).exists():
                 messages.error(request, "Phone already registered.")
                 return redirect('profile_app:profile')
 
@@ -282,31 +281,26 @@ def change_password_request(request):
     user = User.objects.get(email=request.session["user_email"])
 
     if request.method == "POST":
-        # Create password reset token
-        reset_token = PasswordResetToken.objects.create(user=user)
-
-        reset_url = request.build_absolute_uri(
-            reverse("login_app:reset_password", args=[reset_token.token])
-        )
-
-        subject = "Campus Pass - Change Password"
-        body_text = (
-            f"Hi {user.first_name},\n\n"
-            "You requested to change your Campus Pass password.\n"
-            f"Click the link below to set a new password:\n\n{reset_url}\n\n"
-            "If you did not request this, you may ignore this email.\n\n"
-            "CIT-U Campus Pass"
-        )
-
         try:
-            sg = SendGridAPIClient(settings.SENDGRID_API_KEY)
-            message = Mail(
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                to_emails=user.email,
-                subject=subject,
-                plain_text_content=body_text,
-            )
-            sg.send(message)
+            # Token + email in one transaction (sent by `manage.py send_queued_emails`)
+            with transaction.atomic():
+                # Replaces any earlier link for this user
+                reset_token = PasswordResetToken.objects.issue(user)
+
+                reset_url = request.build_absolute_uri(
+                    reverse("login_app:reset_password", args=[reset_token.token])
+                )
+
+                subject = "Campus Pass - Change Password"
+                body_text = (
+                    f"Hi {user.first_name},\n\n"
+                    "You requested to change your Campus Pass password.\n"
+                    f"Click the link below to set a new password:\n\n{reset_url}\n\n"
+                    "If you did not request this, you may ignore this email.\n\n"
+                    "CIT-U Campus Pass"
+                )
+
+                outbox.queue_email(user.email, subject, body_text, category="password_change")
             messages.success(request, "A password change link has been sent to your email.")
         except Exception:
             messages.error(request, "Unable to send email right now. Please try again later.")
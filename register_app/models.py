@@ -1,6 +1,40 @@
 # models.py (put this in your appropriate app)
+import re
+
 from django.db import models
-from django.contrib.auth.hashers import make_password, check_password
+from django.db.models.functions import Concat, Lower
+from django.contrib.auth.hashers import make_password
+
+from login_app.hashers import verify_password
+
+
+def full_name_expression():
+    """SQL expression for "first_name last_name" (matches the search index)."""
+    return Concat(
+        'first_name', models.Value(' '), 'last_name',
+        output_field=models.TextField(),
+    )
+
+
+def normalize_email(email):
+    """Canonical form used for every email lookup (stored in *_email_norm columns)."""
+    return (email or "").strip().lower() or None
+
+
+def normalize_phone(phone):
+    """Digits only, e.g. "0917 123-4567" -> "09171234567"."""
+    return re.sub(r"\D", "", phone or "") or None
+
+
+class NormalizedManager(models.Manager):
+    """bulk_create() skips save(), so fill the normalized columns here too."""
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.set_normalized_fields()
+        return super().bulk_create(objs, *args, **kwargs)
+
 
 class User(models.Model):
     VISITOR_TYPE_CHOICES = [
@@ -20,15 +54,45 @@ class User(models.Model):
     password = models.TextField()    
     created_at = models.DateTimeField(auto_now_add=True)
     visitor_type = models.TextField()
-    
+
+    # Canonical identity columns, kept in sync by save()/bulk_create().
+    # Added and backfilled on existing databases by
+    # `python manage.py backfill_identity_columns`.
+    email_norm = models.TextField(null=True, blank=True, editable=False)
+    phone_norm = models.TextField(null=True, blank=True, editable=False)
+
+    objects = NormalizedManager()
+
     class Meta:
         db_table = 'users'  # Use your existing table name
+        indexes = [
+            # Case-insensitive name lookups used by staff visitor search
+            models.Index(Lower(full_name_expression()), name='users_full_name_lower_idx'),
+            models.Index(fields=['phone_norm'], name='users_phone_norm_idx'),
+            # Lookups by the stored email (check-in/out notifications, reports, profile)
+            models.Index(fields=['email'], name='users_email_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['email_norm'], name='users_email_norm_key'),
+        ]
+
+    def set_normalized_fields(self):
+        self.email_norm = normalize_email(self.email)
+        self.phone_norm = normalize_phone(self.phone)
+
+    def save(self, *args, **kwargs):
+        self.set_normalized_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'email_norm', 'phone_norm'}
+        super().save(*args, **kwargs)
     
     def set_password(self, raw_password):
         self.password = make_password(raw_password)
     
     def check_password(self, raw_password):
-        return check_password(raw_password, self.password)
+        # Upgrades the stored hash when the hashing policy changed
+        return verify_password(raw_password, self)
     
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
\ No newline at end of file
@@ -4,7 +4,7 @@ import re
 from django.db import IntegrityError
 from manage_reports_logs_app import services as logs_services
 
-from .models import User
+from .models import User, normalize_email, normalize_phone
 
 
 def register_view(request):
@@ -67,13 +67,13 @@ def register_view(request):
         # ===== Create user with Django ORM =====
         try:
             # Check for existing email
-            if User.objects.filter(email=email).exists():
+            if User.objects.filter(email_norm=normalize_email(email)).exists():
                 data["error"] = "Email already registered."
                 data["email"] = ''
                 return render(request, 'register_app/register.html', data)
 
             # Check for existing phone
-            if User.objects.filter(phone=phone).exists():
+            if User.objects.filter(phone_norm=normalize_phone(phone)).exists():
                 data["error"] = "Phone number already registered."
                 data["phone"] = ''
                 return render(request, 'register_app/register.html', data)
@@ -1,5 +1,6 @@
 # staff_visit_records_app/services.py
 from dashboard_app.models import Visit
+from dashboard_app.services import visit_rows
 from datetime import datetime, date, timedelta
 import pytz
 
@@ -8,21 +9,10 @@ def get_all_visits(limit=2000):
     Fetch all visit records using Django ORM, ordered from latest to oldest.
     """
     try:
-        visits = Visit.objects.all().order_by('-visit_date', '-start_time')[:limit]
-        # Convert to list of dictionaries for compatibility
-        return [{
-            'visit_id': visit.visit_id,
-            'user_email': visit.user_email,
-            'code': visit.code,
-            'purpose': visit.purpose,
-            'department': visit.department,
-            'visit_date': visit.visit_date,
-            'start_time': visit.start_time,
-            'end_time': visit.end_time,
-            'status': visit.status,
-            'created_at': visit.created_at,
-            'user_id': visit.user_id
-        } for visit in visits]
+        return visit_rows(
+            Visit.objects.order_by('-visit_date', '-start_time'),
+            limit=limit,
+        )
     except Exception as e:
         print(f"Error fetching visits: {e}")
         return []
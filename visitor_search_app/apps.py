@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class VisitorSearchAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'visitor_search_app'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+        from register_app.models import User
+        from . import search
+
+        # Keep the in-process n-gram index in sync with this worker's writes
+        post_save.connect(search.user_saved, sender=User, dispatch_uid="visitor_search_user_saved")
+        post_delete.connect(search.user_deleted, sender=User, dispatch_uid="visitor_search_user_deleted")
@@ -0,0 +1,52 @@
+# visitor_search_app/management/commands/setup_visitor_search.py
+"""
+Enable pg_trgm and create the GIN trigram indexes used by fuzzy visitor
+search. Does nothing on databases other than Postgres (the in-process
+n-gram index is used there instead).
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models.functions import Lower
+
+from register_app.models import User, full_name_expression
+
+
+def trigram_indexes():
+    from django.contrib.postgres.indexes import GinIndex, OpClass
+
+    return [
+        GinIndex(
+            OpClass(Lower(full_name_expression()), name="gin_trgm_ops"),
+            name="users_full_name_trgm_idx",
+        ),
+        GinIndex(OpClass(Lower("email"), name="gin_trgm_ops"), name="users_email_trgm_idx"),
+        GinIndex(OpClass("phone", name="gin_trgm_ops"), name="users_phone_trgm_idx"),
+    ]
+
+
+class Command(BaseCommand):
+    help = "Install pg_trgm and the trigram indexes for fuzzy visitor search."
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write("Not a Postgres database; fuzzy search uses the in-memory index.")
+            return
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        except Exception as e:
+            self.stderr.write(f"pg_trgm unavailable ({e}); fuzzy search uses the in-memory index.")
+            return
+
+        with connection.cursor() as cursor:
+            existing = connection.introspection.get_constraints(cursor, User._meta.db_table)
+
+        for index in trigram_indexes():
+            if index.name in existing:
+                continue
+            self.stdout.write(f"{User._meta.db_table}: creating {index.name}")
+            with connection.schema_editor() as schema_editor:
+                schema_editor.add_index(User, index)
+
+        self.stdout.write(self.style.SUCCESS("Visitor search indexes are in place."))
@@ -0,0 +1,324 @@
+"""
+Visitor Search - ranked prefix / fuzzy matching
+Finds registered visitors by (partial, misspelled) name, email or phone.
+
+Two backends:
+- Postgres with the pg_trgm extension: similarity + prefix matching in SQL,
+  served by the GIN trigram indexes from `manage.py setup_visitor_search`.
+- Anything else (SQLite locally, Postgres without pg_trgm): an in-process
+  trigram index over the users table, built once per worker and kept up to
+  date through post_save / post_delete signals on User. bulk_create() sends
+  no signals, so code that bulk-inserts users calls index_users() after it.
+  Only one request per worker rebuilds an expired index; the others keep
+  searching the current one meanwhile.
+"""
+
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.db import connection
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Greatest, Lower
+
+from register_app.models import User, full_name_expression
+
+logger = logging.getLogger(__name__)
+
+# Same default cut-off pg_trgm uses for the % operator
+SIMILARITY_THRESHOLD = 0.3
+
+# Prefix hits always rank above purely fuzzy ones
+PREFIX_BONUS = 1.0
+EXACT_BONUS = 2.0
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 25
+
+# Full in-memory rebuild interval, to pick up changes saved by other workers
+NGRAM_INDEX_MAX_AGE = 300  # seconds
+
+RESULT_FIELDS = ("user_id", "first_name", "last_name", "email", "phone")
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def trigrams(text):
+    """pg_trgm-style trigrams: each word padded with two spaces in front, one behind."""
+    grams = set()
+    for word in _WORD_RE.findall((text or "").lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Jaccard similarity of two trigram sets (what pg_trgm's similarity() returns)."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+def _phone_query(query):
+    """Digits of the query when it looks like a phone number (digits, spaces, dashes, +)."""
+    if query and re.fullmatch(r"[\d\s+()-]+", query):
+        return re.sub(r"\D", "", query)
+    return None
+
+
+def _searchable_fields(row):
+    full_name = f"{row['first_name']} {row['last_name']}".strip()
+    return {
+        "name": normalize(full_name),
+        "email": normalize(row["email"]),
+        "phone": re.sub(r"\D", "", row["phone"] or ""),
+    }
+
+
+def word_similarity(query_grams, text):
+    """
+    Best similarity of the query against the whole text or any single word
+    of it (close to pg_trgm's word_similarity(), so "crus" still finds "Dela Cruz").
+    """
+    best = similarity(query_grams, trigrams(text))
+    for word in _WORD_RE.findall(text):
+        best = max(best, similarity(query_grams, trigrams(word)))
+    return best
+
+
+def _score(query, query_grams, fields):
+    """Best similarity across name/email/phone plus prefix / exact bonuses."""
+    best = max(word_similarity(query_grams, value) for value in fields.values())
+
+    phone_query = _phone_query(query)
+    if query in (fields["name"], fields["email"]) or (phone_query and phone_query == fields["phone"]):
+        return best + EXACT_BONUS
+
+    words = fields["name"].split()
+    if (
+        fields["name"].startswith(query)
+        or fields["email"].startswith(query)
+        or any(word.startswith(query) for word in words)
+        or (phone_query and fields["phone"].startswith(phone_query))
+    ):
+        return best + PREFIX_BONUS
+
+    return best
+
+
+# ============================================================================
+# ===== IN-PROCESS N-GRAM INDEX (fallback) =====
+# ============================================================================
+
+class NgramIndex:
+    """Trigram → user_id postings over visitor name, email and phone."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()  # held by the one caller rebuilding
+        self._postings = defaultdict(set)
+        self._docs = {}
+        self._built_at = None
+
+    # ----- maintenance -----
+    def _add(self, row):
+        fields = _searchable_fields(row)
+        self._docs[row["user_id"]] = (row, fields)
+        for value in fields.values():
+            for gram in trigrams(value):
+                self._postings[gram].add(row["user_id"])
+
+    def _remove(self, user_id):
+        entry = self._docs.pop(user_id, None)
+        if not entry:
+            return
+        for value in entry[1].values():
+            for gram in trigrams(value):
+                ids = self._postings.get(gram)
+                if ids:
+                    ids.discard(user_id)
+                    if not ids:
+                        del self._postings[gram]
+
+    def rebuild(self):
+        rows = list(User.objects.values(*RESULT_FIELDS))
+        with self._lock:
+            self._postings = defaultdict(set)
+            self._docs = {}
+            for row in rows:
+                self._add(row)
+            self._built_at = time.monotonic()
+        logger.info(f"Visitor n-gram index rebuilt ({len(rows)} users)")
+
+    def upsert(self, row):
+        with self._lock:
+            if self._built_at is None:
+                return  # not built yet, the first search will load it
+            self._remove(row["user_id"])
+            self._add(row)
+
+    def discard(self, user_id):
+        with self._lock:
+            self._remove(user_id)
+
+    def _is_stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > NGRAM_INDEX_MAX_AGE
+
+    def _ensure_fresh(self):
+        with self._lock:
+            if not self._is_stale():
+                return
+            cold = self._built_at is None
+
+        # Claim the rebuild. An expired index keeps serving while someone
+        # else rebuilds it; an empty one has to wait for the rebuild.
+        if not self._rebuild_lock.acquire(blocking=cold):
+            return
+        try:
+            with self._lock:
+                stale = self._is_stale()  # the previous holder may have just rebuilt it
+            if stale:
+                self.rebuild()
+        finally:
+            self._rebuild_lock.release()
+
+    # ----- querying -----
+    def search(self, query, limit=DEFAULT_LIMIT):
+        self._ensure_fresh()
+
+        query = normalize(query)
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        with self._lock:
+            candidates = set()
+            for gram in query_grams:
+                candidates |= self._postings.get(gram, set())
+            scored = []
+            for user_id in candidates:
+                row, fields = self._docs[user_id]
+                score = _score(query, query_grams, fields)
+                if score >= SIMILARITY_THRESHOLD:
+                    scored.append({**row, "score": score})
+
+        scored.sort(key=lambda r: (-r["score"], r["first_name"], r["last_name"]))
+        return scored[:limit]
+
+
+ngram_index = NgramIndex()
+
+
+def index_users(users):
+    """Add users that were saved without post_save (bulk_create) to the n-gram index."""
+    for user in users:
+        ngram_index.upsert({field: getattr(user, field) for field in RESULT_FIELDS})
+
+
+def user_saved(sender, instance, **kwargs):
+    index_users([instance])
+
+
+def user_deleted(sender, instance, **kwargs):
+    ngram_index.discard(instance.user_id)
+
+
+# ============================================================================
+# ===== POSTGRES pg_trgm BACKEND =====
+# ============================================================================
+
+_pg_trgm_available = {}
+
+
+def has_pg_trgm():
+    """Whether the default database is Postgres with pg_trgm installed (cached per process)."""
+    if connection.vendor != "postgresql":
+        return False
+
+    alias = connection.alias
+    if alias not in _pg_trgm_available:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                _pg_trgm_available[alias] = cursor.fetchone() is not None
+        except Exception as e:
+            logger.error(f"Could not check for pg_trgm: {e}")
+            return False
+    return _pg_trgm_available[alias]
+
+
+def _search_pg_trgm(query, limit):
+    from django.contrib.postgres.lookups import TrigramSimilar, TrigramWordSimilar
+    from django.contrib.postgres.search import TrigramSimilarity, TrigramWordSimilarity
+
+    query = normalize(query)
+    phone_query = _phone_query(query) or query
+
+    qs = User.objects.annotate(
+        name_lower=Lower(full_name_expression()),
+        email_lower=Lower("email"),
+    )
+
+    prefix_match = (
+        Q(name_lower__startswith=query)
+        | Q(name_lower__contains=f" {query}")
+        | Q(email_lower__startswith=query)
+        | Q(phone__startswith=phone_query)
+    )
+    exact_match = Q(name_lower=query) | Q(email_lower=query) | Q(phone=phone_query)
+
+    qs = (
+        qs.filter(
+            prefix_match
+            | TrigramWordSimilar(F("name_lower"), query)
+            | TrigramWordSimilar(F("email_lower"), query)
+            | TrigramSimilar(F("phone"), phone_query)
+        )
+        .annotate(
+            score=Greatest(
+                TrigramWordSimilarity(query, "name_lower"),
+                TrigramWordSimilarity(query, "email_lower"),
+                TrigramSimilarity("phone", phone_query),
+            ) + Case(
+                When(exact_match, then=Value(EXACT_BONUS)),
+                When(prefix_match, then=Value(PREFIX_BONUS)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+        .order_by("-score", "first_name", "last_name")
+        .values(*RESULT_FIELDS, "score")
+    )
+    return list(qs[:limit])
+
+
+# ============================================================================
+# ===== PUBLIC API =====
+# ============================================================================
+
+def search_visitors(query, limit=DEFAULT_LIMIT):
+    """
+    Ranked visitor matches for a partial/misspelled name, email or phone.
+    Returns dicts with user_id, first_name, last_name, email, phone, score
+    (best first, at most `limit`, capped at MAX_LIMIT).
+    """
+    query = (query or "").strip()
+    if not query:
+        return []
+
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    if has_pg_trgm():
+        try:
+            return _search_pg_trgm(query, limit)
+        except Exception as e:
+            logger.error(f"pg_trgm visitor search failed, using in-memory index: {e}")
+
+    return ngram_index.search(query, limit)
@@ -1,3 +1,258 @@
-from django.test import TestCase
+import threading
+import time
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from citu_campuspass.query_budget import budget_for
+from dashboard_app.models import Visit
+from login_app.models import FrontDeskStaff
+from register_app.models import User
+
+from . import search, views
+
+
+class VisitorSearchBudgetTests(TestCase):
+    """visitor_search against QUERY_BUDGETS: the query count must not grow with matches."""
+
+    @classmethod
+    def setUpTestData(cls):
+        FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+        today = date.today()
+        visits = []
+        for i in range(30):
+            user = User.objects.create(
+                first_name=f"Maria{i}", last_name="Santos", email=f"maria{i}@example.com",
+                phone=f"0917{i:07d}", password="x", visitor_type="Guest",
+            )
+            for days in range(4):
+                visits.append(Visit(
+                    user_email=user.email, user_id=user.user_id, code=f"CIT-S{i:02d}{days}",
+                    purpose="Enrollment", department="Registrar",
+                    visit_date=today + timedelta(days=days - 2),
+                    status="Upcoming" if days >= 2 else "Completed",
+                ))
+        Visit.objects.bulk_create(visits)
+
+    def setUp(self):
+        session = self.client.session
+        session["staff_username"] = "sam"
+        session["staff_first_name"] = "Sam"
+        session.save()
+
+    def test_search(self):
+        max_queries, _ = budget_for("visitor_search_app:search")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("visitor_search_app:search"), {"query": "Santos"})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(response.context["results"]), 1)
+        self.assertLessEqual(len(queries), max_queries)
+
+    def test_email_case_variants_are_one_visitor(self):
+        user = User.objects.create(
+            first_name="Ana", last_name="Reyes", email="Ana.Reyes@example.com",
+            phone="09189999999", password="x", visitor_type="Guest",
+        )
+        today = date.today()
+        Visit.objects.bulk_create([
+            Visit(
+                user_email="Ana.Reyes@example.com", user_id=user.user_id, code="CIT-ANA1",
+                purpose="Enrollment", department="Registrar",
+                visit_date=today - timedelta(days=3), status="Completed",
+            ),
+            # Walk-in pass typed in lowercase
+            Visit(
+                user_email="ana.reyes@example.com", code="CIT-ANA2",
+                purpose="Enrollment", department="Registrar",
+                visit_date=today + timedelta(days=1), status="Upcoming",
+            ),
+        ])
+
+        response = self.client.get(reverse("visitor_search_app:search"), {"query": "ana.reyes@example.com"})
+        [result] = [r for r in response.context["results"] if r["user_email"].lower() == "ana.reyes@example.com"]
+        self.assertEqual(result["total_visits"], 2)
+        self.assertEqual(result["current_visit"]["code"], "CIT-ANA2")
+        self.assertEqual(len(result["visit_history"]), 2)
+
+
+class VisitorAutocompleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+        for i in range(views.AUTOCOMPLETE_LIMIT + 2):
+            User.objects.create(
+                first_name=f"Rosa{i}", last_name="Santos", email=f"rosa{i}@example.com",
+                phone=f"0918{i:07d}", password="x", visitor_type="Guest",
+            )
+        Visit.objects.create(
+            user_email="rosa0@example.com", code="CIT-ROSA0", purpose="Enrollment",
+            department="Registrar", visit_date=date.today() + timedelta(days=1), status="Upcoming",
+        )
+
+    def setUp(self):
+        cache.clear()
+        patchers = [
+            mock.patch.object(search, "ngram_index", search.NgramIndex()),
+            mock.patch.object(search, "has_pg_trgm", return_value=False),
+            mock.patch.object(search, "search_visitors", wraps=search.search_visitors),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        session = self.client.session
+        session["staff_username"] = "sam"
+        session.save()
+
+    def autocomplete(self, q):
+        response = self.client.get(reverse("visitor_search_app:autocomplete"), {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_staff_only(self):
+        self.client.cookies.clear()
+        response = self.client.get(reverse("visitor_search_app:autocomplete"), {"q": "rosa"})
+        self.assertEqual(response.status_code, 403)
+
+    def test_short_prefix_is_not_searched(self):
+        self.assertEqual(self.autocomplete(" r "), [])
+        search.search_visitors.assert_not_called()
+
+    def test_results_are_limited_and_shaped(self):
+        results = self.autocomplete("santos")
+        self.assertEqual(len(results), views.AUTOCOMPLETE_LIMIT)
+        self.assertTrue(all(set(r) == {"name", "email", "status", "code"} for r in results))
+
+        rosa = next(r for r in self.autocomplete("rosa0@example.com") if r["email"] == "rosa0@example.com")
+        self.assertEqual(rosa, {
+            "name": "Rosa0 Santos", "email": "rosa0@example.com", "status": "Upcoming", "code": "CIT-ROSA0",
+        })
+
+    def test_normalized_prefix_is_served_from_the_cache(self):
+        with mock.patch.object(views, "cache", wraps=cache) as cached:
+            first = self.autocomplete("Santos")
+        cached.set.assert_called_once_with(mock.ANY, first, views.AUTOCOMPLETE_CACHE_TTL)
+
+        with mock.patch.object(views, "_autocomplete_results") as lookup:
+            self.assertEqual(self.autocomplete("  SANTOS "), first)
+        lookup.assert_not_called()
+        search.search_visitors.assert_called_once()
+
+
+class NgramSearchTests(TestCase):
+    """The in-process fallback index (SQLite, or Postgres without pg_trgm)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for first, last, email, phone in [
+            ("Maria", "Cruz", "maria.cruz@example.com", "09171110000"),
+            ("Mariano", "Lopez", "mlopez@example.com", "09172220000"),
+            ("Juan", "Dela Cruz", "juan@example.com", "09173330000"),
+            ("Pedro", "Santos", "pedro@example.com", "09174440000"),
+        ]:
+            User.objects.create(first_name=first, last_name=last, email=email, phone=phone,
+                                password="x", visitor_type="Guest")
+
+    def setUp(self):
+        patchers = [
+            mock.patch.object(search, "ngram_index", search.NgramIndex()),
+            mock.patch.object(search, "has_pg_trgm", return_value=False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def names(self, query, **kwargs):
+        return [f"{r['first_name']} {r['last_name']}" for r in search.search_visitors(query, **kwargs)]
+
+    def test_exact_then_prefix_then_fuzzy(self):
+        results = search.search_visitors("maria cruz")
+        self.assertEqual(f"{results[0]['first_name']} {results[0]['last_name']}", "Maria Cruz")
+        self.assertGreaterEqual(results[0]["score"], search.EXACT_BONUS)
+
+        names = self.names("mari")
+        self.assertEqual(names[:2], ["Maria Cruz", "Mariano Lopez"])
+        self.assertTrue(all(r["score"] >= search.PREFIX_BONUS for r in search.search_visitors("mari")[:2]))
+
+    def test_misspelled_word_is_found(self):
+        self.assertIn("Juan Dela Cruz", self.names("crus"))
+
+    def test_below_threshold_is_dropped(self):
+        self.assertEqual(self.names("qwxz"), [])
+        self.assertEqual(self.names("   "), [])
+
+    def test_phone_prefix(self):
+        self.assertEqual(self.names("0917-333"), ["Juan Dela Cruz"])
+
+    def test_limit_is_capped(self):
+        self.assertEqual(len(self.names("example", limit=2)), 2)
+        self.assertLessEqual(len(self.names("example", limit=1000)), search.MAX_LIMIT)
+
+    def test_failing_pg_trgm_falls_back_to_the_index(self):
+        with mock.patch.object(search, "has_pg_trgm", return_value=True), \
+                mock.patch.object(search, "_search_pg_trgm", side_effect=RuntimeError("no trgm")):
+            self.assertIn("Pedro Santos", self.names("pedro"))
+
+    def test_saved_and_deleted_users_are_kept_in_sync(self):
+        self.names("warm up")
+        user = User.objects.create(first_name="Rosa", last_name="Reyes", email="rosa@example.com",
+                                   phone="09175550000", password="x", visitor_type="Guest")
+        self.assertEqual(self.names("rosa"), ["Rosa Reyes"])
+        user.delete()
+        self.assertEqual(self.names("rosa"), [])
+
+    def test_bulk_created_users_are_indexed(self):
+        from manage_visit_records_app.services import preregister_event
+
+        self.names("warm up")
+        guests = [{"line": 2, "first_name": "Lito", "last_name": "Bautista", "email": "lito@example.com",
+                   "phone": "09176660000", "visitor_type": "Guest"}]
+        with self.captureOnCommitCallbacks(execute=True):
+            preregister_event(guests, "Open House", "Registrar", date.today() + timedelta(days=1), "Ada (ada)")
+        self.assertEqual(self.names("lito"), ["Lito Bautista"])
+
+
+class NgramRebuildTests(SimpleTestCase):
+    """Concurrent searches past NGRAM_INDEX_MAX_AGE rebuild the index once."""
+
+    def race(self, index, callers=8):
+        calls = []
+        started = threading.Barrier(callers)
+
+        def slow_rebuild():
+            calls.append(1)
+            time.sleep(0.05)
+            index._built_at = time.monotonic()
+
+        def searcher():
+            started.wait()
+            index._ensure_fresh()
+
+        with mock.patch.object(index, "rebuild", side_effect=slow_rebuild):
+            threads = [threading.Thread(target=searcher) for _ in range(callers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return len(calls)
+
+    def test_expired_index_is_rebuilt_once(self):
+        index = search.NgramIndex()
+        index._built_at = time.monotonic() - search.NGRAM_INDEX_MAX_AGE - 1
+        self.assertEqual(self.race(index), 1)
+
+    def test_cold_index_is_built_once(self):
+        index = search.NgramIndex()
+        self.assertEqual(self.race(index), 1)
+        self.assertIsNotNone(index._built_at)
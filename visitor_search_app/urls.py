@@ -10,4 +10,5 @@ app_name = 'visitor_search_app'
 urlpatterns = [
     path('search/', views.visitor_search, name='search'),
     path('detail/', views.visitor_detail, name='detail'),
+    path('autocomplete/', views.visitor_autocomplete, name='autocomplete'),
 ]
\ No newline at end of file
@@ -5,30 +5,96 @@ Handles visitor search and detailed visitor information
 
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.db.models import Q
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.db.models import (
+    Case, Count, DateField, F, IntegerField, Max, Min, Q, Value, When, Window,
+)
+from django.db.models.functions import RowNumber
 import os
 from dotenv import load_dotenv
 from datetime import date, timedelta
+from math import ceil
+import hashlib
 import logging
 
 # Import Django models
+from citu_campuspass.db_router import replica_reads
 from dashboard_app.models import Visit
-from register_app.models import User
+from dashboard_app.services import VISIT_FIELDS, visit_rows
+from login_app.decorators import staff_required
+from register_app.models import User, normalize_email
+from . import search
 
 # Setup
 logger = logging.getLogger(__name__)
 
-def staff_required(view_func):
-    """Decorator to ensure only staff can access"""
-    def wrapper(request, *args, **kwargs):
-        if 'staff_username' not in request.session:
-            messages.warning(request, "Please log in as staff to access this page.")
-            return redirect('login_app:login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+# Number of recent visits shown under each search result
+HISTORY_PREVIEW = 3
+
+# Maximum number of visitors matched per search
+SEARCH_LIMIT = 20
+
+# Rows per page of a visitor's history
+HISTORY_PAGE_SIZE = 25
+
+# Typeahead settings
+AUTOCOMPLETE_MIN_CHARS = 2
+AUTOCOMPLETE_LIMIT = 8
+AUTOCOMPLETE_CACHE_TTL = 30  # seconds
+
+
+def _next_visit_rank(today):
+    """
+    Window that ranks each visitor's visits so rank 1 is the visit to show:
+    1) Active today, 2) earliest upcoming (today or later, not Completed),
+    3) otherwise the most recent visit.
+    """
+    bucket = Case(
+        When(Q(visit_date=today, status="Active"), then=Value(0)),
+        When(Q(visit_date__gte=today) & ~Q(status="Completed"), then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    upcoming_date = Case(
+        When(Q(visit_date__gte=today) & ~Q(status="Completed"), then=F("visit_date")),
+        default=None,
+        output_field=DateField(),
+    )
+    return Window(
+        RowNumber(),
+        partition_by=[F("user_email_norm")],
+        order_by=[
+            bucket.asc(),
+            upcoming_date.asc(nulls_last=True),
+            F("visit_date").desc(),
+            F("visit_id").desc(),
+        ],
+    )
+
+
+def _display_status(next_visit, today):
+    """Badge shown for a visitor's next visit (status wins over date)."""
+    status = next_visit["status"]
+
+    if status == "Active":
+        return "Active"
+    elif status == "Completed":
+        return "Completed"
+    elif status in ["Cancelled", "Expired"]:
+        return status  # or map to your own label
+
+    # Only fall back to date logic if it's not a terminal state
+    if next_visit["visit_date"] > today:
+        return "Upcoming"
+    elif next_visit["visit_date"] == today:
+        # could be "Upcoming" or "Active" based on your rules
+        return "Upcoming"
+    return status or "Completed"
 
 
 @staff_required
+@replica_reads()
 def visitor_search(request):
     """Search visitors and show their next valid visit (upcoming or active)."""
 
@@ -47,136 +113,98 @@ def visitor_search(request):
 
     results = []
     today = date.today()
+    q = normalize_email(query)
 
-    # Load users and visits efficiently
-    users = User.objects.all()
-    visits = Visit.objects.all()
-
-    # Map email → user info
+    # --- STEP 1: MATCH SEARCH QUERY (NAME, EMAIL, PHONE) ---
+    # Ranked prefix / fuzzy match; exact name or email hits rank first.
     users_dict = {
-        u.email.lower(): {
-            "first_name": u.first_name,
-            "last_name": u.last_name,
-            "full_name": f"{u.first_name} {u.last_name}".strip()
+        normalize_email(u["email"]): {
+            "first_name": u["first_name"],
+            "last_name": u["last_name"],
+            "full_name": f"{u['first_name']} {u['last_name']}".strip(),
+            "score": u["score"],
         }
-        for u in users
+        for u in search.search_visitors(query, limit=SEARCH_LIMIT)
     }
 
-    # --- STEP 1: MATCH SEARCH QUERY (NAME + EMAIL ONLY) ---
-    q = query.lower()
-    matched = []
-
-    for v in visits:
-        email = (v.user_email or "").lower()
-        name = users_dict.get(email, {}).get("full_name", "").lower()
-
-        # 🔒 EXACT (case-insensitive) MATCH ONLY
-        # - email must exactly match the typed query
-        # - OR full name must exactly match the typed query
-        if email == q or name == q:
-            matched.append({
-                "visit_id": v.visit_id,
-                "user_email": v.user_email,
-                "code": v.code,
-                "purpose": v.purpose,
-                "department": v.department,
-                "visit_date": v.visit_date,
-                "start_time": v.start_time,
-                "end_time": v.end_time,
-                "status": v.status,
-                "created_at": v.created_at,
-            })
+    # Visits by a matched user, or walk-ins whose email equals the query
+    emails = set(users_dict) | {q}
 
     # --- STEP 2: APPLY FILTERS ---
+    visits = Visit.objects.filter(user_email_norm__in=emails)
+
     if filter_type == "active":
-        matched = [v for v in matched if v["status"] == "Active"]
+        visits = visits.filter(status="Active")
 
     elif filter_type == "today":
-        matched = [v for v in matched if v["visit_date"] == today]
+        visits = visits.filter(visit_date=today)
 
     elif filter_type == "week":
         monday = today - timedelta(days=today.weekday())
-        matched = [v for v in matched if v["visit_date"] >= monday]
+        visits = visits.filter(visit_date__gte=monday)
+
+    # --- STEP 3: GROUP BY USER + SELECT NEXT VISIT (in SQL) ---
+    # Only the next visit and the latest few rows per visitor leave the DB.
+    visits = (
+        visits
+        .annotate(
+            next_rank=_next_visit_rank(today),
+            history_rank=Window(
+                RowNumber(),
+                partition_by=[F("user_email_norm")],
+                order_by=[F("visit_date").desc(), F("visit_id").desc()],
+            ),
+            total_visits=Window(Count("visit_id"), partition_by=[F("user_email_norm")]),
+        )
+        .filter(Q(next_rank=1) | Q(history_rank__lte=HISTORY_PREVIEW))
+        .order_by("user_email_norm", "history_rank")
+    )
 
-    # --- STEP 3: GROUP BY USER (email) ---
+    # Keyed by the normalized email, the same key the windows partition by:
+    # "Ana@x.com" and "ana@x.com" visits are one visitor
     grouped = {}
 
-    for v in matched:
-        email = v["user_email"]
+    for v in visit_rows(visits, fields=VISIT_FIELDS + ("next_rank", "history_rank", "total_visits")):
+        email = normalize_email(v["user_email"])
 
         if email not in grouped:
-            uinfo = users_dict.get(email.lower(), {})
+            uinfo = users_dict.get(email, {})
             grouped[email] = {
-                "user_email": email,
+                "user_email": v["user_email"],
                 "visitor_name": uinfo.get("full_name", email.split("@")[0].title()),
                 "first_name": uinfo.get("first_name", ""),
                 "last_name": uinfo.get("last_name", ""),
-                "visits": []
+                "next_visit": None,
+                "visits": [],
+                "total_visits": v["total_visits"],
             }
 
-        grouped[email]["visits"].append(v)
+        if v["next_rank"] == 1:
+            grouped[email]["next_visit"] = v
+        if v["history_rank"] <= HISTORY_PREVIEW:
+            grouped[email]["visits"].append(v)
 
-    # --- STEP 4: SELECT NEXT VISIT + DETERMINE STATUS ---
+    # --- STEP 4: DETERMINE STATUS ---
     for email, data in grouped.items():
-        visit_list = sorted(data["visits"], key=lambda x: x["visit_date"])
-
-        today = date.today()
-
-        # 1️⃣ PRIORITY: Active today
-        active_today = next(
-            (v for v in visit_list if v["visit_date"] == today and v["status"] == "Active"),
-            None
-        )
-
-        # 2️⃣ Next: Upcoming (today or future) and NOT completed
-        upcoming = next(
-            (v for v in visit_list
-            if v["visit_date"] >= today and v["status"] != "Completed"),
-            None
-        )
-
-        # 3️⃣ If NO valid next visit → show nothing (all completed)
-        next_visit = active_today or upcoming
-
-        # If everything was completed, fallback to None
-        if not next_visit:
-            # OPTIONAL: show last completed visit instead of None
-            next_visit = max(visit_list, key=lambda x: x["visit_date"])
-
-        # Determine final display status (status wins over date)
-        status = next_visit["status"]
-
-        if status == "Active":
-            display_status = "Active"
-        elif status == "Completed":
-            display_status = "Completed"
-        elif status in ["Cancelled", "Expired"]:
-            display_status = status  # or map to your own label
-        else:
-            # Only fall back to date logic if it's not a terminal state
-            if next_visit["visit_date"] > today:
-                display_status = "Upcoming"
-            elif next_visit["visit_date"] == today:
-                # could be "Upcoming" or "Active" based on your rules
-                display_status = "Upcoming"
-            else:
-                display_status = status or "Completed"
+        next_visit = data["next_visit"]
+        display_status = _display_status(next_visit, today)
 
         results.append({
-            "user_email": email,
+            "score": users_dict.get(email, {}).get("score", search.EXACT_BONUS),
+            "user_email": data["user_email"],
             "visitor_name": data["visitor_name"],
             "first_name": data["first_name"],
             "last_name": data["last_name"],
             "current_visit": next_visit,
             "current_status": display_status,
-            "visit_history": sorted(data["visits"], key=lambda x: x["visit_date"], reverse=True),
-            "total_visits": len(data["visits"])
+            "visit_history": data["visits"],
+            "total_visits": data["total_visits"]
         })
 
 
-    # Sort results by status priority
+    # Sort results by match rank, then status priority
     priority = {"Active": 0, "Upcoming": 1, "Completed": 2, "Expired": 3}
-    results.sort(key=lambda r: priority.get(r["current_status"], 99))
+    results.sort(key=lambda r: (-r["score"], priority.get(r["current_status"], 99)))
 
     return render(request, "visitor_search_app/visitor_search.html", {
         "staff_first_name": staff_first_name,
@@ -185,7 +213,63 @@ def visitor_search(request):
         "results": results
     })
 
+def _autocomplete_results(query):
+    """Top matches with the status of each visitor's next visit (2 queries)."""
+    users = search.search_visitors(query, limit=AUTOCOMPLETE_LIMIT)
+    if not users:
+        return []
+
+    today = date.today()
+    next_visits = (
+        Visit.objects
+        .filter(user_email_norm__in=[normalize_email(u["email"]) for u in users])
+        .annotate(next_rank=_next_visit_rank(today))
+        .filter(next_rank=1)
+        .values("user_email_norm", "code", "status", "visit_date")
+    )
+    next_by_email = {v["user_email_norm"]: v for v in next_visits}
+
+    results = []
+    for u in users:
+        next_visit = next_by_email.get(normalize_email(u["email"]))
+        results.append({
+            "name": f"{u['first_name']} {u['last_name']}".strip(),
+            "email": u["email"],
+            "status": _display_status(next_visit, today) if next_visit else None,
+            "code": next_visit["code"] if next_visit else None,
+        })
+    return results
+
+
+@replica_reads()
+def visitor_autocomplete(request):
+    """
+    JSON typeahead for the front desk search box.
+    Results are cached briefly per (normalized) prefix so fast typists and
+    several desks searching the same name share one lookup.
+    """
+    if 'staff_username' not in request.session:
+        return JsonResponse({"error": "Unauthorized"}, status=403)
+
+    query = search.normalize(request.GET.get("q", ""))
+    if len(query) < AUTOCOMPLETE_MIN_CHARS:
+        return JsonResponse({"results": []})
+
+    cache_key = "visitor_autocomplete:" + hashlib.md5(query.encode()).hexdigest()
+    results = cache.get(cache_key)
+
+    if results is None:
+        try:
+            results = _autocomplete_results(query)
+        except Exception as e:
+            logger.error(f"Visitor autocomplete failed: {str(e)}")
+            return JsonResponse({"error": "Search failed"}, status=500)
+        cache.set(cache_key, results, AUTOCOMPLETE_CACHE_TTL)
+
+    return JsonResponse({"results": results})
+
 @staff_required
+@replica_reads()
 def visitor_detail(request):
     """Show detailed information about a specific visitor"""
     staff_first_name = request.session.get('staff_first_name', 'Staff')
@@ -198,38 +282,46 @@ def visitor_detail(request):
     try:
         # Get user information using Django ORM
         try:
-            user = User.objects.get(email=visitor_email)
+            user = User.objects.get(email_norm=normalize_email(visitor_email))
             first_name = user.first_name
             last_name = user.last_name
         except User.DoesNotExist:
             messages.error(request, "Visitor not found in system.")
             return redirect('visitor_search_app:search')
         
-        # Get all visits for this visitor using Django ORM
-        visits = Visit.objects.filter(user_email=visitor_email)
-        
-        if not visits:
+        visits = Visit.objects.filter(user_email_norm=normalize_email(visitor_email))
+
+        # Calculate statistics over ALL visits in one aggregate query
+        stats = visits.aggregate(
+            total_visits=Count('visit_id'),
+            completed_visits=Count('visit_id', filter=Q(status='Completed')),
+            last_visit_date=Max('visit_date'),
+            member_since=Min('visit_date'),  # EARLIEST visit for "Member Since"
+        )
+        total_visits = stats['total_visits']
+
+        if not total_visits:
             messages.warning(request, "No visits found for this visitor.")
             # Still show the visitor profile even if no visits
-        
-        # Convert visits to list of dictionaries for template
-        visits_list = []
-        for visit in visits:
-            visits_list.append({
-                'visit_id': visit.visit_id,
-                'user_email': visit.user_email,
-                'code': visit.code,
-                'purpose': visit.purpose,
-                'department': visit.department,
-                'visit_date': visit.visit_date,
-                'start_time': visit.start_time,
-                'end_time': visit.end_time,
-                'status': visit.status,
-                'created_at': visit.created_at
-            })
-        
-                # Sort visits by date descending (latest first)
-        visits_list.sort(key=lambda x: x.get('visit_date', ''), reverse=True)
+
+        # Latest Active/Upcoming visit
+        current_rows = visit_rows(
+            visits.filter(status__in=['Active', 'Upcoming']).order_by('-visit_date', '-visit_id'),
+            limit=1,
+        )
+        current_visit = current_rows[0] if current_rows else None
+
+        # One page of history (latest first)
+        total_pages = max(1, ceil(total_visits / HISTORY_PAGE_SIZE))
+        try:
+            page = min(max(int(request.GET.get('page', 1)), 1), total_pages)
+        except ValueError:
+            page = 1
+        offset = (page - 1) * HISTORY_PAGE_SIZE
+
+        visits_list = visit_rows(
+            visits.order_by('-visit_date', '-visit_id')[offset:offset + HISTORY_PAGE_SIZE]
+        ) if total_visits else []
 
         # Mark which visits belong to the current month
         today = date.today()
@@ -241,22 +333,6 @@ def visitor_detail(request):
                 and vd.month == today.month
             )
 
-        # Calculate statistics (still based on ALL visits)
-        total_visits = len(visits_list)
-        completed_visits = len([v for v in visits_list if v.get('status') == 'Completed'])
-        current_visit = next(
-            (v for v in visits_list if v.get('status') in ['Active', 'Upcoming']),
-            None
-        )
-        last_visit_date = visits_list[0].get('visit_date') if visits_list else None
-
-        # EARLIEST visit for "Member Since"
-        member_since = None
-        if visits_list:
-            dates_only = [v['visit_date'] for v in visits_list if v.get('visit_date')]
-            if dates_only:
-                member_since = min(dates_only)
-
         context = {
             'staff_first_name': staff_first_name,
             'visitor_email': visitor_email,
@@ -264,11 +340,15 @@ def visitor_detail(request):
             'last_name': last_name,
             'visitor_name': f"{first_name} {last_name}",  # Also provide combined for fallback
             'total_visits': total_visits,
-            'completed_visits': completed_visits,
+            'completed_visits': stats['completed_visits'],
             'current_visit': current_visit,
-            'last_visit_date': last_visit_date,
-            'member_since': member_since,          # ✅ new
+            'last_visit_date': stats['last_visit_date'],
+            'member_since': stats['member_since'],          # ✅ new
             'visit_history': visits_list,
+            'page': page,
+            'total_pages': total_pages,
+            'has_previous': page > 1,
+            'has_next': page < total_pages,
         }
         
         return render(request, 'visitor_search_app/visitor_detail.html', context)
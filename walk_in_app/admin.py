@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import WalkInRequest
+
+
+@admin.register(WalkInRequest)
+class WalkInRequestAdmin(admin.ModelAdmin):
+    list_display = ('visit_code', 'key', 'created_at')
+    search_fields = ('visit_code', 'key')
+    ordering = ('-created_at',)
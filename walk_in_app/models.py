@@ -1,3 +1,19 @@
 from django.db import models
 
-# Create your models here.
+
+class WalkInRequest(models.Model):
+    """
+    Idempotency key of one walk-in form submission and the pass it created.
+    A resubmitted form (double click, browser retry on slow Wi-Fi) carries
+    the same key and is answered with this pass instead of a second one.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    visit_id = models.BigIntegerField()
+    visit_code = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'walk_in_requests'
+
+    def __str__(self):
+        return f"{self.key} -> {self.visit_code}"
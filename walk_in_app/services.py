@@ -0,0 +1,453 @@
+# walk_in_app/services.py
+"""
+Walk-in registration: identity resolution and pass creation.
+
+The front desk talks to the database over a slow link, so the flow is kept
+to two round trips plus one transaction:
+
+  * lookup()      one UNION query returns the users matching the email or
+                  phone, the email's Active passes and, when the form's
+                  idempotency key was already used, the pass it created.
+  * match_user()  checks the submitted details against those rows (no I/O).
+  * create_pass() reserves the department slot and inserts the visit, its
+                  system log and the idempotency key in one transaction.
+
+A double-submitted form carries the same key as the first POST and gets the
+first pass back instead of a second one; the unique key column makes that
+hold even when both requests arrive at the same time.
+
+Groups (school tours, delegations) go through the same steps with a whole
+roster: lookup_group() is still one query and create_group_passes()
+bulk-inserts every visit, log and key in one transaction.
+"""
+import csv
+import io
+import logging
+import re
+
+from django.db import IntegrityError, transaction
+from django.db.models import CharField, DateTimeField, Q, Value
+
+from book_visit_app import capacity
+from dashboard_app import visit_codes
+from dashboard_app.models import SystemLog, Visit
+from register_app.models import User, normalize_email, normalize_phone
+
+from .models import WalkInRequest
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_KEY_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class WalkInError(Exception):
+    """The walk-in can't be registered; the message is shown to the staff."""
+
+
+class WalkInLookup:
+    """Everything lookup() / lookup_group() found."""
+
+    def __init__(self):
+        self.users = []           # User rows matching the email(s) or phone(s)
+        self.active = []          # (user_email_norm, code) of Active passes
+        self.replays = []         # WalkInPass rows already created for the key
+
+    @property
+    def active_codes(self):
+        return [code for _, code in self.active]
+
+    @property
+    def replay(self):
+        return self.replays[0] if self.replays else None
+
+    def for_member(self, email, phone):
+        """The part of a group lookup that concerns one roster member."""
+        email_norm = normalize_email(email)
+        phone_norm = normalize_phone(phone)
+        found = WalkInLookup()
+        found.users = [
+            u for u in self.users
+            if normalize_email(u.email) == email_norm or normalize_phone(u.phone) == phone_norm
+        ]
+        found.active = [a for a in self.active if a[0] == email_norm]
+        return found
+
+
+class WalkInPass:
+    """A created (or replayed) walk-in pass."""
+
+    def __init__(self, visit_id, code, created_at, replayed=False):
+        self.visit_id = visit_id
+        self.code = code
+        self.created_at = created_at
+        self.replayed = replayed
+
+
+def clean_idempotency_key(key):
+    """The form's idempotency key, or None when missing/malformed."""
+    key = (key or "").strip().lower()
+    return key if IDEMPOTENCY_KEY_RE.match(key) else None
+
+
+# ============================================================================
+# ===== LOOKUP (one query) =====
+# ============================================================================
+
+def _lookup(email_norms, phone_norms, replay=None):
+    """
+    Resolve identity, active-pass conflict and idempotency replay in one
+    query. Every branch selects the same columns:
+
+        (kind, id, first_name, last_name, email, phone, code, created_at)
+    """
+    text = Value(None, output_field=CharField())
+    timestamp = Value(None, output_field=DateTimeField())
+
+    users = User.objects.filter(
+        Q(email_norm__in=email_norms) | Q(phone_norm__in=phone_norms)
+    ).values_list(
+        Value("user"), "user_id", "first_name", "last_name", "email", "phone", text, timestamp,
+    )
+    active = Visit.objects.filter(
+        user_email_norm__in=email_norms, status="Active"
+    ).values_list(
+        Value("active"), "visit_id", text, text, "user_email_norm", text, "code", "created_at",
+    )
+    query = users.union(active, all=True)
+
+    if replay is not None:
+        query = query.union(replay.values_list(
+            Value("replay"), "visit_id", text, text, "key", text, "visit_code", "created_at",
+        ), all=True)
+
+    result = WalkInLookup()
+    replays = []
+    for kind, pk, first_name, last_name, email, phone, code, created_at in query:
+        if kind == "user":
+            result.users.append(User(
+                user_id=pk,
+                first_name=first_name,
+                last_name=last_name,
+                email=email,
+                phone=phone,
+            ))
+        elif kind == "active":
+            result.active.append((email, code))
+        else:
+            replays.append((email, WalkInPass(pk, code, created_at, replayed=True)))
+
+    # Group keys end in the member's roster position
+    result.replays = [p for _, p in sorted(replays, key=lambda r: r[0])]
+    return result
+
+
+def lookup(email, phone, idempotency_key=None):
+    """One walk-in: see _lookup()."""
+    replay = WalkInRequest.objects.filter(key=idempotency_key) if idempotency_key else None
+    return _lookup([normalize_email(email)], [normalize_phone(phone)], replay)
+
+
+def match_user(found, first_name, last_name, email, phone):
+    """
+    Pick the registered user the walk-in belongs to (None for a new
+    visitor). Raises WalkInError when the details conflict with our records
+    or the visitor already holds an Active pass.
+    """
+    def norm(s):
+        return (s or "").strip().lower()
+
+    email_norm = normalize_email(email)
+    phone_norm = normalize_phone(phone)
+
+    user_by_email = next((u for u in found.users if normalize_email(u.email) == email_norm), None)
+    users_by_phone = [u for u in found.users if normalize_phone(u.phone) == phone_norm]
+
+    # If same phone is used by multiple users -> hard stop
+    if len(users_by_phone) > 1:
+        raise WalkInError(
+            "This mobile number is associated with multiple registered users. "
+            "Please verify the visitor’s information with the registrar before "
+            "proceeding with walk-in registration."
+        )
+
+    user_by_phone = users_by_phone[0] if users_by_phone else None
+
+    # If email and phone both match but point to different accounts -> hard stop
+    if user_by_email and user_by_phone and user_by_email.user_id != user_by_phone.user_id:
+        raise WalkInError(
+            "The provided email and mobile number are registered under "
+            "different user records. Please verify the visitor’s details."
+        )
+
+    # Use whichever matched (email preferred, then phone)
+    existing_user = user_by_email or user_by_phone
+
+    # If we found a registered user, all fields must match that record
+    if existing_user:
+        mismatches = []
+        if norm(existing_user.first_name) != norm(first_name):
+            mismatches.append("first name")
+        if norm(existing_user.last_name) != norm(last_name):
+            mismatches.append("last name")
+        if normalize_email(existing_user.email) != email_norm:
+            mismatches.append("email")
+        db_phone = normalize_phone(existing_user.phone)
+        if db_phone and phone_norm and db_phone != phone_norm:
+            mismatches.append("mobile number")
+
+        if mismatches:
+            raise WalkInError(
+                "This visitor is already registered. "
+                f"The {', '.join(mismatches)} you entered do not match our records. "
+                "Please verify the information with the visitor."
+            )
+
+    # Block if visitor already has an Active pass
+    if found.active_codes:
+        raise WalkInError(
+            "This visitor already has an active campus pass "
+            f"(Code: {found.active_codes[0]}). "
+            "They must use their existing pass or be checked out before "
+            "registering another walk-in visit."
+        )
+
+    return existing_user
+
+
+# ============================================================================
+# ===== CREATE (one transaction) =====
+# ============================================================================
+
+def create_pass(existing_user, first_name, last_name, email, department, purpose,
+                actor, now, idempotency_key=None):
+    """
+    Insert an Active walk-in visit for today together with its system log
+    and idempotency key. Returns a WalkInPass; when the key was already
+    used by a concurrent submission the first pass is returned instead.
+
+    Raises WalkInError when the department is full or the registered
+    visitor already has an open visit today.
+    """
+    visit = Visit(
+        user_email=email,
+        purpose=purpose,
+        department=department,
+        visit_date=now.date(),
+        start_time=now.time(),
+        end_time=None,     # Will be set on check-out
+        status="Active",   # Automatically checked in
+        user_id=existing_user.user_id if existing_user else None,
+    )
+    purpose_prefix = purpose[:3].upper() if purpose else "WLK"
+
+    try:
+        with transaction.atomic():
+            # Today's department quota is shared with online bookings
+            capacity.reserve_slot(department, visit.visit_date)
+            visit_codes.save_with_code(visit, purpose_prefix)
+            SystemLog.objects.create(
+                actor=actor,
+                action_type="Walk-In Registration",
+                description=(
+                    f"Registered walk-in visitor {first_name} {last_name} ({email}) "
+                    f"for {purpose} at {department}. Visit code: {visit.code}"
+                ),
+                actor_role="Staff",
+                created_at=now,  # stored as PH time
+            )
+            if idempotency_key:
+                # Inserted last: a concurrent duplicate blocks on the unique
+                # key here and rolls back everything above.
+                WalkInRequest.objects.create(
+                    key=idempotency_key,
+                    visit_id=visit.visit_id,
+                    visit_code=visit.code,
+                )
+    except capacity.DepartmentFull:
+        raise WalkInError(f"{department} has reached its visitor capacity for today.")
+    except IntegrityError:
+        if idempotency_key:
+            replay = WalkInRequest.objects.filter(key=idempotency_key).first()
+            if replay:
+                logger.info(f"Walk-in resubmitted, returning pass {replay.visit_code}")
+                return WalkInPass(replay.visit_id, replay.visit_code, replay.created_at, replayed=True)
+        # visits_one_open_per_day: the registered visitor already has
+        # an Upcoming/Active visit today
+        raise WalkInError(
+            "This visitor already has a booking for today. "
+            "Please check them in using their existing visit code."
+        )
+
+    return WalkInPass(visit.visit_id, visit.code, now)
+
+
+# ============================================================================
+# ===== GROUP WALK-IN (tours, delegations) =====
+# ============================================================================
+
+GROUP_MAX_SIZE = 100
+PHONE_RE = re.compile(r"^09\d{9}$")
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def group_member_key(idempotency_key, position):
+    """Idempotency key of one roster member: '<form key>:<position>'."""
+    return f"{idempotency_key}:{position:03d}"
+
+
+def parse_roster(text):
+    """
+    Read a pasted roster, one visitor per line:
+
+        first name, last name, email, mobile number
+
+    A header line is skipped. Returns (members, errors); each error is
+    {'line', 'error'}. Duplicate emails/numbers within the roster are errors.
+    """
+    members, errors = [], []
+    seen_emails, seen_phones = set(), set()
+
+    rows = csv.reader(io.StringIO(text or ""), skipinitialspace=True)
+    for line, row in enumerate(rows, start=1):
+        cells = [c.strip() for c in row]
+        if not any(cells):
+            continue
+        if line == 1 and cells[0].lower().replace(" ", "_") == "first_name":
+            continue
+
+        if len(cells) != 4 or not all(cells):
+            errors.append({'line': line, 'error': "Expected: first name, last name, email, mobile number."})
+            continue
+
+        first_name, last_name, email, phone = cells
+        if not EMAIL_RE.match(email):
+            errors.append({'line': line, 'error': f"Invalid email address: {email}"})
+            continue
+        if not PHONE_RE.match(phone):
+            errors.append({'line': line, 'error': f"Mobile number must be 11 digits starting with 09: {phone}"})
+            continue
+
+        email_norm = normalize_email(email)
+        if email_norm in seen_emails or phone in seen_phones:
+            errors.append({'line': line, 'error': "Listed more than once in this roster."})
+            continue
+        seen_emails.add(email_norm)
+        seen_phones.add(phone)
+
+        members.append({
+            'line': line,
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': email,
+            'phone': phone,
+        })
+
+    if len(members) > GROUP_MAX_SIZE:
+        errors.append({'line': None, 'error': f"A group can have at most {GROUP_MAX_SIZE} visitors."})
+    return members, errors
+
+
+def lookup_group(members, idempotency_key=None):
+    """Every roster member's identity/active-pass rows, in one query."""
+    replay = None
+    if idempotency_key:
+        replay = WalkInRequest.objects.filter(key__startswith=f"{idempotency_key}:")
+    return _lookup(
+        [normalize_email(m['email']) for m in members],
+        [normalize_phone(m['phone']) for m in members],
+        replay,
+    )
+
+
+def match_group(found, members):
+    """
+    Run match_user() for each member against the group lookup. Sets
+    member['user'] and returns the list of {'line', 'error'} conflicts.
+    """
+    errors = []
+    for member in members:
+        try:
+            member['user'] = match_user(
+                found.for_member(member['email'], member['phone']),
+                member['first_name'],
+                member['last_name'],
+                member['email'],
+                member['phone'],
+            )
+        except WalkInError as e:
+            errors.append({'line': member['line'], 'error': str(e)})
+    return errors
+
+
+def create_group_passes(members, department, purpose, actor, now, group_name="", idempotency_key=None):
+    """
+    All-or-nothing: reserve len(members) slots and bulk-insert the Active
+    visits, their system logs and idempotency keys in one transaction.
+    Returns one WalkInPass per member (in roster order).
+    """
+    visit_date = now.date()
+    visits = [
+        Visit(
+            user_email=m['email'],
+            purpose=purpose,
+            department=department,
+            visit_date=visit_date,
+            start_time=now.time(),
+            end_time=None,
+            status="Active",
+            user_id=m['user'].user_id if m.get('user') else None,
+        )
+        for m in members
+    ]
+    purpose_prefix = purpose[:3].upper() if purpose else "WLK"
+    group_label = f" with {group_name}" if group_name else ""
+
+    try:
+        with transaction.atomic():
+            capacity.reserve_slot(department, visit_date, count=len(visits))
+            visits = visit_codes.create_with_codes(visits, purpose_prefix)
+            SystemLog.objects.bulk_create([
+                SystemLog(
+                    actor=actor,
+                    action_type="Walk-In Registration",
+                    description=(
+                        f"Registered walk-in visitor {m['first_name']} {m['last_name']} ({m['email']})"
+                        f"{group_label} for {purpose} at {department}. Visit code: {v.code}"
+                    ),
+                    actor_role="Staff",
+                    created_at=now,  # stored as PH time
+                )
+                for m, v in zip(members, visits)
+            ])
+            if idempotency_key:
+                WalkInRequest.objects.bulk_create([
+                    WalkInRequest(
+                        key=group_member_key(idempotency_key, position),
+                        visit_id=v.visit_id,
+                        visit_code=v.code,
+                    )
+                    for position, v in enumerate(visits)
+                ])
+    except capacity.DepartmentFull:
+        raise WalkInError(f"{department} does not have {len(visits)} visitor slots left today.")
+    except IntegrityError:
+        if idempotency_key:
+            replays = lookup_group([], idempotency_key).replays
+            if replays:
+                logger.info(f"Group walk-in resubmitted, returning {len(replays)} passes")
+                return replays
+        # visits_one_open_per_day: name the registered visitors who already
+        # have an Upcoming/Active visit today
+        user_ids = [v.user_id for v in visits if v.user_id]
+        booked = Visit.objects.filter(
+            user_id__in=user_ids,
+            visit_date=visit_date,
+            status__in=["Upcoming", "Active"],
+        ).values_list("user_email", flat=True)
+        raise WalkInError(
+            "Some visitors already have a booking for today: "
+            f"{', '.join(sorted(booked)) or 'unknown'}. "
+            "Remove them from the roster and check them in with their existing visit codes."
+        )
+
+    return [WalkInPass(v.visit_id, v.code, now) for v in visits]
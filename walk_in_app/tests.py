@@ -1,3 +1,236 @@
-from django.test import TestCase
+from datetime import datetime, time as dtime
+from unittest import mock
 
-# Create your tests here.
+import pytz
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from dashboard_app.models import SystemLog, Visit
+from login_app.models import FrontDeskStaff
+from register_app.models import User
+
+from . import services, views
+from .models import WalkInRequest
+
+PHILIPPINES_TZ = pytz.timezone('Asia/Manila')
+NOW_PH = PHILIPPINES_TZ.localize(datetime.combine(datetime.now(PHILIPPINES_TZ).date(), dtime(10, 0)))
+
+DEPARTMENT = "College of Computer Studies (CCS)"
+KEY = "0123456789abcdef0123456789abcdef"
+
+
+def lookup_with(users=(), active=()):
+    found = services.WalkInLookup()
+    found.users = list(users)
+    found.active = list(active)
+    return found
+
+
+class ParseRosterTests(SimpleTestCase):
+
+    def test_header_and_blank_lines_are_skipped(self):
+        members, errors = services.parse_roster(
+            "first name, last name, email, mobile number\n"
+            "Ana, Reyes, ana@example.com, 09171234567\n"
+            "\n"
+            "Ben, Cruz, ben@example.com, 09181234567\n"
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual([(m['line'], m['email']) for m in members], [(2, "ana@example.com"), (4, "ben@example.com")])
+
+    def test_bad_lines_are_reported_by_line(self):
+        members, errors = services.parse_roster(
+            "Ana, Reyes, ana@example.com\n"
+            "Ben, Cruz, not-an-email, 09181234567\n"
+            "Cy, Lim, cy@example.com, 0918123\n"
+            "Dee, Tan, dee@example.com, 09191234567\n"
+        )
+        self.assertEqual([m['first_name'] for m in members], ["Dee"])
+        self.assertEqual([e['line'] for e in errors], [1, 2, 3])
+
+    def test_duplicates_within_the_roster(self):
+        members, errors = services.parse_roster(
+            "Ana, Reyes, ana@example.com, 09171234567\n"
+            "Ana, Reyes, ANA@example.com, 09181234567\n"
+            "Ann, Go, ann@example.com, 09171234567\n"
+        )
+        self.assertEqual(len(members), 1)
+        self.assertEqual([e['line'] for e in errors], [2, 3])
+
+    def test_group_size_limit(self):
+        roster = "\n".join(
+            f"V{i}, Tour, v{i}@example.com, 09{i:09d}" for i in range(services.GROUP_MAX_SIZE + 1)
+        )
+        members, errors = services.parse_roster(roster)
+        self.assertEqual(len(members), services.GROUP_MAX_SIZE + 1)
+        self.assertEqual(errors, [{'line': None, 'error': f"A group can have at most {services.GROUP_MAX_SIZE} visitors."}])
+
+
+class MatchUserTests(SimpleTestCase):
+
+    def setUp(self):
+        self.ana = User(user_id=1, first_name="Ana", last_name="Reyes", email="Ana@Example.com", phone="09171234567")
+
+    def test_new_visitor(self):
+        self.assertIsNone(services.match_user(lookup_with(), "Ana", "Reyes", "ana@example.com", "09171234567"))
+
+    def test_matched_by_email_or_phone(self):
+        found = lookup_with([self.ana])
+        self.assertIs(services.match_user(found, " ana ", "REYES", "ana@example.com", "09171234567"), self.ana)
+
+    def test_details_must_match_the_record(self):
+        with self.assertRaisesMessage(services.WalkInError, "first name, email"):
+            services.match_user(lookup_with([self.ana]), "Anna", "Reyes", "anna@example.com", "09171234567")
+
+    def test_phone_shared_by_several_users(self):
+        other = User(user_id=2, first_name="Ben", last_name="Cruz", email="ben@example.com", phone="09171234567")
+        with self.assertRaisesMessage(services.WalkInError, "multiple registered users"):
+            services.match_user(lookup_with([self.ana, other]), "Ana", "Reyes", "ana@example.com", "09171234567")
+
+    def test_email_and_phone_of_different_users(self):
+        other = User(user_id=2, first_name="Ben", last_name="Cruz", email="ben@example.com", phone="09181234567")
+        with self.assertRaisesMessage(services.WalkInError, "different user records"):
+            services.match_user(lookup_with([self.ana, other]), "Ana", "Reyes", "ana@example.com", "09181234567")
+
+    def test_active_pass_blocks(self):
+        found = lookup_with([self.ana], active=[("ana@example.com", "CIT-CCS-0001")])
+        with self.assertRaisesMessage(services.WalkInError, "CIT-CCS-0001"):
+            services.match_user(found, "Ana", "Reyes", "ana@example.com", "09171234567")
+
+
+class LookupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create(
+            first_name="Ana", last_name="Reyes", email="Ana@Example.com",
+            phone="0917 123 4567", password="x", visitor_type="Guest",
+        )
+        cls.ben = User.objects.create(
+            first_name="Ben", last_name="Cruz", email="ben@example.com",
+            phone="09181234567", password="x", visitor_type="Guest",
+        )
+        Visit.objects.create(
+            user_email="ana@example.com", code="CIT-CCS-ACT1", purpose="Tour",
+            department=DEPARTMENT, visit_date=NOW_PH.date(), status="Active",
+        )
+        Visit.objects.create(
+            user_email="ana@example.com", code="CIT-CCS-UP1", purpose="Tour",
+            department=DEPARTMENT, visit_date=NOW_PH.date(), status="Upcoming",
+        )
+        WalkInRequest.objects.create(key=KEY, visit_id=1, visit_code="CIT-CCS-OLD1")
+
+    def test_one_query_for_identity_active_and_replay(self):
+        with self.assertNumQueries(1):
+            found = services.lookup(" ANA@example.com", "09181234567", KEY)
+        self.assertEqual({u.user_id for u in found.users}, {self.ana.user_id, self.ben.user_id})
+        self.assertEqual(found.active_codes, ["CIT-CCS-ACT1"])
+        self.assertEqual(found.replay.code, "CIT-CCS-OLD1")
+        self.assertTrue(found.replay.replayed)
+
+    def test_no_key_no_replay(self):
+        found = services.lookup("nobody@example.com", "09990000000")
+        self.assertEqual((found.users, found.active, found.replay), ([], [], None))
+
+    def test_group_lookup_splits_per_member(self):
+        found = services.lookup_group([
+            {'email': "ana@example.com", 'phone': "09171234567"},
+            {'email': "ben@example.com", 'phone': "09181234567"},
+        ])
+        ana = found.for_member("ana@example.com", "09171234567")
+        self.assertEqual([u.user_id for u in ana.users], [self.ana.user_id])
+        self.assertEqual(ana.active_codes, ["CIT-CCS-ACT1"])
+        self.assertEqual(found.for_member("ben@example.com", "09181234567").active, [])
+
+
+class IdempotencyTests(TestCase):
+
+    def create_pass(self, key=KEY):
+        return services.create_pass(
+            None, "Ana", "Reyes", "ana@example.com", DEPARTMENT, "Campus tour",
+            actor="Sam (sam)", now=NOW_PH, idempotency_key=key,
+        )
+
+    def test_replayed_key_returns_the_first_pass(self):
+        first = self.create_pass()
+        again = self.create_pass()
+
+        self.assertFalse(first.replayed)
+        self.assertTrue(again.replayed)
+        self.assertEqual((again.visit_id, again.code), (first.visit_id, first.code))
+        self.assertEqual(Visit.objects.count(), 1)
+        self.assertEqual(SystemLog.objects.count(), 1)
+        self.assertEqual(services.lookup("ana@example.com", "09171234567", KEY).replay.code, first.code)
+
+    def test_group_replay_returns_every_member_pass(self):
+        members, errors = services.parse_roster(
+            "Ana, Reyes, ana@example.com, 09171234567\n"
+            "Ben, Cruz, ben@example.com, 09181234567\n"
+            "Cy, Lim, cy@example.com, 09191234567\n"
+        )
+        self.assertEqual(errors, [])
+        self.assertEqual(services.match_group(services.lookup_group(members), members), [])
+
+        passes = services.create_group_passes(
+            members, DEPARTMENT, "Campus tour", actor="Sam (sam)", now=NOW_PH,
+            group_name="Tour", idempotency_key=KEY,
+        )
+        self.assertEqual(
+            sorted(WalkInRequest.objects.values_list("key", flat=True)),
+            [f"{KEY}:000", f"{KEY}:001", f"{KEY}:002"],
+        )
+
+        replays = services.lookup_group(members, KEY).replays
+        self.assertEqual([p.code for p in replays], [p.code for p in passes])
+        self.assertTrue(all(p.replayed for p in replays))
+
+        again = services.create_group_passes(
+            members, DEPARTMENT, "Campus tour", actor="Sam (sam)", now=NOW_PH,
+            group_name="Tour", idempotency_key=KEY,
+        )
+        self.assertEqual([p.code for p in again], [p.code for p in passes])
+        self.assertEqual(Visit.objects.count(), 3)
+
+
+@mock.patch.object(views, "within_walk_in_hours", return_value=True)
+class WalkInViewReplayTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        FrontDeskStaff.objects.create(
+            first_name="Sam", last_name="Staff", username="sam", email="sam@cit.edu",
+            password="x", contact_number="09170000001",
+        )
+
+    def setUp(self):
+        session = self.client.session
+        session["staff_username"] = "sam"
+        session["staff_first_name"] = "Sam"
+        session.save()
+
+    def test_double_submit_shows_the_same_pass(self, _hours):
+        form = {
+            'first_name': "Ana", 'last_name': "Reyes", 'email': "ana@example.com",
+            'phone': "09171234567", 'department': DEPARTMENT, 'purpose': "Campus tour",
+            'idempotency_key': KEY.upper(),
+        }
+        first = self.client.post(reverse("walk_in_app:registration"), form)
+        again = self.client.post(reverse("walk_in_app:registration"), form)
+
+        self.assertTrue(first.context["success"])
+        self.assertEqual(again.context["visit_code"], first.context["visit_code"])
+        self.assertEqual(Visit.objects.count(), 1)
+
+    def test_group_double_submit_shows_the_same_passes(self, _hours):
+        form = {
+            'group_name': "Tour", 'department': DEPARTMENT, 'purpose': "Campus tour",
+            'roster': "Ana, Reyes, ana@example.com, 09171234567\nBen, Cruz, ben@example.com, 09181234567",
+            'idempotency_key': KEY,
+        }
+        first = self.client.post(reverse("walk_in_app:group_registration"), form)
+        again = self.client.post(reverse("walk_in_app:group_registration"), form)
+
+        codes = [p['code'] for p in first.context["passes"]]
+        self.assertEqual(len(codes), 2)
+        self.assertEqual([p['code'] for p in again.context["passes"]], codes)
+        self.assertEqual(Visit.objects.count(), 2)
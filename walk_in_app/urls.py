@@ -9,4 +9,5 @@ app_name = 'walk_in_app'
 
 urlpatterns = [
     path('registration/', views.walk_in_registration, name='registration'),
+    path('group/', views.group_walk_in_registration, name='group_registration'),
 ]
\ No newline at end of file
@@ -8,30 +8,26 @@ from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 
-import random
-import string
 from datetime import datetime, time as dtime
 import pytz
 import logging
 import re
+import uuid
 
-# Import Django models
-from dashboard_app.models import Visit, SystemLog
-from register_app.models import User
+from book_visit_app.departments import DEPARTMENT_CODE_MAP
+from login_app.decorators import staff_required
+from . import services as walk_in_services
 
 # Setup
 logger = logging.getLogger(__name__)
 PHILIPPINES_TZ = pytz.timezone('Asia/Manila')
 
 
-def staff_required(view_func):
-    """Decorator to ensure only staff can access"""
-    def wrapper(request, *args, **kwargs):
-        if 'staff_username' not in request.session:
-            messages.warning(request, "Please log in as staff to access this page.")
-            return redirect('login_app:login')
-        return view_func(request, *args, **kwargs)
-    return wrapper
+def within_walk_in_hours(now_aware):
+    """Walk-ins are accepted from 7:30 AM to 9:00 PM (PH time)."""
+    start_allowed = dtime(7, 30)   # 7:30 AM
+    end_allowed = dtime(21, 0)     # 9:00 PM
+    return start_allowed <= now_aware.time() < end_allowed
 
 
 @staff_required
@@ -46,6 +42,7 @@ def walk_in_registration(request):
         * If email/phone belong to an existing User, other fields must match.
         * No duplicate phone across different users.
         * If visitor already has an Active pass, block new walk-in registration.
+    - A resubmitted form (same idempotency key) shows the pass it already created.
     """
     staff_username = request.session['staff_username']
     staff_first_name = request.session.get('staff_first_name', 'Staff')
@@ -59,6 +56,9 @@ def walk_in_registration(request):
             phone = (request.POST.get('phone') or '').strip()
             department = (request.POST.get('department') or '').strip()
             purpose = (request.POST.get('purpose') or '').strip()
+            idempotency_key = walk_in_services.clean_idempotency_key(
+                request.POST.get('idempotency_key')
+            )
 
             # Preserve form data for re-render on error
             form_data = {
@@ -68,16 +68,14 @@ def walk_in_registration(request):
                 'phone': phone,
                 'department': department,
                 'purpose': purpose,
+                # Re-rendered forms keep their key; it is only consumed by a successful pass
+                'idempotency_key': idempotency_key or uuid.uuid4().hex,
             }
 
             # ----- Time-based restriction: 7:30 AM–9:00 PM (PH time) -----
             now_aware = timezone.now().astimezone(PHILIPPINES_TZ)
-            current_t = now_aware.time()
-
-            start_allowed = dtime(7, 30)   # 7:30 AM
-            end_allowed = dtime(21, 0)     # 9:00 PM
 
-            if not (start_allowed <= current_t < end_allowed):
+            if not within_walk_in_hours(now_aware):
                 messages.error(
                     request,
                     "⏰ Walk-in registration is only allowed from 7:30 AM to 9:00 PM. "
@@ -115,85 +113,32 @@ def walk_in_registration(request):
                 return render(request, 'walk_in_app/walk_in_registration.html', context)
 
             # =====================================================
-            #  EMAIL + PHONE CONSISTENCY (NO DUPLICATES)
+            #  IDENTITY + ACTIVE PASS + REPLAY (one query)
             # =====================================================
+            found = walk_in_services.lookup(email, phone, idempotency_key)
+            visitor_name = f"{first_name} {last_name}"
 
-            def norm(s: str) -> str:
-                return (s or "").strip().lower()
-
-            normalized_phone = re.sub(r"\D", "", phone or "")
-
-            # 1) Try match by email
-            user_by_email = User.objects.filter(email__iexact=email).first()
-
-            # 2) Try match by phone (assume stored as 09xxxxxxxxx in DB)
-            users_by_phone = list(User.objects.filter(phone=phone))
-
-            # If same phone is used by multiple users -> hard stop
-            if len(users_by_phone) > 1:
-                messages.error(
-                    request,
-                    (
-                        "This mobile number is associated with multiple registered users. "
-                        "Please verify the visitor’s information with the registrar before "
-                        "proceeding with walk-in registration."
-                    )
-                )
-                context = {
-                    'staff_first_name': staff_first_name,
-                    'form_data': form_data,
-                    'success': False,
-                }
-                return render(request, 'walk_in_app/walk_in_registration.html', context)
-
-            user_by_phone = users_by_phone[0] if users_by_phone else None
-
-            # If email and phone both match but point to different accounts -> hard stop
-            if user_by_email and user_by_phone and user_by_email != user_by_phone:
-                messages.error(
-                    request,
-                    (
-                        "The provided email and mobile number are registered under "
-                        "different user records. Please verify the visitor’s details."
+            if found.replay:
+                # Same form submitted twice: show the pass the first POST created
+                walk_in_pass = found.replay
+            else:
+                try:
+                    existing_user = walk_in_services.match_user(
+                        found, first_name, last_name, email, phone
                     )
-                )
-                context = {
-                    'staff_first_name': staff_first_name,
-                    'form_data': form_data,
-                    'success': False,
-                }
-                return render(request, 'walk_in_app/walk_in_registration.html', context)
-
-            # Use whichever matched (email preferred, then phone)
-            existing_user = user_by_email or user_by_phone
-
-            # If we found a registered user, all fields must match that record
-            if existing_user:
-                mismatches = []
-
-                if norm(existing_user.first_name) != norm(first_name):
-                    mismatches.append("first name")
-
-                if norm(existing_user.last_name) != norm(last_name):
-                    mismatches.append("last name")
-
-                if norm(existing_user.email) != norm(email):
-                    mismatches.append("email")
-
-                db_phone_digits = re.sub(r"\D", "", existing_user.phone or "")
-                if db_phone_digits and normalized_phone and db_phone_digits != normalized_phone:
-                    mismatches.append("mobile number")
-
-                if mismatches:
-                    pretty_fields = ", ".join(mismatches)
-                    messages.error(
-                        request,
-                        (
-                            "This visitor is already registered. "
-                            f"The {pretty_fields} you entered do not match our records. "
-                            "Please verify the information with the visitor."
-                        )
+                    walk_in_pass = walk_in_services.create_pass(
+                        existing_user,
+                        first_name,
+                        last_name,
+                        email,
+                        department,
+                        purpose,
+                        actor=f"{staff_first_name} ({staff_username})",
+                        now=now_aware,
+                        idempotency_key=idempotency_key,
                     )
+                except walk_in_services.WalkInError as e:
+                    messages.error(request, str(e))
                     context = {
                         'staff_first_name': staff_first_name,
                         'form_data': form_data,
@@ -201,91 +146,15 @@ def walk_in_registration(request):
                     }
                     return render(request, 'walk_in_app/walk_in_registration.html', context)
 
-            # ----- Block if visitor already has an Active pass -----
-            active_visit = Visit.objects.filter(
-                user_email__iexact=email,
-                status="Active"
-            ).order_by('-visit_date', '-start_time').first()
-
-            if active_visit:
-                messages.error(
-                    request,
-                    (
-                        "This visitor already has an active campus pass "
-                        f"(Code: {active_visit.code}). "
-                        "They must use their existing pass or be checked out before "
-                        "registering another walk-in visit."
-                    )
-                )
-                context = {
-                    'staff_first_name': staff_first_name,
-                    'form_data': form_data,
-                    'success': False,
-                }
-                return render(request, 'walk_in_app/walk_in_registration.html', context)
-
-            # ----- Generate visit code (purpose-based) -----
-            purpose_prefix = purpose[:3].upper() if purpose else "WLK"
-            random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-            visit_code = f"CIT-{purpose_prefix}-{random_str}"
-
-            # Ensure uniqueness (simple retry up to a few times)
-            attempts = 0
-            while Visit.objects.filter(code=visit_code).exists() and attempts < 5:
-                attempts += 1
-                random_str = ''.join(random.choices(string.ascii_uppercase + string.digits, k=5))
-                visit_code = f"CIT-{purpose_prefix}-{random_str}"
-
-            if Visit.objects.filter(code=visit_code).exists():
-                logger.error("Unable to generate unique visit code for walk-in visitor.")
-                messages.error(request, "Failed to generate a unique visit code. Please try again.")
-                context = {
-                    'staff_first_name': staff_first_name,
-                    'form_data': form_data,
-                    'success': False,
-                }
-                return render(request, 'walk_in_app/walk_in_registration.html', context)
-
-            # ----- Set visit times - walk-ins are checked in immediately -----
-            visit_date = now_aware.date()
-            start_time = now_aware.time()
-
-            visitor_name = f"{first_name} {last_name}"
-
-            # Link visit to existing User if found
-            user_id_value = existing_user.user_id if existing_user else None
-
-            # Insert visit record using Django ORM
-            visit = Visit(
-                user_email=email,
-                code=visit_code,
-                purpose=purpose,
-                department=department,
-                visit_date=visit_date,
-                start_time=start_time,
-                end_time=None,     # Will be set on check-out
-                status="Active",   # Automatically checked in
-                user_id=user_id_value
-            )
-            visit.save()
-
-            # Create log entry using Django ORM
-            log_entry = SystemLog(
-                actor=f"{staff_first_name} ({staff_username})",
-                action_type="Walk-In Registration",
-                description=(
-                    f"Registered walk-in visitor {visitor_name} ({email}) "
-                    f"for {purpose} at {department}. Visit code: {visit_code}"
-                ),
-                actor_role="Staff",
-                created_at=now_aware,  # stored as PH time
-            )
-            log_entry.save()
-
-            logger.info(f"Walk-in visitor registered by {staff_username}: {visit_code}")
+            visit_code = walk_in_pass.code
+            if walk_in_pass.replayed:
+                logger.info(f"Duplicate walk-in submission by {staff_username}: {visit_code}")
+            else:
+                logger.info(f"Walk-in visitor registered by {staff_username}: {visit_code}")
 
             # Pre-format display string in PH time, desired format: "Dec 07, 2025 06:46 PM"
-            visit_datetime_display = now_aware.strftime("%b %d, %Y %I:%M %p")
+            registered_at = walk_in_pass.created_at.astimezone(PHILIPPINES_TZ)
+            visit_datetime_display = registered_at.strftime("%b %d, %Y %I:%M %p")
 
             # Success context
             context = {
@@ -313,7 +182,114 @@ def walk_in_registration(request):
     # GET request - show blank form
     context = {
         'staff_first_name': staff_first_name,
-        'form_data': {},
+        'form_data': {'idempotency_key': uuid.uuid4().hex},
         'success': False,
     }
     return render(request, 'walk_in_app/walk_in_registration.html', context)
+
+
+@staff_required
+@require_http_methods(["GET", "POST"])
+def group_walk_in_registration(request):
+    """
+    Register a whole group (school tour, delegation) from a pasted roster.
+    - All members are validated with one batched lookup (same rules as the
+      single walk-in form).
+    - Nothing is created unless every member passes; then all Active visits
+      and their logs are inserted in one transaction.
+    - Shows one printable pass sheet for the group.
+    """
+    staff_username = request.session['staff_username']
+    staff_first_name = request.session.get('staff_first_name', 'Staff')
+    template = 'walk_in_app/group_walk_in.html'
+
+    context = {
+        'staff_first_name': staff_first_name,
+        'departments': list(DEPARTMENT_CODE_MAP.keys()),
+        'form_data': {'idempotency_key': uuid.uuid4().hex},
+        'errors': [],
+        'success': False,
+    }
+    if request.method != 'POST':
+        return render(request, template, context)
+
+    group_name = (request.POST.get('group_name') or '').strip()
+    department = (request.POST.get('department') or '').strip()
+    purpose = (request.POST.get('purpose') or '').strip()
+    roster = request.POST.get('roster') or ''
+    idempotency_key = walk_in_services.clean_idempotency_key(request.POST.get('idempotency_key'))
+
+    context['form_data'] = {
+        'group_name': group_name,
+        'department': department,
+        'purpose': purpose,
+        'roster': roster,
+        'idempotency_key': idempotency_key or uuid.uuid4().hex,
+    }
+
+    now_aware = timezone.now().astimezone(PHILIPPINES_TZ)
+    if not within_walk_in_hours(now_aware):
+        messages.error(request, "⏰ Walk-in registration is only allowed from 7:30 AM to 9:00 PM.")
+        return render(request, template, context)
+
+    if not all([group_name, department, purpose, roster.strip()]):
+        messages.error(request, "Please fill in the group name, department, purpose and roster.")
+        return render(request, template, context)
+
+    try:
+        members, errors = walk_in_services.parse_roster(roster)
+        if not members and not errors:
+            errors = [{'line': None, 'error': "The roster is empty."}]
+
+        found = walk_in_services.lookup_group(members, idempotency_key)
+
+        if found.replays and len(found.replays) == len(members):
+            # Same roster submitted twice: show the passes already created
+            passes = found.replays
+        else:
+            errors += walk_in_services.match_group(found, members)
+            if errors:
+                messages.error(
+                    request,
+                    f"{len(errors)} roster line(s) need attention. No passes were created."
+                )
+                context['errors'] = sorted(errors, key=lambda e: e['line'] or 0)
+                return render(request, template, context)
+
+            passes = walk_in_services.create_group_passes(
+                members,
+                department,
+                purpose,
+                actor=f"{staff_first_name} ({staff_username})",
+                now=now_aware,
+                group_name=group_name,
+                idempotency_key=idempotency_key,
+            )
+    except walk_in_services.WalkInError as e:
+        messages.error(request, str(e))
+        return render(request, template, context)
+    except Exception as e:
+        logger.error(f"Error in group walk-in registration: {str(e)}")
+        messages.error(request, "An error occurred during registration. No passes were created.")
+        return render(request, template, context)
+
+    logger.info(f"Group walk-in ({len(passes)} visitors) registered by {staff_username}: {group_name}")
+
+    registered_at = passes[0].created_at.astimezone(PHILIPPINES_TZ)
+    context.update({
+        'success': True,
+        'group_name': group_name,
+        'department': department,
+        'purpose': purpose,
+        'visit_datetime_display': registered_at.strftime("%b %d, %Y %I:%M %p"),
+        'passes': [
+            {
+                'name': f"{m['first_name']} {m['last_name']}",
+                'email': m['email'],
+                'phone': m['phone'],
+                'code': p.code,
+            }
+            for m, p in zip(members, passes)
+        ],
+    })
+    return render(request, template, context)